@@ -0,0 +1,289 @@
+"""Export or update the Instruments table of many databases in parallel.
+
+Each database is handled by its own worker process, largest file first, so
+a folder of projects takes about as long as its files divided by the
+number of cores. Only the ``instruments`` module is loaded; neither Flask
+nor pycomm3 is imported.
+
+Examples::
+
+    python batch.py export projects/ --output-dir exports/
+    python batch.py export 'projects/*.mdb' --format csv --jobs 8 --summary summary.csv
+    python batch.py import projects/ --source-dir exports/ --output-dir updated/
+    python batch.py import projects/ --source-dir exports/ --dry-run
+
+``import`` reads ``<source-dir>/<name><format suffix>`` for every database
+``<name>.mdb`` and writes the updated copy to ``--output-dir``; the
+databases given are never changed. With ``--dry-run`` it only counts the
+rows that would change. With ``--chunk-size`` the import commits every
+that many changed rows and keeps ``<output>.checkpoint`` next to the copy;
+a file that fails keeps both, and running the same command again resumes
+it from the last commit, or starts it over if its export has changed. The
+exit status is 1 when any file failed.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import instruments
+
+# Files picked up when a directory is given.
+DATABASE_SUFFIXES = ('.mdb', '.accdb', '.db', '.sqlite', '.sqlite3')
+
+SUMMARY_COLUMNS = ['file', 'status', 'rows', 'changes', 'seconds', 'output', 'error']
+
+
+def find_databases(patterns: list) -> list:
+    """Return the database files named by ``patterns``, largest first.
+
+    A pattern is a directory, whose files ending in ``DATABASE_SUFFIXES``
+    are taken, or a file name or glob.
+    """
+
+    paths = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            names = [
+                os.path.join(pattern, name) for name in os.listdir(pattern)
+                if name.lower().endswith(DATABASE_SUFFIXES)
+            ]
+        else:
+            names = glob.glob(pattern)
+        for name in names:
+            if os.path.isfile(name):
+                paths[os.path.abspath(name)] = os.path.getsize(name)
+    return sorted(paths, key=lambda path: (-paths[path], path))
+
+
+def _stem(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def export_one(path: str, output_dir: str, fmt: str, backend: str | None) -> dict:
+    """Export one database and return its summary row."""
+    output = os.path.join(output_dir, _stem(path) + instruments.EXPORT_FORMATS[fmt])
+    result = _result(path, output)
+    start = time.perf_counter()
+    try:
+        with instruments.open_database(path, backend) as db:
+            result['rows'] = instruments.export_instruments_to_excel(
+                path, output, streaming=True, db=db, fmt=fmt
+            )
+    except Exception as exc:
+        result.update(status='failed', error=str(exc), output=None)
+        if os.path.exists(output):
+            os.remove(output)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def import_one(
+    path: str,
+    source: str,
+    output: str | None,
+    fmt: str,
+    backend: str | None,
+    chunk_size: int | None = None,
+) -> dict:
+    """Update a copy of one database from ``source`` and return its summary row.
+
+    Without ``output`` the changes are only counted. With ``chunk_size`` a
+    failed import leaves ``output`` and its checkpoint in place, and the next
+    call resumes it instead of copying ``path`` again. If ``source`` has
+    changed since, the import starts over from a fresh copy.
+    """
+
+    result = _result(path, output)
+    start = time.perf_counter()
+    try:
+        if not os.path.exists(source):
+            raise ValueError(f'{source} not found')
+        if output is None:
+            with instruments.open_database(path, backend) as db:
+                diff = instruments.diff_instruments(path, source, db=db, fmt=fmt)
+            result['rows'] = sum(diff.rows_read.values())
+            result['changes'] = diff.updated_rows
+            if diff.unknown:
+                raise ValueError(f'{len(diff.unknown)} rows have an unknown ID/Tag')
+        else:
+            counts = {}
+            checkpoint = output + '.checkpoint' if chunk_size else None
+            resume = checkpoint is not None and os.path.exists(checkpoint) and os.path.exists(output)
+            if resume:
+                try:
+                    instruments.ImportCheckpoint.open(checkpoint, source)
+                except instruments.CheckpointMismatch:
+                    resume = False
+            if not resume:
+                # A checkpoint without its copy, or for another export, is stale.
+                if checkpoint is not None and os.path.exists(checkpoint):
+                    os.remove(checkpoint)
+                shutil.copyfile(path, output)
+            with instruments.open_database(output, backend) as db:
+                result['changes'] = instruments.update_instruments_from_excel(
+                    output,
+                    source,
+                    db=db,
+                    fmt=fmt,
+                    progress=lambda stage, rows: counts.update(rows),
+                    chunk_size=chunk_size,
+                    checkpoint_path=checkpoint,
+                )
+            result['rows'] = sum(counts.values())
+    except Exception as exc:
+        result.update(status='failed', error=str(exc))
+        if chunk_size and output is not None and os.path.exists(output + '.checkpoint'):
+            result['error'] += ' (rerun to resume)'
+        else:
+            result['output'] = None
+            if output is not None and os.path.exists(output):
+                os.remove(output)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _result(path: str, output: str | None) -> dict:
+    return {
+        'file': path,
+        'status': 'ok',
+        'rows': None,
+        'changes': None,
+        'seconds': None,
+        'output': output,
+        'error': None,
+    }
+
+
+def run_batch(tasks: list, jobs: int) -> list:
+    """Run ``(function, *args)`` tasks on ``jobs`` processes, in the given order.
+
+    Results are printed as they complete and returned in task order.
+    """
+
+    results = [None] * len(tasks)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(*task): i for i, task in enumerate(tasks)}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            print(_format_result(result), flush=True)
+    return results
+
+
+def write_summary(results: list, path: str) -> None:
+    """Write the summary rows to ``path``, as JSON if it ends in ``.json``."""
+    with open(path, 'w', newline='') as fh:
+        if path.lower().endswith('.json'):
+            json.dump(results, fh, indent=2)
+        else:
+            writer = csv.DictWriter(fh, SUMMARY_COLUMNS)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+def _format_result(result: dict) -> str:
+    rows = '' if result['rows'] is None else result['rows']
+    changes = '' if result['changes'] is None else result['changes']
+    line = f"{result['status']:<7}{rows:>9}{changes:>9} {result['seconds']:>8.2f}s  {result['file']}"
+    if result['error']:
+        line += f"  ({result['error']})"
+    return line
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (
+        ('export', 'export the Instruments table of every database'),
+        ('import', 'update every database from its export'),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('paths', nargs='+', help='database files, directories or globs')
+        command.add_argument(
+            '--format',
+            choices=list(instruments.EXPORT_FORMATS),
+            default='xlsx',
+            help='export file format (default: %(default)s)',
+        )
+        command.add_argument('--output-dir', help='directory for the exported or updated files')
+        command.add_argument(
+            '--backend',
+            choices=list(instruments.DATABASE_BACKENDS),
+            help='database backend (default: by file name)',
+        )
+        command.add_argument(
+            '--jobs',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='worker processes (default: %(default)s)',
+        )
+        command.add_argument('--summary', help='write a summary to this CSV (or .json) file')
+        if name == 'import':
+            command.add_argument('--source-dir', required=True, help='directory holding the exports')
+            command.add_argument('--dry-run', action='store_true', help='only count the changes')
+            command.add_argument(
+                '--chunk-size',
+                type=int,
+                help='commit every this many changed rows and resume failed files when rerun',
+            )
+    args = parser.parse_args(argv)
+
+    if args.command == 'export' or not args.dry_run:
+        if not args.output_dir:
+            parser.error('--output-dir is required')
+        os.makedirs(args.output_dir, exist_ok=True)
+    if args.command == 'import' and args.chunk_size is not None and args.chunk_size < 1:
+        parser.error('--chunk-size must be at least 1')
+    if args.format == 'parquet':
+        try:
+            instruments._require_pyarrow()
+        except ValueError as exc:
+            parser.error(str(exc))
+
+    paths = find_databases(args.paths)
+    if not paths:
+        parser.error('no database files found')
+    stems = {}
+    for path in paths:
+        if _stem(path) in stems:
+            parser.error(f'{path} and {stems[_stem(path)]} would write the same output file')
+        stems[_stem(path)] = path
+
+    suffix = instruments.EXPORT_FORMATS[args.format]
+    if args.command == 'export':
+        tasks = [(export_one, path, args.output_dir, args.format, args.backend) for path in paths]
+    else:
+        tasks = [
+            (
+                import_one,
+                path,
+                os.path.join(args.source_dir, _stem(path) + suffix),
+                None if args.dry_run else os.path.join(args.output_dir, os.path.basename(path)),
+                args.format,
+                args.backend,
+                args.chunk_size,
+            )
+            for path in paths
+        ]
+
+    start = time.perf_counter()
+    results = run_batch(tasks, max(1, args.jobs))
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for r in results if r['status'] != 'ok')
+    rows = sum(r['rows'] or 0 for r in results)
+    print(f'{len(results)} files, {failed} failed, {rows} rows in {elapsed:.1f}s')
+    if args.summary:
+        write_summary(results, args.summary)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""Benchmark the instrument export and import on synthetic databases.
+
+Builds SQLite databases with the same ``Instruments`` schema as the MDB files,
+from 1k to 500k rows by default, then measures
+``export_instruments_to_excel`` and ``update_instruments_from_excel`` through
+the SQLite backend. Every measurement runs in a fresh process, so the peak
+memory reported is that of the measured call alone (the growth of the peak
+resident set size over the process baseline).
+
+Examples::
+
+    python benchmark.py
+    python benchmark.py --sizes 1000,10000 --formats xlsx,csv,jsonl
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json --tolerance 0.25
+
+With ``--baseline`` the exit status is 1 when throughput drops or peak
+memory grows by more than the tolerance for any measurement.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import instruments
+
+DEFAULT_SIZES = (1000, 10000, 100000, 500000)
+
+# Peak memory growth below this many MB is treated as noise when comparing
+# with a baseline.
+MEMORY_SLACK_MB = 5.0
+
+
+def create_instruments_db(path: str, rows: int, seed: int = 0) -> None:
+    """Write a synthetic Instruments table with ``rows`` rows to ``path``.
+
+    One row in ten is not an IO point and one in fifty has no tag, so the
+    export filters some rows out as it would for a real MDB. Every IO row
+    has exactly one of the four category flags set.
+    """
+
+    rnd = random.Random(seed)
+    column_types = []
+    for column in instruments.INSTRUMENT_COLUMNS:
+        if column == 'ID':
+            column_types.append('ID INTEGER PRIMARY KEY')
+        elif column in ('Tag', 'Type', 'FullDescription'):
+            column_types.append(f'{column} TEXT')
+        elif column.endswith('_EN') or column in instruments.INSTRUMENT_SHEETS:
+            column_types.append(f'{column} INTEGER')
+        else:
+            column_types.append(f'{column} REAL')
+
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(f"CREATE TABLE Instruments ({', '.join(column_types)})")
+        insert = (
+            f"INSERT INTO Instruments ({', '.join(instruments.INSTRUMENT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(instruments.INSTRUMENT_COLUMNS))})"
+        )
+        batch = []
+        for i in range(1, rows + 1):
+            values = {
+                'ID': i,
+                'Tag': None if i % 50 == 0 else f'AI_{i:07d}',
+                'Type': 'Calc' if i % 10 == 0 else 'IO',
+                'FullDescription': f'Synthetic instrument {i}',
+                'EGULow': 0.0,
+                'EGUHigh': float(rnd.choice((100, 250, 1000))),
+                'RawLow': 4.0,
+                'RawHigh': 20.0,
+            }
+            for column in instruments.INSTRUMENT_COLUMNS:
+                if column in values:
+                    continue
+                if column in instruments.INSTRUMENT_SHEETS:
+                    values[column] = int(instruments.INSTRUMENT_SHEETS[i % 4] == column)
+                elif column.endswith('_EN'):
+                    values[column] = rnd.randint(0, 1)
+                else:
+                    values[column] = round(rnd.uniform(0, 100), 2)
+            batch.append([values[column] for column in instruments.INSTRUMENT_COLUMNS])
+            if len(batch) == 10000:
+                conn.executemany(insert, batch)
+                batch = []
+        if batch:
+            conn.executemany(insert, batch)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def perturb_instruments_db(path: str, ratio: float) -> None:
+    """Change ``HALM_SP`` on about ``ratio`` of the exported rows of ``path``.
+
+    Importing an export of the original database into the perturbed copy
+    then has that many rows to write back. Only rows the export contains are
+    changed; the IDs picked (one more than a multiple of the step) avoid the
+    rows :func:`create_instruments_db` makes ``Calc`` or leaves untagged.
+    """
+
+    step = max(1, round(1 / ratio)) if ratio > 0 else 0
+    if not step:
+        return
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(
+            "UPDATE Instruments SET HALM_SP = HALM_SP + 1 "
+            "WHERE Type = 'IO' AND Tag IS NOT NULL AND (ID - 1) % ? = 0",
+            (step,),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _measure(operation: str, db_path: str, data_path: str, fmt: str) -> dict:
+    """Run one export or import in the current process and time it."""
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    changes = None
+    if operation == 'export':
+        rows = instruments.export_instruments_to_excel(db_path, data_path, streaming=True, fmt=fmt)
+    else:
+        counts = {}
+        changes = instruments.update_instruments_from_excel(
+            db_path,
+            data_path,
+            fmt=fmt,
+            progress=lambda stage, rows: counts.update(rows),
+        )
+        rows = sum(counts.values())
+    seconds = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'changes': changes,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds else 0.0,
+        'peak_mb': max(0.0, _peak_rss_mb() - baseline),
+    }
+
+
+def measure(operation: str, db_path: str, data_path: str, fmt: str) -> dict:
+    """Run :func:`_measure` in a new process so memory peaks do not carry over."""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_measure, operation, db_path, data_path, fmt).result()
+
+
+def run_benchmarks(sizes, formats, change_ratio: float, workdir: str) -> list:
+    """Export and re-import every size in every format and return the results.
+
+    Raises ``RuntimeError`` when an import that should write rows back
+    writes none, since it would not measure the update path.
+    """
+    results = []
+    for size in sizes:
+        db_path = os.path.join(workdir, f'instruments_{size}.db')
+        create_instruments_db(db_path, size)
+        for fmt in formats:
+            data_path = os.path.join(workdir, f'instruments_{size}{instruments.EXPORT_FORMATS[fmt]}')
+            target_path = os.path.join(workdir, f'target_{size}.db')
+            for operation in ('export', 'import'):
+                if operation == 'import':
+                    shutil.copy(db_path, target_path)
+                    perturb_instruments_db(target_path, change_ratio)
+                    result = measure(operation, target_path, data_path, fmt)
+                else:
+                    result = measure(operation, db_path, data_path, fmt)
+                result.update(operation=operation, format=fmt, size=size)
+                results.append(result)
+                print(_format_result(result), flush=True)
+                if operation == 'import' and change_ratio > 0 and not result['changes']:
+                    raise RuntimeError(
+                        f'import of {size} rows ({fmt}) changed no rows; '
+                        f'the update path was not measured'
+                    )
+            os.remove(data_path)
+            os.remove(target_path)
+        os.remove(db_path)
+    return results
+
+
+def compare_with_baseline(results: list, baseline: list, tolerance: float) -> list:
+    """Return a message for every result that regressed against ``baseline``."""
+    previous = {(r['operation'], r['format'], r['size']): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result['operation'], result['format'], result['size']))
+        if base is None:
+            continue
+        label = f"{result['operation']} {result['format']} {result['size']} rows"
+        if result['rows_per_second'] < base['rows_per_second'] * (1 - tolerance):
+            regressions.append(
+                f"{label}: {result['rows_per_second']:.0f} rows/s, "
+                f"was {base['rows_per_second']:.0f}"
+            )
+        if result['peak_mb'] > max(base['peak_mb'] * (1 + tolerance), base['peak_mb'] + MEMORY_SLACK_MB):
+            regressions.append(f"{label}: peak {result['peak_mb']:.1f} MB, was {base['peak_mb']:.1f}")
+    return regressions
+
+
+def _format_result(result: dict) -> str:
+    changes = '' if result.get('changes') is None else result['changes']
+    return (
+        f"{result['operation']:<7}{result['format']:<9}{result['size']:>9} "
+        f"{result['rows']:>9} {changes:>7} {result['seconds']:>9.2f}s "
+        f"{result['rows_per_second']:>10.0f} rows/s {result['peak_mb']:>9.1f} MB"
+    )
+
+
+def _parse_list(text: str, convert=str) -> list:
+    return [convert(item.strip()) for item in text.split(',') if item.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--sizes',
+        type=lambda text: _parse_list(text, int),
+        default=list(DEFAULT_SIZES),
+        help='comma-separated table sizes (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--formats',
+        type=_parse_list,
+        default=['xlsx'],
+        help=f"comma-separated export formats from {', '.join(instruments.EXPORT_FORMATS)} (default: xlsx)",
+    )
+    parser.add_argument(
+        '--change-ratio',
+        type=float,
+        default=0.01,
+        help='fraction of rows the import has to write back (default: %(default)s)',
+    )
+    parser.add_argument('--workdir', help='directory for the generated files (default: a temporary one)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with results written earlier by --output')
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.2,
+        help='allowed relative slowdown or memory growth against the baseline (default: %(default)s)',
+    )
+    args = parser.parse_args(argv)
+
+    unknown = [fmt for fmt in args.formats if fmt not in instruments.EXPORT_FORMATS]
+    if unknown:
+        parser.error(f"unknown format: {', '.join(unknown)}")
+    if 'parquet' in args.formats:
+        try:
+            instruments._require_pyarrow()
+        except ValueError as exc:
+            parser.error(str(exc))
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='plcpoke-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        results = run_benchmarks(args.sizes, args.formats, args.change_ratio, workdir)
+    except RuntimeError as exc:
+        print(f'FAILED {exc}')
+        return 1
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare_with_baseline(results, json.load(fh), args.tolerance)
+        for message in regressions:
+            print(f'REGRESSION {message}')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
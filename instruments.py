@@ -0,0 +1,1558 @@
+"""Export and import of the ``Instruments`` table of a project database.
+
+Everything here works without Flask or pycomm3, so the web server, the
+batch command line and the benchmark all share it.
+"""
+
+import os
+import tempfile
+import base64
+import bisect
+import csv
+import datetime
+import hashlib
+import io
+import itertools
+import json
+import logging
+import shutil
+import sqlite3
+import sys
+import time
+import zipfile
+from array import array
+from contextlib import ExitStack, contextmanager
+from decimal import Decimal
+
+try:
+    import pyodbc
+except ImportError:  # no ODBC driver manager; only the SQLite backend works
+    pyodbc = None
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Number of rows pulled from the ODBC cursor per ``fetchmany`` call.
+FETCH_SIZE = 1000
+
+# Rows buffered per row group when exporting to Parquet.
+PARQUET_ROW_GROUP_SIZE = 50000
+
+# Columns the export and import code read from the Instruments table.
+INSTRUMENT_COLUMNS = (
+    'ID', 'Tag', 'Type', 'FullDescription', 'EGULow', 'EGUHigh', 'RawLow', 'RawHigh',
+    'HALM_EN', 'HALM_SP', 'HALM_DB', 'HALM_DLY',
+    'HWARN_EN', 'HWARN_SP', 'HWARN_DB', 'HWARN_DLY',
+    'LALM_EN', 'LALM_SP', 'LALM_DB', 'LALM_DLY',
+    'LWARN_EN', 'LWARN_SP', 'LWARN_DB', 'LWARN_DLY',
+    'DigitalInput', 'DigitalOutput', 'AnalogInput', 'AnalogOutput',
+)
+
+# Sheets of an exported workbook, in order. Each instrument is placed on the
+# first sheet whose flag column is set.
+INSTRUMENT_SHEETS = ('DigitalInput', 'DigitalOutput', 'AnalogInput', 'AnalogOutput')
+
+# Export file formats and the file name suffix each is written with.
+EXPORT_FORMATS = {
+    'xlsx': '.xlsx',
+    'csv': '.csv.zip',
+    'jsonl': '.jsonl',
+    'parquet': '.parquet',
+}
+
+# Extra sheet of a delta export listing the rows removed since the snapshot
+# it was made against, and its columns. Imports skip it.
+REMOVED_SHEET = 'Removed'
+REMOVED_HEADER = ['ID', 'Tag']
+
+# Columns written to each sheet of an exported workbook.
+INSTRUMENT_HEADER = [
+    'ID',
+    'Tag',
+    'FullDescription',
+    'EGULow',
+    'EGUHigh',
+    'RawLow',
+    'RawHigh',
+    'HALM_EN',
+    'HALM_SP',
+    'HALM_DB',
+    'HALM_DLY',
+    'HWARN_EN',
+    'HWARN_SP',
+    'HWARN_DB',
+    'HWARN_DLY',
+    'LALM_EN',
+    'LALM_SP',
+    'LALM_DB',
+    'LALM_DLY',
+    'LWARN_EN',
+    'LWARN_SP',
+    'LWARN_DB',
+    'LWARN_DLY',
+]
+
+# Alarm setpoint columns that are also members of the instrument's PLC tag.
+SETPOINT_MEMBERS = ('HALM_SP', 'LALM_SP', 'HWARN_SP', 'LWARN_SP')
+
+# The four alarms of an analog instrument, each with its own columns.
+ALARM_NAMES = ('HALM', 'HWARN', 'LALM', 'LWARN')
+
+# Every alarm column (enable, setpoint, deadband and delay of the four
+# alarms), pushed to the members of the same name in the PLC tag.
+ALARM_MEMBERS = tuple(
+    f'{alarm}_{field}'
+    for alarm in ALARM_NAMES
+    for field in ('EN', 'SP', 'DB', 'DLY')
+)
+
+# Selects the exported columns followed by the four category flags.
+INSTRUMENT_QUERY = (
+    "SELECT ID, Tag, FullDescription, EGULow, EGUHigh, RawLow, RawHigh, "
+    "HALM_EN, HALM_SP, HALM_DB, HALM_DLY, "
+    "HWARN_EN, HWARN_SP, HWARN_DB, HWARN_DLY, "
+    "LALM_EN, LALM_SP, LALM_DB, LALM_DLY, "
+    "LWARN_EN, LWARN_SP, LWARN_DB, LWARN_DLY, "
+    "DigitalInput, DigitalOutput, AnalogInput, AnalogOutput "
+    "FROM Instruments WHERE Type='IO' AND Tag <> '' AND Tag IS NOT NULL"
+)
+
+
+class MissingInstrumentsTable(ValueError):
+    """Raised when a database has no Instruments table."""
+
+
+class InstrumentDatabase:
+    """A connection to a database holding an Instruments table.
+
+    The connection is opened on first use and kept until :meth:`close`, so a
+    route or job can hand the same object to both the export and import
+    functions. Table and column metadata are looked up once and cached.
+    ``timings`` records how long connecting and each introspection call took,
+    in seconds, and is logged when the connection is closed.
+
+    Subclasses implement :meth:`_connect`, :meth:`_list_tables` and
+    :meth:`_list_columns`. Their connections must use ``?`` parameters and
+    start in autocommit mode.
+    """
+
+    # Name used when logging the timings.
+    backend_name = 'Database'
+
+    # Whether the database compares text ignoring case, so imports match
+    # tags the same way.
+    case_insensitive_text = False
+
+    def __init__(self, path: str):
+        self.path = path
+        self.timings = {}
+        self._conn = None
+        self._table_names = None
+        self._columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def connection(self):
+        if self._conn is None:
+            start = time.perf_counter()
+            self._conn = self._connect()
+            self.timings['connect'] = time.perf_counter() - start
+        return self._conn
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def table_names(self) -> list:
+        """Return the names of the user tables in the database."""
+        if self._table_names is None:
+            cursor = self.cursor()
+            start = time.perf_counter()
+            self._table_names = self._list_tables(cursor)
+            self.timings['tables'] = time.perf_counter() - start
+        return self._table_names
+
+    def columns(self, table: str) -> list:
+        """Return the column names of ``table``."""
+        if table not in self._columns:
+            cursor = self.cursor()
+            start = time.perf_counter()
+            self._columns[table] = self._list_columns(cursor, table)
+            self.timings['columns'] = time.perf_counter() - start
+        return self._columns[table]
+
+    def require_instruments(self) -> None:
+        """Raise ``ValueError`` unless a usable Instruments table exists."""
+        if 'Instruments' not in self.table_names():
+            raise MissingInstrumentsTable('Instruments table not found')
+        missing = [col for col in INSTRUMENT_COLUMNS if col not in self.columns('Instruments')]
+        if missing:
+            raise ValueError(f"Instruments table is missing columns: {', '.join(missing)}")
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor whose statements are committed or rolled back together."""
+        conn = self.connection
+        conn.autocommit = False
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            for stage, seconds in self.timings.items():
+                metrics.observe('plcpoke_db_seconds', seconds, backend=self.backend_name, operation=stage)
+            logger.info(
+                '%s timings for %s: %s',
+                self.backend_name,
+                os.path.basename(self.path),
+                ', '.join(f'{stage} {seconds:.3f}s' for stage, seconds in self.timings.items()),
+            )
+
+    def _connect(self):
+        raise NotImplementedError
+
+    def _list_tables(self, cursor) -> list:
+        raise NotImplementedError
+
+    def _list_columns(self, cursor, table: str) -> list:
+        raise NotImplementedError
+
+
+class AccessDatabase(InstrumentDatabase):
+    """A single ODBC connection to an uploaded MDB file."""
+
+    backend_name = 'Access driver'
+    case_insensitive_text = True
+
+    def __init__(self, mdb_path: str):
+        super().__init__(mdb_path)
+        self.conn_str = (
+            r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
+            f'DBQ={mdb_path};'
+        )
+
+    def _connect(self):
+        if pyodbc is None:
+            raise ValueError('Access databases need the pyodbc package and an ODBC driver manager')
+        return pyodbc.connect(self.conn_str, autocommit=True)
+
+    def _list_tables(self, cursor) -> list:
+        return [row.table_name for row in cursor.tables(tableType='TABLE')]
+
+    def _list_columns(self, cursor, table: str) -> list:
+        return [row.column_name for row in cursor.columns(table=table)]
+
+
+class SQLiteDatabase(InstrumentDatabase):
+    """A SQLite file with the same Instruments schema as the MDB files.
+
+    Needs nothing beyond the standard library, so the export and import code
+    can be run and profiled where the Access driver is not available.
+    """
+
+    backend_name = 'SQLite'
+
+    def _connect(self):
+        # isolation_level=None leaves the connection in autocommit mode;
+        # transaction() issues BEGIN itself.
+        return sqlite3.connect(self.path, isolation_level=None)
+
+    def _list_tables(self, cursor) -> list:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        return [row[0] for row in cursor.fetchall()]
+
+    def _list_columns(self, cursor, table: str) -> list:
+        cursor.execute('SELECT name FROM pragma_table_info(?)', (table,))
+        return [row[0] for row in cursor.fetchall()]
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor whose statements are committed or rolled back together."""
+        cursor = self.connection.cursor()
+        cursor.execute('BEGIN')
+        try:
+            yield cursor
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+
+
+# Database backends by name, for ``open_database`` and the DATABASE_BACKEND
+# setting.
+DATABASE_BACKENDS = {
+    'access': AccessDatabase,
+    'sqlite': SQLiteDatabase,
+}
+
+# Exceptions raised by the database backends that are available.
+DATABASE_ERRORS = (sqlite3.Error,) if pyodbc is None else (sqlite3.Error, pyodbc.Error)
+
+# Raised for an import file that cannot be read in its format, such as a
+# corrupt upload or a file with the wrong extension.
+INVALID_FILE_ERRORS = (ValueError, zipfile.BadZipFile, InvalidFileException)
+
+
+def open_database(path: str, backend: str | None = None) -> InstrumentDatabase:
+    """Return a connection object for ``path``; it connects on first use.
+
+    ``backend`` names an entry of ``DATABASE_BACKENDS``. Without it, files
+    named ``*.db``, ``*.sqlite`` or ``*.sqlite3`` use SQLite and anything
+    else is treated as an Access database.
+    """
+
+    if backend is None:
+        backend = 'sqlite' if path.lower().endswith(('.db', '.sqlite', '.sqlite3')) else 'access'
+    try:
+        cls = DATABASE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f'Unknown database backend {backend}') from None
+    return cls(path)
+
+
+@contextmanager
+def _open_database(mdb_path: str, db: InstrumentDatabase | None = None):
+    """Yield ``db`` if given, otherwise a new connection closed on exit."""
+    if db is not None:
+        yield db
+        return
+    with open_database(mdb_path) as db:
+        yield db
+
+
+class RowSnapshot:
+    """Hashes of the rows of one export, keyed by ``(ID, Tag)``.
+
+    Each hash covers the row's sheet and every exported column, so a later
+    export can tell added, changed and removed rows apart without keeping the
+    rows themselves.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, sheet: str, values) -> int:
+        """Record the hash of one exported row and return it."""
+        data = repr((sheet, tuple(values))).encode('utf-8')
+        row_hash = int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+        self.hashes[(values[0], values[1])] = row_hash
+        return row_hash
+
+    def get(self, id_val, tag_val) -> int | None:
+        return self.hashes.get((id_val, tag_val))
+
+    def removed_from(self, other: 'RowSnapshot'):
+        """Yield the ``(ID, Tag)`` keys of this snapshot missing from ``other``."""
+        for key in self.hashes:
+            if key not in other.hashes:
+                yield key
+
+    def compare(self, since: 'RowSnapshot') -> dict:
+        """Count the rows ``added``, ``changed`` and ``removed`` since ``since``."""
+        added = changed = 0
+        for key, row_hash in self.hashes.items():
+            previous = since.hashes.get(key)
+            if previous is None:
+                added += 1
+            elif previous != row_hash:
+                changed += 1
+        removed = sum(1 for _ in since.removed_from(self))
+        return {'added': added, 'changed': changed, 'removed': removed}
+
+    def dump(self, fh) -> None:
+        json.dump([[id_val, tag_val, row_hash] for (id_val, tag_val), row_hash in self.hashes.items()], fh)
+
+    @classmethod
+    def load(cls, fh) -> 'RowSnapshot':
+        snapshot = cls()
+        snapshot.hashes = {(id_val, tag_val): row_hash for id_val, tag_val, row_hash in json.load(fh)}
+        return snapshot
+
+
+def export_instruments_to_excel(
+    mdb_path: str,
+    xlsx_path: str,
+    streaming: bool = False,
+    db: InstrumentDatabase | None = None,
+    progress=None,
+    fmt: str = 'xlsx',
+    snapshot: RowSnapshot | None = None,
+    since: RowSnapshot | None = None,
+) -> int:
+    """Export the Instruments table to an Excel workbook.
+
+    Only rows with Type='IO' are exported. The columns Tag, FullDescription,
+    EGULow, EGUHigh, RawLow, RawHigh and a set of alarm/warning columns are
+    written. The instruments are grouped into DigitalInput, DigitalOutput,
+    AnalogInput and AnalogOutput sheets. Returns the number of rows exported.
+
+    With ``streaming`` the rows are read from the cursor in chunks and written
+    straight to a write-only workbook, so memory use does not grow with the
+    size of the table. The resulting file has the same sheets and rows.
+
+    ``fmt`` selects another file format from ``EXPORT_FORMATS`` instead of a
+    workbook: ``csv`` writes a zip archive holding one CSV file per sheet,
+    ``jsonl`` writes one JSON object per row with its sheet in a ``sheet``
+    field, and ``parquet`` writes a single table with the same ``sheet``
+    column (this needs the optional ``pyarrow`` package). These are always
+    streamed from the cursor and are much cheaper to produce than a workbook.
+
+    A :class:`RowSnapshot` passed as ``snapshot`` receives the hash of every
+    exported row, computed as the rows stream past. With ``since``, an
+    earlier snapshot, only the rows added or changed since then are written,
+    and the rows it has that the database no longer exports are listed on an
+    extra ``Removed`` sheet (``ID`` and ``Tag``), which imports skip. Both
+    imply ``streaming``. The return value counts the rows written.
+
+    Pass an :class:`InstrumentDatabase` as ``db`` to reuse its connection and
+    cached metadata; otherwise a connection is opened and closed here with
+    :func:`open_database`.
+
+    ``progress`` is an optional callable invoked as ``progress(stage, rows)``
+    where ``rows`` maps sheet names to the number of rows handled so far.
+    """
+
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format {fmt}')
+    if progress is None:
+        progress = _no_progress
+
+    with _open_database(mdb_path, db) as db:
+        progress('connecting', {})
+        db.require_instruments()
+        cursor = db.cursor()
+        progress('querying', {})
+        cursor.execute(INSTRUMENT_QUERY)
+
+        if since is not None and snapshot is None:
+            snapshot = RowSnapshot()
+        if fmt != 'xlsx' or streaming or snapshot is not None:
+            return _EXPORT_WRITERS[fmt](
+                cursor, INSTRUMENT_HEADER, xlsx_path, progress, snapshot, since
+            )
+
+        rows = cursor.fetchall()
+
+        categories = {
+            'DigitalInput': [],
+            'DigitalOutput': [],
+            'AnalogInput': [],
+            'AnalogOutput': [],
+        }
+
+        for row in rows:
+            name = _row_sheet(row)
+            if name is not None:
+                categories[name].append(row)
+
+        progress('writing', {name: len(v) for name, v in categories.items()})
+        wb = Workbook()
+        default_sheet = wb.active
+        wb.remove(default_sheet)
+
+        for name, rows_list in categories.items():
+            ws = wb.create_sheet(name)
+            ws.append(INSTRUMENT_HEADER)
+            for row in rows_list:
+                ws.append(row[:len(INSTRUMENT_HEADER)])
+
+        progress('saving', {name: len(v) for name, v in categories.items()})
+        wb.save(xlsx_path)
+
+    return sum(len(v) for v in categories.values())
+
+
+def instrument_file_format(path: str) -> str:
+    """Return the ``EXPORT_FORMATS`` key matching the file name ``path``."""
+    name = path.lower()
+    for fmt, suffix in EXPORT_FORMATS.items():
+        if name.endswith(suffix):
+            return fmt
+    if name.endswith('.zip'):
+        return 'csv'
+    raise ValueError(f'Unsupported instrument file {os.path.basename(path)}')
+
+
+def _iter_export_rows(cursor, width: int, counts: dict, progress, snapshot=None, since=None):
+    """Yield ``(sheet, values)`` for each exported row of an executed query.
+
+    Rows are fetched ``FETCH_SIZE`` at a time. ``counts`` is updated with the
+    rows yielded per sheet and reported after every chunk. Every row is
+    added to ``snapshot`` if given, and rows whose hash is unchanged in
+    ``since`` are skipped.
+    """
+
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            name = _row_sheet(row)
+            if name is None:
+                continue
+            values = row[:width]
+            if snapshot is not None:
+                row_hash = snapshot.add(name, values)
+                if since is not None and since.get(values[0], values[1]) == row_hash:
+                    continue
+            counts[name] += 1
+            yield name, values
+        progress('writing', dict(counts))
+    progress('saving', dict(counts))
+
+
+def _removed_rows(snapshot, since):
+    """Return the ``[ID, Tag]`` rows a delta export lists as removed."""
+    if since is None:
+        return []
+    return [list(key) for key in since.removed_from(snapshot)]
+
+
+def _stream_instruments_to_excel(
+    cursor, header: list, xlsx_path: str, progress, snapshot=None, since=None
+) -> int:
+    """Write the rows of an executed export query to ``xlsx_path``.
+
+    Rows are fetched ``FETCH_SIZE`` at a time and appended directly to the
+    matching sheet of a write-only workbook. Returns the number of rows
+    written. ``snapshot`` and ``since`` are handled as in
+    :func:`export_instruments_to_excel`.
+    """
+
+    wb = Workbook(write_only=True)
+    sheets = {}
+    for name in INSTRUMENT_SHEETS:
+        sheets[name] = wb.create_sheet(name)
+        sheets[name].append(header)
+
+    counts = dict.fromkeys(sheets, 0)
+    for name, row in _iter_export_rows(cursor, len(header), counts, progress, snapshot, since):
+        sheets[name].append(row)
+
+    if since is not None:
+        removed = wb.create_sheet(REMOVED_SHEET)
+        removed.append(REMOVED_HEADER)
+        for row in _removed_rows(snapshot, since):
+            removed.append(row)
+
+    wb.save(xlsx_path)
+    return sum(counts.values())
+
+
+def _stream_instruments_to_csv_zip(
+    cursor, header: list, zip_path: str, progress, snapshot=None, since=None
+) -> int:
+    """Write an executed export query to ``zip_path`` as one CSV per sheet.
+
+    The zip format only allows one member to be written at a time, so each
+    sheet is spooled to its own temporary file while the rows are fetched and
+    the four files are then copied into the archive as ``<sheet>.csv``. A
+    delta export adds ``Removed.csv``.
+    """
+
+    counts = dict.fromkeys(INSTRUMENT_SHEETS, 0)
+    with ExitStack() as stack:
+        files = {}
+        writers = {}
+        for name in INSTRUMENT_SHEETS:
+            fh = stack.enter_context(io.TextIOWrapper(
+                tempfile.TemporaryFile(), encoding='utf-8', newline=''
+            ))
+            files[name] = fh
+            writers[name] = csv.writer(fh)
+            writers[name].writerow(header)
+
+        for name, row in _iter_export_rows(cursor, len(header), counts, progress, snapshot, since):
+            writers[name].writerow(row)
+
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, fh in files.items():
+                fh.flush()
+                fh.buffer.seek(0)
+                with zf.open(f'{name}.csv', 'w') as member:
+                    shutil.copyfileobj(fh.buffer, member, 1024 * 1024)
+            if since is not None:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(REMOVED_HEADER)
+                writer.writerows(_removed_rows(snapshot, since))
+                zf.writestr(f'{REMOVED_SHEET}.csv', buffer.getvalue())
+    return sum(counts.values())
+
+
+def _stream_instruments_to_jsonl(
+    cursor, header: list, jsonl_path: str, progress, snapshot=None, since=None
+) -> int:
+    """Write an executed export query to ``jsonl_path`` as JSON Lines.
+
+    Each line is an object with a ``sheet`` field followed by the columns of
+    ``header``. A delta export ends with one ``{"sheet": "Removed", "ID": ...,
+    "Tag": ...}`` line per removed row.
+    """
+
+    counts = dict.fromkeys(INSTRUMENT_SHEETS, 0)
+    with open(jsonl_path, 'w', encoding='utf-8') as fh:
+        for name, row in _iter_export_rows(cursor, len(header), counts, progress, snapshot, since):
+            record = {'sheet': name}
+            for column, value in zip(header, row):
+                record[column] = _typed_cell(column, value)
+            fh.write(json.dumps(record))
+            fh.write('\n')
+        for id_val, tag_val in _removed_rows(snapshot, since):
+            fh.write(json.dumps({'sheet': REMOVED_SHEET, 'ID': id_val, 'Tag': tag_val}))
+            fh.write('\n')
+    return sum(counts.values())
+
+
+def _stream_instruments_to_parquet(
+    cursor, header: list, parquet_path: str, progress, snapshot=None, since=None
+) -> int:
+    """Write an executed export query to ``parquet_path`` as a Parquet table.
+
+    The table has a ``sheet`` column followed by the columns of ``header``
+    with the types given by :func:`_column_kind`. Rows are buffered and
+    written ``PARQUET_ROW_GROUP_SIZE`` at a time. A delta export appends
+    the removed rows with ``sheet`` set to ``Removed`` and only ``ID`` and
+    ``Tag`` filled in.
+    """
+
+    pa, pq = _require_pyarrow()
+    schema = _parquet_schema(pa, header)
+    counts = dict.fromkeys(INSTRUMENT_SHEETS, 0)
+    columns = [[] for _ in schema.names]
+
+    with pq.ParquetWriter(parquet_path, schema) as writer:
+        rows = _iter_export_rows(cursor, len(header), counts, progress, snapshot, since)
+        removed = (
+            (REMOVED_SHEET, [id_val, tag_val] + [None] * (len(header) - 2))
+            for id_val, tag_val in _removed_rows(snapshot, since)
+        )
+        for name, row in itertools.chain(rows, removed):
+            columns[0].append(name)
+            for values, column, value in zip(columns[1:], header, row):
+                values.append(_typed_cell(column, value))
+            if len(columns[0]) >= PARQUET_ROW_GROUP_SIZE:
+                writer.write_table(pa.table(columns, schema=schema))
+                columns = [[] for _ in schema.names]
+        if columns[0]:
+            writer.write_table(pa.table(columns, schema=schema))
+    return sum(counts.values())
+
+
+_EXPORT_WRITERS = {
+    'xlsx': _stream_instruments_to_excel,
+    'csv': _stream_instruments_to_csv_zip,
+    'jsonl': _stream_instruments_to_jsonl,
+    'parquet': _stream_instruments_to_parquet,
+}
+
+
+def _require_pyarrow():
+    """Import ``pyarrow`` and ``pyarrow.parquet`` or raise ``ValueError``."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ValueError('Parquet files need the pyarrow package to be installed') from exc
+    return pyarrow, pyarrow.parquet
+
+
+def _parquet_schema(pa, header: list):
+    """Return the Parquet schema of an export with columns ``header``."""
+    types = {
+        'int': pa.int64(),
+        'float': pa.float64(),
+        'bool': pa.bool_(),
+        'text': pa.string(),
+    }
+    fields = [pa.field('sheet', pa.string())]
+    fields.extend(pa.field(column, types[_column_kind(column)]) for column in header)
+    return pa.schema(fields)
+
+
+def _column_kind(column: str) -> str:
+    """Return the value type of an exported column.
+
+    ``ID`` is an ``int``, ``Tag`` and ``FullDescription`` are ``text``, the
+    alarm enable flags are ``bool`` and every other column is a ``float``.
+    """
+
+    if column == 'ID':
+        return 'int'
+    if column in ('Tag', 'FullDescription'):
+        return 'text'
+    if column.endswith('_EN'):
+        return 'bool'
+    return 'float'
+
+
+def _typed_cell(column: str, value):
+    """Convert a database value to the plain type of ``column``.
+
+    Access returns some numeric columns as ``Decimal``; JSON and Parquet
+    need them as ``float``. Values that do not convert are left as they are.
+    """
+
+    if value is None:
+        return None
+    kind = _column_kind(column)
+    try:
+        if kind == 'float' and not isinstance(value, float):
+            return float(value)
+        if kind == 'int' and not isinstance(value, int):
+            return int(value)
+        if kind == 'bool' and not isinstance(value, bool):
+            return bool(value)
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+def _parse_csv_cell(column: str, text: str):
+    """Convert a cell read from an exported CSV file back to its value.
+
+    Empty cells become ``None``, as empty workbook cells do. Cells that do
+    not parse as the type of their column are returned as text so the
+    comparison reports them as changed rather than failing.
+    """
+
+    if text == '':
+        return None
+    kind = _column_kind(column)
+    if kind == 'text':
+        return text
+    if kind == 'bool':
+        lowered = text.lower()
+        if lowered in ('true', '1', '-1'):
+            return True
+        if lowered in ('false', '0'):
+            return False
+        return text
+    try:
+        return int(text) if kind == 'int' else float(text)
+    except ValueError:
+        return text
+
+
+class InstrumentDiff:
+    """Changes an import file would make to the Instruments table.
+
+    ``rows`` lists every row of the file that changes something, as a dict
+    with ``sheet``, ``row``, ``ID``, ``Tag`` and ``changes`` (column ->
+    ``[old, new]``). ``column_counts`` counts the changed cells per column,
+    ``sheet_counts`` the changed rows per sheet and ``rows_read`` every row
+    read from each sheet. ``unknown`` lists the rows
+    whose ``ID``/``Tag`` is not in the database. ``pending`` holds the merged
+    new values per ``(ID, Tag)`` that :func:`apply_instrument_diff` writes.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.column_counts = {}
+        self.sheet_counts = dict.fromkeys(INSTRUMENT_SHEETS, 0)
+        self.rows_read = dict.fromkeys(INSTRUMENT_SHEETS, 0)
+        self.unknown = []
+        self.pending = {}
+
+    @property
+    def updated_rows(self) -> int:
+        return len(self.rows)
+
+    def to_dict(self, limit: int | None = None) -> dict:
+        """Return the diff as JSON-ready data, listing at most ``limit`` rows."""
+        rows = self.rows if limit is None else self.rows[:limit]
+        return {
+            'updated_rows': self.updated_rows,
+            'sheet_counts': self.sheet_counts,
+            'rows_read': self.rows_read,
+            'column_counts': self.column_counts,
+            'unknown': self.unknown,
+            'rows': rows,
+            'truncated': len(rows) < len(self.rows),
+        }
+
+    def dump(self, fh) -> None:
+        """Write the whole diff, including ``pending``, to ``fh`` as JSON."""
+        data = self.to_dict()
+        data['pending'] = [[id_val, tag_val, changed] for (id_val, tag_val), changed in self.pending.items()]
+        json.dump(data, fh, default=_encode_cell)
+
+    @classmethod
+    def load(cls, fh) -> 'InstrumentDiff':
+        """Read a diff written by :meth:`dump`."""
+        data = json.load(fh, object_hook=_decode_cell)
+        diff = cls()
+        diff.rows = data['rows']
+        diff.column_counts = data['column_counts']
+        diff.sheet_counts = data['sheet_counts']
+        diff.rows_read = data['rows_read']
+        diff.unknown = data['unknown']
+        diff.pending = {(id_val, tag_val): changed for id_val, tag_val, changed in data['pending']}
+        return diff
+
+
+# Cell types kept through a JSON round trip, tagged as ``{"__type__": name, "value": text}``.
+_CELL_TYPES = {
+    'datetime': (datetime.datetime, datetime.datetime.isoformat, datetime.datetime.fromisoformat),
+    'date': (datetime.date, datetime.date.isoformat, datetime.date.fromisoformat),
+    'time': (datetime.time, datetime.time.isoformat, datetime.time.fromisoformat),
+    'decimal': (Decimal, str, Decimal),
+    'bytes': (bytes, lambda v: base64.b64encode(v).decode('ascii'), base64.b64decode),
+}
+
+
+def _encode_cell(value):
+    """``default`` for :func:`json.dump` keeping the types of :data:`_CELL_TYPES`."""
+    for name, (cls, encode, _) in _CELL_TYPES.items():
+        if isinstance(value, cls):
+            return {'__type__': name, 'value': encode(value)}
+    raise TypeError(f'Cannot store a {type(value).__name__} cell')
+
+
+def _decode_cell(obj: dict):
+    """``object_hook`` reversing :func:`_encode_cell`."""
+    if obj.keys() == {'__type__', 'value'} and obj['__type__'] in _CELL_TYPES:
+        return _CELL_TYPES[obj['__type__']][2](obj['value'])
+    return obj
+
+
+def diff_instruments(
+    mdb_path: str,
+    excel_path: str,
+    db: InstrumentDatabase | None = None,
+    progress=None,
+    fmt: str | None = None,
+    start_after: tuple | None = None,
+) -> InstrumentDiff:
+    """Compare an import file with the Instruments table without changing it.
+
+    The file is validated and read as in :func:`update_instruments_from_excel`
+    and every row is compared against one snapshot of the table. No write
+    transaction is opened. Rows with an unknown ``ID``/``Tag`` are collected
+    in the result rather than stopping the comparison. ``db``, ``progress``
+    and ``fmt`` are handled as in :func:`update_instruments_from_excel`.
+
+    With ``start_after``, a ``(sheet, row)`` position, the rows up to and
+    including that one are read but not compared.
+    """
+
+    expected_header = INSTRUMENT_HEADER
+
+    if fmt is None:
+        fmt = instrument_file_format(excel_path)
+    if progress is None:
+        progress = _no_progress
+
+    progress('reading workbook', {})
+    with _open_instrument_source(excel_path, fmt, expected_header) as rows:
+        width = len(expected_header)
+        diff = InstrumentDiff()
+        counts = diff.rows_read
+
+        with _open_database(mdb_path, db) as db:
+            progress('connecting', counts)
+            db.require_instruments()
+            progress('loading database', counts)
+            fold_case = db.case_insensitive_text
+            index = _load_instrument_index(db.cursor(), expected_header, fold_case)
+
+        skipping = start_after is not None
+        for seen, (sheet_name, row_idx, row) in enumerate(rows, start=1):
+            counts[sheet_name] += 1
+            if seen % FETCH_SIZE == 0:
+                progress('comparing', dict(counts))
+            if skipping:
+                skipping = (sheet_name, row_idx) != start_after
+                continue
+            if all(cell is None for cell in row):
+                continue
+
+            entry = index.get(_instrument_key(row[0], row[1], fold_case))
+            if entry is None:
+                diff.unknown.append({'sheet': sheet_name, 'row': row_idx, 'ID': row[0], 'Tag': row[1]})
+                continue
+            # Changes are recorded against the ID and Tag stored in the
+            # database, which the UPDATE statements match exactly.
+            key, db_values = entry
+
+            changes = {}
+            for pos in range(width - 2):
+                excel_val = row[pos + 2]
+                if excel_val != db_values[pos]:
+                    column = expected_header[pos + 2]
+                    changes[column] = [db_values[pos], excel_val]
+                    diff.column_counts[column] = diff.column_counts.get(column, 0) + 1
+                    # Later rows for the same ID/Tag compare against
+                    # the value this row leaves behind, as they did
+                    # when each row was read back from the database.
+                    db_values[pos] = excel_val
+
+            if changes:
+                pending = diff.pending.setdefault(key, {})
+                for column, (_, new) in changes.items():
+                    pending[column] = new
+                diff.rows.append({
+                    'sheet': sheet_name,
+                    'row': row_idx,
+                    'ID': key[0],
+                    'Tag': key[1],
+                    'changes': changes,
+                })
+                diff.sheet_counts[sheet_name] += 1
+
+        progress('comparing', dict(counts))
+
+    return diff
+
+
+class CheckpointMismatch(ValueError):
+    """Raised when an import checkpoint was written for a different file."""
+
+
+class ImportCheckpoint:
+    """Progress of a chunked import, saved after every committed chunk.
+
+    Stored as JSON at ``path``: the SHA-256 digest of the import file
+    (``source``), the ``sheet`` and ``row`` of the last row committed and the
+    number of changed rows ``applied`` so far.
+    """
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = source
+        self.sheet = None
+        self.row = None
+        self.applied = 0
+
+    @classmethod
+    def open(cls, path: str, excel_path: str) -> 'ImportCheckpoint':
+        """Load the checkpoint at ``path``, or start a new one if there is none.
+
+        Raises :class:`CheckpointMismatch` if the checkpoint was written for
+        another file.
+        """
+        checkpoint = cls(path, _file_digest(excel_path))
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            return checkpoint
+        if data['source'] != checkpoint.source:
+            raise CheckpointMismatch(
+                f'{os.path.basename(path)} was written for a different import file; delete it to start over'
+            )
+        checkpoint.sheet = data['sheet']
+        checkpoint.row = data['row']
+        checkpoint.applied = data['applied']
+        return checkpoint
+
+    @property
+    def position(self) -> tuple | None:
+        """``(sheet, row)`` of the last row committed, if any."""
+        return None if self.sheet is None else (self.sheet, self.row)
+
+    def save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as fh:
+            json.dump({
+                'source': self.source,
+                'sheet': self.sheet,
+                'row': self.row,
+                'applied': self.applied,
+            }, fh)
+        os.replace(fh.name, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def apply_instrument_diff(
+    mdb_path: str,
+    diff: InstrumentDiff,
+    db: InstrumentDatabase | None = None,
+    progress=None,
+    chunk_size: int | None = None,
+    checkpoint: ImportCheckpoint | None = None,
+) -> int:
+    """Write the changes of ``diff`` to the Instruments table.
+
+    A diff with unknown rows is rejected with the first of them, as
+    :func:`update_instruments_from_excel` would. The changes are written in
+    one transaction and the number of modified rows is returned.
+
+    With ``chunk_size`` the changed rows are written in file order and
+    committed every ``chunk_size`` rows instead, and ``checkpoint`` (if
+    given) is saved after each commit. The count returned then includes
+    the rows ``checkpoint`` had already applied.
+    """
+
+    if diff.unknown:
+        first = diff.unknown[0]
+        raise ValueError(f"Row {first['row']} in sheet {first['sheet']} has unknown ID/Tag")
+    if progress is None:
+        progress = _no_progress
+
+    with _open_database(mdb_path, db) as db:
+        db.require_instruments()
+        if not chunk_size:
+            with db.transaction() as cursor:
+                progress('writing changes', dict(diff.rows_read))
+                _apply_instrument_updates(cursor, diff.pending, INSTRUMENT_HEADER)
+            return diff.updated_rows
+
+        applied = checkpoint.applied if checkpoint is not None else 0
+        for start in range(0, len(diff.rows), chunk_size):
+            progress('writing changes', dict(diff.rows_read))
+            chunk = diff.rows[start:start + chunk_size]
+            pending = {}
+            for row in chunk:
+                changed = pending.setdefault((row['ID'], row['Tag']), {})
+                changed.update((column, new) for column, (_, new) in row['changes'].items())
+            with db.transaction() as cursor:
+                _apply_instrument_updates(cursor, pending, INSTRUMENT_HEADER)
+            applied += len(chunk)
+            if checkpoint is not None:
+                checkpoint.sheet = chunk[-1]['sheet']
+                checkpoint.row = chunk[-1]['row']
+                checkpoint.applied = applied
+                checkpoint.save()
+    return applied
+
+
+def update_instruments_from_excel(
+    mdb_path: str,
+    excel_path: str,
+    db: InstrumentDatabase | None = None,
+    progress=None,
+    fmt: str | None = None,
+    chunk_size: int | None = None,
+    checkpoint_path: str | None = None,
+) -> int:
+    """Update the Instruments table using data from an exported Excel workbook.
+
+    The Excel file must contain sheets named DigitalInput, DigitalOutput,
+    AnalogInput and AnalogOutput with the same columns as produced by
+    ``export_instruments_to_excel``. Only rows with matching ``ID`` and ``Tag``
+    are updated. The function returns the number of rows that were modified.
+
+    The workbook is parsed in read-only mode: every sheet header is checked
+    before any rows are read, and rows are streamed as plain tuples. The
+    Instruments table is read once and every sheet is compared against
+    that snapshot in memory by :func:`diff_instruments`. The changed rows are
+    then written by :func:`apply_instrument_diff` in batches grouped by the
+    columns they change, all inside a single transaction. ``db`` and
+    ``progress`` are handled as in :func:`export_instruments_to_excel`.
+
+    Any of the other export formats may be given instead of a workbook;
+    ``fmt`` names it and is otherwise taken from the file name. A CSV archive
+    must hold all four sheets and their headers are checked before any rows
+    are read, as are the columns of a Parquet file. JSON Lines records are
+    checked one line at a time.
+
+    By default the import is all or nothing. With ``chunk_size`` it commits
+    every ``chunk_size`` changed rows instead, so a huge import does not
+    hold one long transaction. A ``checkpoint_path`` then records the
+    progress after every commit (see :class:`ImportCheckpoint`): if the
+    import fails, running it again with the same file and checkpoint
+    resumes after the last committed row, and the checkpoint is removed once
+    the import completes.
+    """
+
+    checkpoint = None
+    if checkpoint_path is not None:
+        if not chunk_size:
+            raise ValueError('A checkpoint needs a chunk size')
+        checkpoint = ImportCheckpoint.open(checkpoint_path, excel_path)
+
+    with _open_database(mdb_path, db) as db:
+        diff = diff_instruments(
+            mdb_path,
+            excel_path,
+            db=db,
+            progress=progress,
+            fmt=fmt,
+            start_after=checkpoint.position if checkpoint is not None else None,
+        )
+        updated = apply_instrument_diff(
+            mdb_path,
+            diff,
+            db=db,
+            progress=progress,
+            chunk_size=chunk_size,
+            checkpoint=checkpoint,
+        )
+    if checkpoint is not None:
+        checkpoint.clear()
+    return updated
+
+
+def _no_progress(stage: str, rows: dict) -> None:
+    """Default ``progress`` callback that ignores all reports."""
+
+
+@contextmanager
+def _open_instrument_source(path: str, fmt: str, expected_header: list):
+    """Open an exported instrument file and yield an iterator over its rows.
+
+    The iterator produces ``(sheet, row number, values)`` with ``values`` in
+    the order of ``expected_header``. Headers are validated before this
+    yields wherever the format allows it.
+    """
+
+    if fmt == 'xlsx':
+        try:
+            wb = load_workbook(path, read_only=True, data_only=True)
+        except KeyError as exc:
+            # openpyxl looks parts up by name in any zip archive it is given.
+            raise ValueError(f'Not an Excel workbook: {exc}') from exc
+        try:
+            sheets = _open_instrument_sheets(wb, expected_header)
+            yield _iter_workbook_rows(sheets, len(expected_header))
+        finally:
+            wb.close()
+    elif fmt == 'csv':
+        with zipfile.ZipFile(path) as zf, ExitStack() as stack:
+            readers = _open_csv_sheets(zf, expected_header, stack)
+            yield _iter_csv_rows(readers, expected_header)
+    elif fmt == 'jsonl':
+        with open(path, encoding='utf-8') as fh:
+            yield _iter_jsonl_rows(fh, expected_header)
+    elif fmt == 'parquet':
+        _, pq = _require_pyarrow()
+        pf = pq.ParquetFile(path)
+        try:
+            columns = ['sheet'] + expected_header
+            if sorted(pf.schema_arrow.names) != sorted(columns):
+                raise ValueError('Invalid columns in Parquet file')
+            yield _iter_parquet_rows(pf, columns)
+        finally:
+            pf.close()
+    else:
+        raise ValueError(f'Unknown import format {fmt}')
+
+
+def _open_instrument_sheets(wb, expected_header: list) -> dict:
+    """Return the four category sheets of ``wb`` after checking their headers.
+
+    Only the first row of each sheet is parsed here, so a workbook with a
+    missing sheet or a wrong column layout is rejected before any of its
+    rows are read.
+    """
+
+    sheets = {}
+    for sheet_name in INSTRUMENT_SHEETS:
+        if sheet_name not in wb.sheetnames:
+            raise ValueError(f'Sheet {sheet_name} missing from Excel file')
+        ws = wb[sheet_name]
+        # Read-only sheets trust the stored dimensions, which not every
+        # writer gets right; scan the actual rows instead.
+        ws.reset_dimensions()
+        header = list(next(ws.iter_rows(max_row=1, values_only=True), ()))
+        while header and header[-1] is None:
+            header.pop()
+        if header != expected_header:
+            raise ValueError(f'Invalid header in sheet {sheet_name}')
+        sheets[sheet_name] = ws
+    return sheets
+
+
+def _iter_workbook_rows(sheets: dict, width: int):
+    """Yield the data rows of the sheets from :func:`_open_instrument_sheets`."""
+    for sheet_name, ws in sheets.items():
+        rows = ws.iter_rows(min_row=2, max_col=width, values_only=True)
+        for row_idx, row in enumerate(rows, start=2):
+            yield sheet_name, row_idx, row
+
+
+def _open_csv_sheets(zf: zipfile.ZipFile, expected_header: list, stack: ExitStack) -> dict:
+    """Return a CSV reader per sheet of an export archive, past its header.
+
+    Like :func:`_open_instrument_sheets`, every member must be present and
+    have the expected header before any rows are read.
+    """
+
+    members = {os.path.basename(name): name for name in zf.namelist()}
+    readers = {}
+    for sheet_name in INSTRUMENT_SHEETS:
+        member = members.get(f'{sheet_name}.csv')
+        if member is None:
+            raise ValueError(f'Sheet {sheet_name} missing from CSV archive')
+        fh = stack.enter_context(io.TextIOWrapper(zf.open(member), encoding='utf-8-sig', newline=''))
+        reader = csv.reader(fh)
+        header = next(reader, [])
+        while header and header[-1] == '':
+            header.pop()
+        if header != expected_header:
+            raise ValueError(f'Invalid header in sheet {sheet_name}')
+        readers[sheet_name] = reader
+    return readers
+
+
+def _iter_csv_rows(readers: dict, expected_header: list):
+    """Yield the data rows of an export archive with their cells parsed."""
+    width = len(expected_header)
+    for sheet_name, reader in readers.items():
+        for row_idx, row in enumerate(reader, start=2):
+            row = row[:width] + [''] * (width - len(row))
+            yield sheet_name, row_idx, [
+                _parse_csv_cell(column, text) for column, text in zip(expected_header, row)
+            ]
+
+
+def _iter_jsonl_rows(fh, expected_header: list):
+    """Yield the records of a JSON Lines export, checking each one's fields."""
+    fields = set(expected_header)
+    fields.add('sheet')
+    for row_idx, line in enumerate(fh, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            raise ValueError(f'Line {row_idx} is not valid JSON: {exc}') from exc
+        if isinstance(record, dict) and record.get('sheet') == REMOVED_SHEET:
+            continue
+        if not isinstance(record, dict) or set(record) != fields:
+            raise ValueError(f'Invalid fields on line {row_idx}')
+        sheet_name = record['sheet']
+        if sheet_name not in INSTRUMENT_SHEETS:
+            raise ValueError(f'Unknown sheet {sheet_name} on line {row_idx}')
+        yield sheet_name, row_idx, [record[column] for column in expected_header]
+
+
+def _iter_parquet_rows(pf, columns: list):
+    """Yield the rows of a Parquet export ``FETCH_SIZE`` at a time."""
+    row_idx = 0
+    for batch in pf.iter_batches(batch_size=FETCH_SIZE, columns=columns):
+        data = batch.to_pydict()
+        for values in zip(*(data[column] for column in columns)):
+            row_idx += 1
+            sheet_name = values[0]
+            if sheet_name == REMOVED_SHEET:
+                continue
+            if sheet_name not in INSTRUMENT_SHEETS:
+                raise ValueError(f'Unknown sheet {sheet_name} in row {row_idx}')
+            yield sheet_name, row_idx, list(values[1:])
+
+
+def _instrument_key(id_val, tag_val, fold_case: bool = False) -> tuple:
+    """Return the lookup key of an ``ID`` and ``Tag`` from a database or import file.
+
+    An ID holding a whole number, such as ``12.0`` or ``'12'`` read back
+    from a workbook, becomes an ``int`` and a tag becomes text, casefolded
+    with ``fold_case``. Rows then match as they did when the Access driver
+    compared them in SQL.
+    """
+
+    try:
+        number = float(id_val)
+    except (TypeError, ValueError):
+        pass
+    else:
+        if number.is_integer():
+            id_val = int(number)
+    if isinstance(tag_val, float) and tag_val.is_integer():
+        tag_val = int(tag_val)
+    if tag_val is not None:
+        tag_val = str(tag_val)
+        if fold_case:
+            tag_val = tag_val.casefold()
+    return id_val, tag_val
+
+
+def _load_instrument_index(cursor, columns: list, fold_case: bool = False) -> dict:
+    """Read the Instruments table once into a dict keyed by :func:`_instrument_key`.
+
+    ``columns`` must start with ``ID`` and ``Tag``. Each entry holds the
+    row's stored ``(ID, Tag)`` and a list of its remaining values in the
+    same order, so callers can compare and update them in place.
+    """
+
+    cursor.execute(
+        'SELECT ' + ', '.join(columns) + ' FROM Instruments WHERE Tag IS NOT NULL'
+    )
+    index = {}
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            index[_instrument_key(row[0], row[1], fold_case)] = ((row[0], row[1]), list(row[2:]))
+    return index
+
+
+def _apply_instrument_updates(cursor, pending: dict, columns: list) -> None:
+    """Write the changed fields in ``pending`` back to the Instruments table.
+
+    ``pending`` maps ``(ID, Tag)`` to a dict of column -> new value. Rows are
+    grouped by the set of columns they change so each group is sent with a
+    single ``executemany`` call.
+    """
+
+    groups = {}
+    for (id_val, tag_val), changed in pending.items():
+        cols = tuple(col for col in columns if col in changed)
+        params = [changed[col] for col in cols]
+        params.extend([id_val, tag_val])
+        groups.setdefault(cols, []).append(params)
+
+    for cols, params in groups.items():
+        cursor.executemany(
+            f"UPDATE Instruments SET {', '.join(f'{col}=?' for col in cols)} WHERE ID=? AND Tag=?",
+            params
+        )
+
+
+def read_instrument_setpoints(
+    mdb_path: str,
+    db: InstrumentDatabase | None = None,
+    members: tuple = SETPOINT_MEMBERS,
+) -> list:
+    """Return the exported instruments with their alarm setpoints.
+
+    Each item is a dict with ``id``, ``tag``, ``sheet`` and ``setpoints``, the latter
+    mapping each name in ``members`` to its value in the database.
+    The same rows as :func:`export_instruments_to_excel` are returned.
+    """
+
+    positions = [INSTRUMENT_HEADER.index(member) for member in members]
+    instruments = []
+    with _open_database(mdb_path, db) as db:
+        db.require_instruments()
+        cursor = db.cursor()
+        cursor.execute(INSTRUMENT_QUERY)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                sheet = _row_sheet(row)
+                if sheet is None:
+                    continue
+                instruments.append({
+                    'id': row[0],
+                    'tag': row[1],
+                    'sheet': sheet,
+                    'setpoints': {m: row[pos] for m, pos in zip(members, positions)},
+                })
+    return instruments
+
+
+def read_file_setpoints(path: str, fmt: str | None = None, members: tuple = SETPOINT_MEMBERS) -> list:
+    """Return the instruments of an exported file like :func:`read_instrument_setpoints`.
+
+    The file is validated as on import; blank rows are skipped.
+    """
+
+    if fmt is None:
+        fmt = instrument_file_format(path)
+    positions = [INSTRUMENT_HEADER.index(member) for member in members]
+    instruments = []
+    with _open_instrument_source(path, fmt, INSTRUMENT_HEADER) as rows:
+        for sheet, _, row in rows:
+            if all(cell is None for cell in row):
+                continue
+            instruments.append({
+                'id': row[0],
+                'tag': row[1],
+                'sheet': sheet,
+                'setpoints': {m: row[pos] for m, pos in zip(members, positions)},
+            })
+    return instruments
+
+
+class InstrumentTable:
+    """The exported rows of an ``Instruments`` table, held in memory by column.
+
+    ``columns`` maps every name in ``INSTRUMENT_HEADER`` to a list of its
+    values, and ``sheets`` holds each row's sheet (its category). Rows are
+    indexed by ID, by tag (case-insensitively, with a sorted copy of the tags
+    for prefix searches) and by sheet, and ``alarms`` holds a bit per enabled
+    alarm in ``ALARM_NAMES``. :meth:`query` only looks at the rows the most
+    selective of these lets through.
+    """
+
+    def __init__(self, rows):
+        self.columns = {name: [] for name in INSTRUMENT_HEADER}
+        self.sheets = []
+        self.alarms = array('B')
+        self.by_id = {}
+        self.by_tag = {}
+        self.by_sheet = {sheet: array('I') for sheet in INSTRUMENT_SHEETS}
+        columns = [self.columns[name] for name in INSTRUMENT_HEADER]
+        enabled = [INSTRUMENT_HEADER.index(f'{alarm}_EN') for alarm in ALARM_NAMES]
+        for i, (sheet, values) in enumerate(rows):
+            for column, value in zip(columns, values):
+                column.append(value)
+            self.sheets.append(sheet)
+            self.alarms.append(sum(1 << bit for bit, pos in enumerate(enabled) if values[pos]))
+            self.by_id.setdefault(values[0], []).append(i)
+            self.by_tag.setdefault(str(values[1]).casefold(), []).append(i)
+            self.by_sheet[sheet].append(i)
+        tags = sorted((str(tag).casefold(), i) for i, tag in enumerate(self.columns['Tag']))
+        self._tag_keys = [tag for tag, _ in tags]
+        self._tag_rows = array('I', (i for _, i in tags))
+        self.nbytes = self._estimate_bytes()
+
+    def __len__(self) -> int:
+        return len(self.sheets)
+
+    @classmethod
+    def load(cls, mdb_path: str, db: InstrumentDatabase | None = None) -> 'InstrumentTable':
+        """Read the rows :func:`export_instruments_to_excel` would export."""
+        width = len(INSTRUMENT_HEADER)
+
+        def rows(cursor):
+            while True:
+                batch = cursor.fetchmany(FETCH_SIZE)
+                if not batch:
+                    break
+                for row in batch:
+                    sheet = _row_sheet(row)
+                    if sheet is not None:
+                        yield sheet, tuple(row[:width])
+
+        with _open_database(mdb_path, db) as db:
+            db.require_instruments()
+            cursor = db.cursor()
+            cursor.execute(INSTRUMENT_QUERY)
+            return cls(rows(cursor))
+
+    def counts(self) -> dict:
+        """Return the number of rows on each sheet."""
+        return {sheet: len(rows) for sheet, rows in self.by_sheet.items()}
+
+    def query(
+        self,
+        ids=None,
+        tags=None,
+        tag_prefix: str | None = None,
+        sheets=None,
+        alarms=None,
+        offset: int = 0,
+        limit: int | None = None,
+        columns=None,
+    ) -> tuple[int, list]:
+        """Return ``(total, rows)`` for the rows matching every filter given.
+
+        ``ids``, ``tags`` and ``sheets`` match any of their values; tags and
+        ``tag_prefix`` ignore case. ``alarms`` names alarms from
+        ``ALARM_NAMES`` that must be enabled, or disabled when prefixed with
+        ``!``. Matching rows are counted in ``total`` and returned in table
+        order from ``offset``, at most ``limit`` of them, as dicts with
+        ``sheet`` and the ``columns`` asked for (all by default). Unknown
+        alarm or column names raise ``ValueError``.
+        """
+
+        required = forbidden = 0
+        for name in alarms or ():
+            negate = name.startswith('!')
+            alarm = name[1:] if negate else name
+            if alarm.upper() not in ALARM_NAMES:
+                raise ValueError(f'Unknown alarm {alarm}')
+            bit = 1 << ALARM_NAMES.index(alarm.upper())
+            if negate:
+                forbidden |= bit
+            else:
+                required |= bit
+        columns = list(INSTRUMENT_HEADER) if columns is None else list(columns)
+        unknown = [name for name in columns if name not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown column {', '.join(unknown)}")
+        sheets = set(sheets) if sheets else None
+
+        # Start from the smallest index lookup and check the rest per row.
+        candidates = None
+        for selected in (
+            None if ids is None else self._lookup(self.by_id, ids),
+            None if tags is None else self._lookup(self.by_tag, (str(t).casefold() for t in tags)),
+            None if tag_prefix is None else self._prefix_rows(tag_prefix.casefold()),
+        ):
+            if selected is not None:
+                candidates = selected if candidates is None else candidates & selected
+        if candidates is not None:
+            rows = sorted(candidates)
+        elif sheets is not None:
+            rows = sorted(i for sheet in sheets for i in self.by_sheet.get(sheet, ()))
+            sheets = None
+        else:
+            rows = range(len(self))
+
+        if sheets is not None or required or forbidden:
+            alarm_bits = self.alarms
+            rows = [
+                i for i in rows
+                if (sheets is None or self.sheets[i] in sheets)
+                and alarm_bits[i] & required == required
+                and not alarm_bits[i] & forbidden
+            ]
+        total = len(rows)
+        page = rows[offset:] if limit is None else rows[offset:offset + limit]
+        values = [self.columns[name] for name in columns]
+        return total, [
+            dict(zip(columns, (column[i] for column in values)), sheet=self.sheets[i])
+            for i in page
+        ]
+
+    @staticmethod
+    def _lookup(index: dict, keys) -> set:
+        return {i for key in keys for i in index.get(key, ())}
+
+    def _prefix_rows(self, prefix: str) -> set:
+        start = bisect.bisect_left(self._tag_keys, prefix)
+        end = bisect.bisect_left(self._tag_keys, prefix + chr(sys.maxunicode), start)
+        return set(self._tag_rows[start:end])
+
+    def _estimate_bytes(self) -> int:
+        """Estimate the memory held by the table from a sample of its values."""
+        count = len(self)
+        step = max(1, count // 1000)
+        size = sys.getsizeof(self.sheets) + self.alarms.itemsize * len(self.alarms)
+        for column in self.columns.values():
+            sample = column[::step]
+            size += sys.getsizeof(column)
+            if sample:
+                size += sum(sys.getsizeof(v) for v in sample if v is not None) * count // len(sample)
+        size += sys.getsizeof(self.by_id) + sys.getsizeof(self.by_tag)
+        # Each index entry is a one-item list in the common case.
+        size += (len(self.by_id) + len(self.by_tag)) * sys.getsizeof([0])
+        size += sys.getsizeof(self._tag_keys) + sum(sys.getsizeof(t) for t in self._tag_keys[::step]) * step
+        size += sum(rows.itemsize * len(rows) for rows in self.by_sheet.values())
+        size += self._tag_rows.itemsize * len(self._tag_rows)
+        return size
+
+
+def _row_sheet(row) -> str | None:
+    """Return the sheet an ``INSTRUMENT_QUERY`` row is exported to, if any."""
+    width = len(INSTRUMENT_HEADER)
+    for name, flag in zip(INSTRUMENT_SHEETS, row[width:width + 4]):
+        if flag:
+            return name
+    return None
@@ -0,0 +1,186 @@
+"""Prometheus metrics shared by the web server and the instrument pipelines.
+
+:data:`metrics` is the process-wide registry rendered at ``/metrics``;
+:class:`StageTimer` records the stages of an export or import run in it.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Metrics exposed at /metrics: name -> (Prometheus type, help text).
+METRIC_HELP = {
+    'plcpoke_stage_seconds': ('histogram', 'Time spent in each stage of a pipeline.'),
+    'plcpoke_pipeline_seconds': ('histogram', 'Total time of each pipeline run.'),
+    'plcpoke_pipeline_runs_total': ('counter', 'Pipeline runs by outcome.'),
+    'plcpoke_rows_total': ('counter', 'Rows handled by each pipeline.'),
+    'plcpoke_rows_per_second': ('gauge', 'Throughput of the latest run of each pipeline.'),
+    'plcpoke_bytes_total': ('counter', 'Bytes uploaded, written and downloaded.'),
+    'plcpoke_cache_requests_total': ('counter', 'Result cache lookups by outcome.'),
+    'plcpoke_db_seconds': ('histogram', 'Time spent connecting to and introspecting databases.'),
+    'plcpoke_plc_seconds': ('histogram', 'Time spent on PLC connects, tag uploads, reads and writes.'),
+    'plcpoke_plc_tags_read_total': ('counter', 'Tags read from PLCs.'),
+    'plcpoke_plc_tags_written_total': ('counter', 'Tags written to PLCs.'),
+    'plcpoke_poll_subscriptions': ('gauge', 'Viewers watching live tags, by controller.'),
+    'plcpoke_poll_tags': ('gauge', 'Tags polled for live viewers, by controller.'),
+    'plcpoke_instrument_store_datasets': ('gauge', 'Instrument tables held in memory for queries.'),
+    'plcpoke_instrument_store_bytes': ('gauge', 'Estimated size of the instrument tables held in memory.'),
+    'plcpoke_instrument_store_evictions_total': ('counter', 'Instrument tables dropped from memory.'),
+    'plcpoke_http_requests_total': ('counter', 'HTTP requests by endpoint and status.'),
+    'plcpoke_http_request_seconds': ('histogram', 'HTTP request duration by endpoint.'),
+}
+
+# Upper bounds, in seconds, of the histogram buckets.
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms for the ``/metrics`` page.
+
+    Every metric name must be listed in ``METRIC_HELP``. Samples are keyed by
+    their label values, given as keyword arguments, and :meth:`render`
+    returns them in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets: tuple = METRIC_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values = {}
+        self._histograms = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the time spent in the ``with`` block under ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text) in METRIC_HELP.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'histogram':
+                for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, bucket_count in zip(self.buckets, counts):
+                        le = (('le', f'{bound:g}'),)
+                        lines.append(f'{name}_bucket{_metric_labels(labels + le)} {bucket_count}')
+                    lines.append(f"{name}_bucket{_metric_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f'{name}_sum{_metric_labels(labels)} {_metric_value(total)}')
+                    lines.append(f'{name}_count{_metric_labels(labels)} {count}')
+            else:
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_metric_labels(labels)} {_metric_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _metric_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _metric_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+metrics = Metrics()
+
+
+class StageTimer:
+    """``progress`` callback that times the stages of one pipeline run.
+
+    A stage lasts from its first report until a different stage is
+    reported, or until the timer is closed. Closing it (it is also a context
+    manager) records every stage, the total time, the rows from the last
+    report and the resulting rows per second in :data:`metrics` under
+    ``pipeline``. Each report is also passed on to ``forward`` when given,
+    so the timer can wrap another callback such as :meth:`Job.report`.
+    """
+
+    def __init__(self, pipeline: str, forward=None):
+        self.pipeline = pipeline
+        self.forward = forward
+        self.stages = {}
+        self.rows = 0
+        self.seconds = 0.0
+        self._start = self._stage_start = time.perf_counter()
+        self._stage = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close('error' if exc_type else 'ok')
+
+    def __call__(self, stage: str, rows: dict) -> None:
+        if stage != self._stage:
+            self._end_stage()
+            self._stage = stage
+        self.rows = sum(rows.values())
+        if self.forward is not None:
+            self.forward(stage, rows)
+
+    def _end_stage(self) -> None:
+        now = time.perf_counter()
+        if self._stage is not None:
+            elapsed = now - self._stage_start
+            self.stages[self._stage] = self.stages.get(self._stage, 0.0) + elapsed
+            metrics.observe('plcpoke_stage_seconds', elapsed, pipeline=self.pipeline, stage=self._stage)
+        self._stage_start = now
+
+    def close(self, outcome: str = 'ok') -> None:
+        self._end_stage()
+        self._stage = None
+        self.seconds = time.perf_counter() - self._start
+        metrics.observe('plcpoke_pipeline_seconds', self.seconds, pipeline=self.pipeline)
+        metrics.inc('plcpoke_pipeline_runs_total', pipeline=self.pipeline, outcome=outcome)
+        metrics.inc('plcpoke_rows_total', self.rows, pipeline=self.pipeline)
+        if outcome == 'ok' and self.rows and self.seconds > 0:
+            metrics.set('plcpoke_rows_per_second', self.rows / self.seconds, pipeline=self.pipeline)
+
+    def to_dict(self) -> dict:
+        """Summary of the run for the structured request log."""
+        return {
+            'pipeline': self.pipeline,
+            'seconds': round(self.seconds, 4),
+            'rows': self.rows,
+            'stages': {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+        }
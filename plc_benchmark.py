@@ -0,0 +1,301 @@
+"""Load-test the PLC connection, tag upload and tag reads against a simulator.
+
+Starts :mod:`plc_simulator` in a separate process for every tag count, then
+measures through pycomm3's ``LogixDriver``, as the PLC pages use it:
+
+* ``connect``: opening a session without the tag upload, in connects/s;
+* ``upload``: ``get_tag_list(program='*')``, in tags/s;
+* ``read``: reading the uploaded tags in batches from ``--clients``
+  connections at once for ``--duration`` seconds, in tags/s.
+
+Examples::
+
+    python plc_benchmark.py
+    python plc_benchmark.py --tags 1000,100000 --latency 0.002 --jitter 0.001
+    python plc_benchmark.py --clients 4 --batch-size 200 --output baseline.json
+    python plc_benchmark.py --baseline baseline.json --tolerance 0.25
+    python plc_benchmark.py --target 192.168.1.10/0
+
+With ``--target`` no simulator is started and the given controller is
+measured instead; only reads are sent to it. With ``--baseline`` the exit
+status is 1 when any rate drops by more than the tolerance.
+"""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import threading
+import time
+
+from pycomm3 import LogixDriver
+
+import plc_simulator
+
+DEFAULT_TAGS = (1000, 10000, 100000)
+
+# Number of sessions opened for the connect measurement.
+CONNECT_REPEAT = 20
+
+
+def _serve(conn, tags: int, programs: int, latency: float, jitter: float) -> None:
+    """Run a simulator in this process and send its port through ``conn``."""
+    controller = plc_simulator.build_controller(tags, programs, latency=latency, jitter=jitter)
+    server = plc_simulator.SimulatorServer(controller, ('127.0.0.1', 0))
+    conn.send(server.server_address[1])
+    conn.close()
+    server.serve_forever()
+
+
+def start_simulator_process(tags: int, programs: int, latency: float, jitter: float):
+    """Start a simulator in a new process and return ``(process, path)``."""
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_serve, args=(child, tags, programs, latency, jitter), daemon=True
+    )
+    process.start()
+    child.close()
+    port = parent.recv()
+    parent.close()
+    return process, f'127.0.0.1:{port}/0'
+
+
+def _result(operation: str, tags: int, count: int, seconds: float, errors: int = 0) -> dict:
+    return {
+        'operation': operation,
+        'tags': tags,
+        'count': count,
+        'seconds': seconds,
+        'rate': count / seconds if seconds else 0.0,
+        'errors': errors,
+    }
+
+
+def measure_connect(path: str, tags: int, repeat: int = CONNECT_REPEAT) -> dict:
+    """Open and close ``repeat`` sessions without uploading the tag list."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with LogixDriver(path, init_tags=False):
+            pass
+    return _result('connect', tags, repeat, time.perf_counter() - start)
+
+
+def measure_upload(path: str, tags: int) -> tuple:
+    """Upload the tag list once and return the result and the tag definitions."""
+    with LogixDriver(path, init_tags=False) as plc:
+        start = time.perf_counter()
+        plc.get_tag_list(program='*')
+        seconds = time.perf_counter() - start
+        definitions = plc.tags
+    return _result('upload', tags, len(definitions), seconds), definitions
+
+
+def read_names(definitions: dict) -> list:
+    """Return a readable name for every uploaded tag.
+
+    Arrays are read from their first element and structs from their first
+    visible atomic member, so every name is a single small value.
+    """
+
+    names = []
+    for name, tag in definitions.items():
+        if tag['tag_type'] == 'struct':
+            data_type = tag['data_type']
+            member = next(
+                (m for m in data_type['attributes']
+                 if data_type['internal_tags'][m]['tag_type'] == 'atomic'
+                 and not data_type['internal_tags'][m].get('array')),
+                None,
+            )
+            if member is None:
+                continue
+            name = f'{name}[0].{member}' if tag['dim'] else f'{name}.{member}'
+        elif tag['dim']:
+            name += '[0]'
+        names.append(name)
+    return names
+
+
+def measure_reads(path: str, tags: int, definitions: dict, clients: int, batch_size: int,
+                  duration: float) -> dict:
+    """Read the uploaded tags from ``clients`` sessions for ``duration`` seconds.
+
+    Each session reads ``batch_size`` tags per call, cycling through the tag
+    list from its own starting point. Tags read with an error are counted
+    separately and not included in the rate.
+    """
+
+    names = read_names(definitions)
+    if not names:
+        return _result('read', tags, 0, 0.0)
+    counts = [0] * clients
+    errors = [0] * clients
+    failures = []
+    ready = threading.Barrier(clients + 1)
+    stop = threading.Event()
+
+    def client(index: int) -> None:
+        try:
+            plc = LogixDriver(path, init_tags=False)
+            plc.open()
+        except Exception as exc:
+            failures.append(exc)
+            ready.abort()
+            return
+        try:
+            plc._tags = definitions
+            position = len(names) * index // clients
+            ready.wait()
+            while not stop.is_set():
+                batch = [names[(position + i) % len(names)] for i in range(min(batch_size, len(names)))]
+                position = (position + len(batch)) % len(names)
+                results = plc.read(*batch)
+                if len(batch) == 1:
+                    results = [results]
+                bad = sum(1 for r in results if r.error)
+                counts[index] += len(batch) - bad
+                errors[index] += bad
+        except Exception as exc:
+            failures.append(exc)
+        finally:
+            plc.close()
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    try:
+        ready.wait()
+    except threading.BrokenBarrierError:
+        pass
+    start = time.perf_counter()
+    time.sleep(duration if not failures else 0)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    if failures:
+        raise RuntimeError(f'{len(failures)} of {clients} clients failed: {failures[0]}')
+    return _result('read', tags, sum(counts), seconds, sum(errors))
+
+
+def run_benchmarks(args) -> list:
+    """Measure every tag count in ``args.tags`` and return the results."""
+    results = []
+    for tags in ([None] if args.target else args.tags):
+        process = None
+        if args.target:
+            path = args.target
+        else:
+            process, path = start_simulator_process(tags, args.programs, args.latency, args.jitter)
+        try:
+            measured = [measure_connect(path, tags)]
+            upload, definitions = measure_upload(path, tags)
+            measured.append(upload)
+            measured.append(measure_reads(
+                path, tags, definitions, args.clients, args.batch_size, args.duration
+            ))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.join()
+        for result in measured:
+            result.update(clients=args.clients, batch_size=args.batch_size, latency=args.latency)
+            results.append(result)
+            print(_format_result(result), flush=True)
+    return results
+
+
+def compare_with_baseline(results: list, baseline: list, tolerance: float) -> list:
+    """Return a message for every result that regressed against ``baseline``."""
+    previous = {(r['operation'], r['tags']): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result['operation'], result['tags']))
+        if base is None:
+            continue
+        if result['rate'] < base['rate'] * (1 - tolerance):
+            regressions.append(
+                f"{result['operation']} {result['tags']} tags: {result['rate']:.0f}/s, "
+                f"was {base['rate']:.0f}"
+            )
+    return regressions
+
+
+def _format_result(result: dict) -> str:
+    unit = 'connects/s' if result['operation'] == 'connect' else 'tags/s'
+    tags = '' if result['tags'] is None else result['tags']
+    line = (
+        f"{result['operation']:<8}{tags:>9} {result['count']:>9} "
+        f"{result['seconds']:>9.2f}s {result['rate']:>10.0f} {unit}"
+    )
+    if result['errors']:
+        line += f"  ({result['errors']} errors)"
+    return line
+
+
+def _parse_list(text: str, convert=str) -> list:
+    return [convert(item.strip()) for item in text.split(',') if item.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--tags',
+        type=lambda text: _parse_list(text, int),
+        default=list(DEFAULT_TAGS),
+        help='comma-separated synthetic tag counts (default: %(default)s)',
+    )
+    parser.add_argument('--programs', type=int, default=2, help='programs in the simulator (default: %(default)s)')
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help='simulated seconds per request (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--jitter',
+        type=float,
+        default=0.0,
+        help='random extra seconds per request, up to this much (default: %(default)s)',
+    )
+    parser.add_argument('--clients', type=int, default=1, help='concurrent read sessions (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=500, help='tags per read call (default: %(default)s)')
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=5.0,
+        help='seconds to read for (default: %(default)s)',
+    )
+    parser.add_argument('--target', help='measure this controller path instead of a simulator')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with results written earlier by --output')
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.2,
+        help='allowed relative slowdown against the baseline (default: %(default)s)',
+    )
+    args = parser.parse_args(argv)
+
+    if args.clients < 1 or args.batch_size < 1:
+        parser.error('--clients and --batch-size must be at least 1')
+
+    results = run_benchmarks(args)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare_with_baseline(results, json.load(fh), args.tolerance)
+        for message in regressions:
+            print(f'REGRESSION {message}')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
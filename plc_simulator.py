@@ -0,0 +1,950 @@
+"""Simulated Logix controller for working on the PLC pages without hardware.
+
+Speaks enough EtherNet/IP and CIP for pycomm3's ``LogixDriver``: ListIdentity,
+sessions, Forward Open/Close (standard and large), Unconnected Send, the
+identity and program name objects, the tag list upload with UDT templates,
+Read/Write Tag (plain and fragmented), Read Modify Write and the Multiple
+Service Packet. The tags are synthetic, built from the Instruments table of
+a database, or both. Every reply can be delayed to mimic a real network.
+
+Examples::
+
+    python plc_simulator.py
+    python plc_simulator.py --tags 100000 --port 44820 --latency 0.005 --jitter 0.002
+    python plc_simulator.py --tags 0 --instruments project.db
+
+Connect with ``LogixDriver('127.0.0.1:44820/0')``, or enter
+``127.0.0.1:44820`` as the IP address on the PLC pages or as a
+``/plc/scan`` target.
+"""
+
+import argparse
+import bisect
+import itertools
+import logging
+import random
+import re
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+import zlib
+
+import instruments
+
+logger = logging.getLogger(__name__)
+
+# Atomic data types: name -> (CIP type code, size in bytes, struct format).
+ATOMIC_TYPES = {
+    'BOOL': (0xC1, 1, '<B'),
+    'SINT': (0xC2, 1, '<b'),
+    'INT': (0xC3, 2, '<h'),
+    'DINT': (0xC4, 4, '<i'),
+    'LINT': (0xC5, 8, '<q'),
+    'REAL': (0xCA, 4, '<f'),
+    'LREAL': (0xCB, 8, '<d'),
+}
+
+# CIP general status codes used in replies.
+SUCCESS = 0x00
+CONNECTION_FAILURE = 0x01
+PATH_SEGMENT_ERROR = 0x04
+PATH_DESTINATION_UNKNOWN = 0x05
+PARTIAL_TRANSFER = 0x06
+SERVICE_NOT_SUPPORTED = 0x08
+ATTRIBUTE_NOT_SUPPORTED = 0x14
+NOT_ENOUGH_DATA = 0x13
+EMBEDDED_SERVICE_ERROR = 0x1E
+GENERAL_ERROR = 0xFF
+# Extended status of GENERAL_ERROR.
+OUT_OF_RANGE = 0x2105
+TYPE_MISMATCH = 0x2107
+
+# Encapsulation commands and status codes.
+LIST_IDENTITY = 0x63
+REGISTER_SESSION = 0x65
+UNREGISTER_SESSION = 0x66
+SEND_RR_DATA = 0x6F
+SEND_UNIT_DATA = 0x70
+INVALID_COMMAND = 0x0001
+INVALID_SESSION = 0x0064
+
+# CIP objects served.
+IDENTITY_CLASS = 0x01
+MESSAGE_ROUTER_CLASS = 0x02
+CONNECTION_MANAGER_CLASS = 0x06
+PROGRAM_NAME_CLASS = 0x64
+SYMBOL_CLASS = 0x6B
+TEMPLATE_CLASS = 0x6C
+CHANGE_DETECTION_CLASS = 0xAC
+
+# Symbol type and software control bits of the tag list.
+STRUCT_BIT = 0x8000
+BASE_TAG_BIT = 1 << 26
+
+# Reply size for unconnected messages, which have no negotiated size.
+UNCONNECTED_SIZE = 504
+
+LOGICAL_TYPES = {0: 'class', 1: 'instance', 2: 'member', 3: 'connection_point', 4: 'attribute'}
+
+TAG_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,39}$')
+
+
+class CipError(Exception):
+    """A request that is answered with a CIP error status."""
+
+    def __init__(self, status: int, extended: tuple = ()):
+        super().__init__(f'CIP status {status:#04x}')
+        self.status = status
+        self.extended = extended
+
+
+class Member:
+    """One member of a :class:`Template`."""
+
+    def __init__(self, name: str, data_type, offset: int, array: int = 0, bit: int | None = None):
+        self.name = name
+        self.data_type = data_type
+        self.offset = offset
+        self.array = array
+        self.bit = bit
+
+
+class Template:
+    """A user-defined data type, laid out as Logix stores it.
+
+    ``members`` are ``(name, data type, array length)`` with the data type
+    an atomic type name or another template. BOOL members are packed into
+    hidden SINT hosts, eight to a host, and the other members are aligned
+    to their size. :attr:`definition` holds the member descriptions and
+    names returned by the template object's read service.
+    """
+
+    def __init__(self, instance_id: int, name: str, members: list):
+        self.instance_id = instance_id
+        self.name = name
+        self.members = []
+        self._by_name = {}
+        offset = 0
+        host = None
+        for member_name, data_type, array in members:
+            if data_type == 'BOOL' and not array:
+                if host is None or host[1] == 8:
+                    host = [Member(f'ZZZZZZZZZZ{name}{offset}', 'SINT', offset), 0]
+                    self.members.append(host[0])
+                    offset += 1
+                member = Member(member_name, 'BOOL', host[0].offset, bit=host[1])
+                host[1] += 1
+            else:
+                host = None
+                size = type_size(data_type)
+                align = 4 if isinstance(data_type, Template) else min(size, 8)
+                offset = -(-offset // align) * align
+                member = Member(member_name, data_type, offset, array)
+                offset += size * max(array, 1)
+            self.members.append(member)
+            self._by_name[member_name.casefold()] = member
+        self.size = -(-offset // 4) * 4
+        self.definition = self._definition()
+        self.handle = zlib.crc32(self.definition) & 0xFFFF
+        # In 32-bit words; readers ask for ``words * 4 - 21`` bytes.
+        self.definition_words = -(-(len(self.definition) + 21) // 4)
+
+    @property
+    def symbol_type(self) -> int:
+        return STRUCT_BIT | self.instance_id
+
+    def member(self, name: str) -> Member | None:
+        return self._by_name.get(name.casefold())
+
+    def _definition(self) -> bytes:
+        info = bytearray()
+        for member in self.members:
+            if isinstance(member.data_type, Template):
+                code = member.data_type.symbol_type
+            else:
+                code = ATOMIC_TYPES[member.data_type][0]
+            type_info = member.bit if member.bit is not None else member.array
+            info += struct.pack('<HHI', type_info, code, member.offset)
+        names = [f'{self.name};n{self.instance_id:08X}'] + [m.name for m in self.members]
+        return bytes(info) + b''.join(n.encode('ascii') + b'\x00' for n in names)
+
+    def default_value(self, values: dict | None = None) -> bytearray:
+        """Return a zeroed value with the atomic members in ``values`` set.
+
+        Values are converted to the member's type; ones that do not convert,
+        like text in a numeric MDB column, are left at zero.
+        """
+
+        data = bytearray(self.size)
+        for name, value in (values or {}).items():
+            member = self.member(name)
+            if member is None:
+                continue
+            if member.bit is not None:
+                if value:
+                    data[member.offset] |= 1 << member.bit
+            elif not isinstance(member.data_type, Template):
+                fmt = ATOMIC_TYPES[member.data_type][2]
+                try:
+                    value = float(value) if fmt in ('<f', '<d') else int(round(float(value)))
+                    struct.pack_into(fmt, data, member.offset, value)
+                except (TypeError, ValueError, struct.error):
+                    continue
+        return data
+
+
+def type_size(data_type) -> int:
+    """Return the size in bytes of one element of ``data_type``."""
+    if isinstance(data_type, Template):
+        return data_type.size
+    return ATOMIC_TYPES[data_type][1]
+
+
+class Tag:
+    """A controller tag and its value, or a program, task or routine entry."""
+
+    __slots__ = ('instance_id', 'name', 'data_type', 'dims', 'value', 'symbol_type')
+
+    def __init__(self, name: str, data_type, dims: tuple = (), value=None, symbol_type: int | None = None):
+        self.instance_id = 0
+        self.name = name
+        self.data_type = data_type
+        self.dims = tuple(dims)
+        if symbol_type is None:
+            if isinstance(data_type, Template):
+                symbol_type = data_type.symbol_type
+            else:
+                symbol_type = ATOMIC_TYPES[data_type][0]
+            symbol_type |= len(self.dims) << 13
+        self.symbol_type = symbol_type
+        if value is None and data_type is not None:
+            value = bytearray(type_size(data_type) * self.elements)
+        self.value = value
+
+    @property
+    def elements(self) -> int:
+        count = 1
+        for dim in self.dims:
+            count *= dim
+        return count
+
+
+class _Scope:
+    """The tags of the controller or of one program, by name and instance."""
+
+    def __init__(self, entries: list):
+        self.entries = entries
+        self.instance_ids = []
+        self.by_instance = {}
+        self.by_name = {}
+        for instance_id, entry in enumerate(entries, start=1):
+            entry.instance_id = instance_id
+            self.instance_ids.append(instance_id)
+            self.by_instance[instance_id] = entry
+            if entry.data_type is not None:
+                self.by_name[entry.name.casefold()] = entry
+
+
+class SimulatedController:
+    """The object model of the simulated controller.
+
+    ``tags`` are the controller-scoped :class:`Tag` objects and ``programs``
+    maps program names to their tags. ``identity`` overrides fields of
+    :attr:`DEFAULT_IDENTITY`. Replies are delayed by ``latency`` seconds
+    plus up to ``jitter`` seconds.
+    """
+
+    DEFAULT_IDENTITY = {
+        'vendor': 1,
+        'product_type': 14,
+        'product_code': 166,
+        'revision': (33, 11),
+        'status': b'\x60\x30',
+        'serial': 0x00C0FFEE,
+        'product_name': '1756-L83E/B',
+        'name': 'SIMULATOR',
+    }
+
+    def __init__(self, tags: list, programs: dict | None = None, identity: dict | None = None,
+                 latency: float = 0.0, jitter: float = 0.0):
+        self.identity = {**self.DEFAULT_IDENTITY, **(identity or {})}
+        self.latency = latency
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        programs = programs or {}
+
+        templates = {}
+        for tag in itertools.chain(tags, *programs.values()):
+            _collect_templates(tag.data_type, templates)
+        self.templates = templates
+
+        entries = [Tag(f'Program:{name}', None, symbol_type=0x1068) for name in programs]
+        entries.append(Tag('Task:MainTask', None, symbol_type=0x1070))
+        self.scopes = {None: _Scope(entries + list(tags))}
+        for name, program_tags in programs.items():
+            routine = Tag('Routine:MainRoutine', None, symbol_type=0x1069)
+            self.scopes[name.casefold()] = _Scope([routine] + list(program_tags))
+
+        # Stable for a given tag database, like the program-change
+        # indicator of a controller nobody is editing.
+        signature = zlib.crc32(''.join(
+            f'{t.name}:{t.symbol_type};' for scope in self.scopes.values() for t in scope.entries
+        ).encode('utf-8'))
+        self.change_indicator = {attribute: (signature + attribute) & 0xFFFFFFFF for attribute in (1, 2, 3, 4, 10)}
+
+    @property
+    def tag_count(self) -> int:
+        return sum(len(scope.by_name) for scope in self.scopes.values())
+
+    def delay(self, rnd: random.Random) -> None:
+        if self.latency or self.jitter:
+            time.sleep(self.latency + rnd.uniform(0, self.jitter))
+
+    def identity_bytes(self) -> bytes:
+        identity = self.identity
+        name = identity['product_name'].encode('ascii')
+        return (
+            struct.pack('<HHHBB', identity['vendor'], identity['product_type'], identity['product_code'],
+                        *identity['revision'])
+            + identity['status']
+            + struct.pack('<IB', identity['serial'], len(name))
+            + name
+        )
+
+    def handle_message(self, message: bytes, session: '_Session', limit: int) -> bytes:
+        """Return the reply to one CIP request, at most about ``limit`` bytes long."""
+        service = message[0] if message else 0
+        try:
+            path_size = message[1] * 2
+            path = parse_path(message[2:2 + path_size])
+            data = message[2 + path_size:]
+            if service == 0x52 and path[:1] == [('class', CONNECTION_MANAGER_CLASS)]:
+                # Unconnected Send: answer the embedded request directly.
+                length = struct.unpack_from('<H', data, 2)[0]
+                return self.handle_message(data[4:4 + length], session, limit)
+            status, reply = self._dispatch(service, path, data, session, limit)
+        except CipError as exc:
+            return cip_reply(service, exc.status, extended=exc.extended)
+        except (IndexError, struct.error):
+            return cip_reply(service, NOT_ENOUGH_DATA)
+        return cip_reply(service, status, reply)
+
+    def _dispatch(self, service: int, path: list, data: bytes, session: '_Session', limit: int):
+        class_id = path[0][1] if path and path[0][0] == 'class' else None
+        if class_id == CONNECTION_MANAGER_CLASS:
+            if service in (0x54, 0x5B):
+                return SUCCESS, session.forward_open(data, large=service == 0x5B)
+            if service == 0x4E:
+                return SUCCESS, session.forward_close(data)
+        elif class_id == MESSAGE_ROUTER_CLASS and service == 0x0A:
+            return self._multiple_service(data, session, limit)
+        elif service == 0x01 and class_id == IDENTITY_CLASS:
+            return SUCCESS, self.identity_bytes()
+        elif service == 0x01 and class_id == PROGRAM_NAME_CLASS:
+            name = self.identity['name'].encode('ascii')
+            return SUCCESS, struct.pack('<H', len(name)) + name
+        elif class_id == TEMPLATE_CLASS and service in (0x03, 0x4C):
+            template = self.templates.get(_instance(path))
+            if template is None:
+                raise CipError(PATH_DESTINATION_UNKNOWN)
+            if service == 0x03:
+                return SUCCESS, _template_attributes(template, data)
+            return _read_template(template, data, limit)
+        elif class_id == CHANGE_DETECTION_CLASS and service == 0x03:
+            return SUCCESS, _attribute_list(data, lambda attribute: (
+                struct.pack('<I', self.change_indicator[attribute])
+                if attribute in self.change_indicator else None
+            ))
+        elif service == 0x55:
+            return self._tag_list(path, data, limit)
+        elif service in (0x4C, 0x52):
+            return self._read_tag(path, data, service == 0x52, limit)
+        elif service in (0x4D, 0x53):
+            return self._write_tag(path, data, service == 0x53)
+        elif service == 0x4E:
+            return self._read_modify_write(path, data)
+        raise CipError(SERVICE_NOT_SUPPORTED)
+
+    def _multiple_service(self, data: bytes, session: '_Session', limit: int):
+        count = struct.unpack_from('<H', data)[0]
+        offsets = struct.unpack_from(f'<{count}H', data, 2) + (len(data),)
+        replies = [
+            self.handle_message(data[start:end], session, limit)
+            for start, end in zip(offsets, offsets[1:])
+        ]
+        reply_offsets = []
+        offset = 2 + 2 * count
+        for reply in replies:
+            reply_offsets.append(offset)
+            offset += len(reply)
+        header = struct.pack(f'<{count + 1}H', count, *reply_offsets)
+        status = EMBEDDED_SERVICE_ERROR if any(r[2] not in (SUCCESS, PARTIAL_TRANSFER) for r in replies) else SUCCESS
+        return status, header + b''.join(replies)
+
+    def _scope(self, path: list) -> tuple['_Scope', list]:
+        """Split a leading ``Program:<name>`` segment off ``path``."""
+        if path and path[0][0] == 'symbol' and path[0][1].startswith('Program:'):
+            scope = self.scopes.get(path[0][1][len('Program:'):].casefold())
+            if scope is None:
+                raise CipError(PATH_DESTINATION_UNKNOWN)
+            return scope, path[1:]
+        return self.scopes[None], path
+
+    def _tag_list(self, path: list, data: bytes, limit: int):
+        scope, path = self._scope(path)
+        if path[:1] != [('class', SYMBOL_CLASS)]:
+            raise CipError(PATH_DESTINATION_UNKNOWN)
+        count = struct.unpack_from('<H', data)[0]
+        attributes = struct.unpack_from(f'<{count}H', data, 2)
+        start = bisect.bisect_left(scope.instance_ids, _instance(path))
+        budget = limit - 8
+        out = bytearray()
+        status = SUCCESS
+        for entry in scope.entries[start:]:
+            record = struct.pack('<I', entry.instance_id) + b''.join(
+                _symbol_attribute(entry, attribute) for attribute in attributes
+            )
+            if out and len(out) + len(record) > budget:
+                status = PARTIAL_TRANSFER
+                break
+            out += record
+        return status, bytes(out)
+
+    def _resolve(self, path: list):
+        """Return ``(tag, data type, byte offset, bit, elements available)`` for a tag path."""
+        scope, path = self._scope(path)
+        segments = list(path)
+        if segments[:1] == [('class', SYMBOL_CLASS)]:
+            tag = scope.by_instance.get(_instance(segments))
+            del segments[:2]
+        elif segments and segments[0][0] == 'symbol':
+            tag = scope.by_name.get(segments.pop(0)[1].casefold())
+        else:
+            raise CipError(PATH_SEGMENT_ERROR)
+        if tag is None or tag.data_type is None:
+            raise CipError(PATH_DESTINATION_UNKNOWN)
+
+        data_type, dims, offset, bit = tag.data_type, tag.dims, 0, None
+        available = tag.elements
+        while segments:
+            indices = []
+            while segments and segments[0][0] == 'member':
+                indices.append(segments.pop(0)[1])
+            if indices:
+                if len(indices) != len(dims):
+                    raise CipError(PATH_SEGMENT_ERROR)
+                flat = 0
+                for index, dim in zip(indices, dims):
+                    if index >= dim:
+                        raise CipError(GENERAL_ERROR, (OUT_OF_RANGE,))
+                    flat = flat * dim + index
+                offset += flat * type_size(data_type)
+                available -= flat
+                dims = ()
+            if segments:
+                kind, name = segments.pop(0)
+                if kind != 'symbol' or dims or not isinstance(data_type, Template):
+                    raise CipError(PATH_SEGMENT_ERROR)
+                member = data_type.member(name)
+                if member is None:
+                    raise CipError(PATH_DESTINATION_UNKNOWN)
+                offset += member.offset
+                data_type, bit = member.data_type, member.bit
+                dims = (member.array,) if member.array else ()
+                available = member.array or 1
+        return tag, data_type, offset, bit, available
+
+    def _read_tag(self, path: list, data: bytes, fragmented: bool, limit: int):
+        tag, data_type, offset, bit, available = self._resolve(path)
+        elements = struct.unpack_from('<H', data)[0]
+        if not 0 < elements <= available:
+            raise CipError(GENERAL_ERROR, (OUT_OF_RANGE,))
+        with self.lock:
+            if bit is not None:
+                value = b'\xff' if tag.value[offset] >> bit & 1 else b'\x00'
+            else:
+                value = bytes(tag.value[offset:offset + type_size(data_type) * elements])
+        header = _type_header(data_type)
+        if not fragmented:
+            return SUCCESS, header + value
+        start = struct.unpack_from('<I', data, 2)[0]
+        part = value[start:start + limit - 8 - len(header)]
+        status = PARTIAL_TRANSFER if start + len(part) < len(value) else SUCCESS
+        return status, header + part
+
+    def _write_tag(self, path: list, data: bytes, fragmented: bool):
+        tag, data_type, offset, bit, available = self._resolve(path)
+        header = _type_header(data_type)
+        if data[:len(header)] != header:
+            raise CipError(GENERAL_ERROR, (TYPE_MISMATCH,))
+        pos = len(header)
+        elements = struct.unpack_from('<H', data, pos)[0]
+        pos += 2
+        start = 0
+        if fragmented:
+            start = struct.unpack_from('<I', data, pos)[0]
+            pos += 4
+        payload = data[pos:]
+        if not 0 < elements <= available:
+            raise CipError(GENERAL_ERROR, (OUT_OF_RANGE,))
+        with self.lock:
+            if bit is not None:
+                if payload[0]:
+                    tag.value[offset] |= 1 << bit
+                else:
+                    tag.value[offset] &= ~(1 << bit) & 0xFF
+            else:
+                size = type_size(data_type) * elements
+                if not fragmented:
+                    # pycomm3 repeats the request after a single write's
+                    # value; like a controller, only the value is used.
+                    if len(payload) < size:
+                        raise CipError(NOT_ENOUGH_DATA)
+                    payload = payload[:size]
+                elif start + len(payload) > size:
+                    raise CipError(GENERAL_ERROR, (OUT_OF_RANGE,))
+                tag.value[offset + start:offset + start + len(payload)] = payload
+        return SUCCESS, b''
+
+    def _read_modify_write(self, path: list, data: bytes):
+        tag, data_type, offset, bit, available = self._resolve(path)
+        size = struct.unpack_from('<H', data)[0]
+        if bit is not None or isinstance(data_type, Template) or size != type_size(data_type):
+            raise CipError(GENERAL_ERROR, (TYPE_MISMATCH,))
+        or_mask = int.from_bytes(data[2:2 + size], 'little')
+        and_mask = int.from_bytes(data[2 + size:2 + 2 * size], 'little')
+        with self.lock:
+            current = int.from_bytes(tag.value[offset:offset + size], 'little')
+            tag.value[offset:offset + size] = ((current | or_mask) & and_mask).to_bytes(size, 'little')
+        return SUCCESS, b''
+
+
+def _collect_templates(data_type, templates: dict) -> None:
+    if isinstance(data_type, Template) and data_type.instance_id not in templates:
+        templates[data_type.instance_id] = data_type
+        for member in data_type.members:
+            _collect_templates(member.data_type, templates)
+
+
+def _instance(path: list) -> int:
+    if len(path) < 2 or path[1][0] != 'instance':
+        raise CipError(PATH_SEGMENT_ERROR)
+    return path[1][1]
+
+
+def _type_header(data_type) -> bytes:
+    if isinstance(data_type, Template):
+        return b'\xa0\x02' + struct.pack('<H', data_type.handle)
+    return struct.pack('<H', ATOMIC_TYPES[data_type][0])
+
+
+def _symbol_attribute(entry: Tag, attribute: int) -> bytes:
+    if attribute == 1:
+        name = entry.name.encode('ascii')
+        return struct.pack('<H', len(name)) + name
+    if attribute == 2:
+        return struct.pack('<H', entry.symbol_type)
+    if attribute in (3, 5):
+        return struct.pack('<I', entry.instance_id << 8)
+    if attribute == 6:
+        return struct.pack('<I', BASE_TAG_BIT)
+    if attribute == 8:
+        return struct.pack('<3I', *(entry.dims + (0, 0, 0))[:3])
+    if attribute == 10:
+        return b'\x00'  # Read/Write
+    raise CipError(ATTRIBUTE_NOT_SUPPORTED)
+
+
+def _attribute_list(data: bytes, value) -> bytes:
+    """Answer Get Attribute List, with ``value(attribute)`` giving each value."""
+    count = struct.unpack_from('<H', data)[0]
+    out = [struct.pack('<H', count)]
+    for attribute in struct.unpack_from(f'<{count}H', data, 2):
+        encoded = value(attribute)
+        if encoded is None:
+            out.append(struct.pack('<HH', attribute, ATTRIBUTE_NOT_SUPPORTED))
+        else:
+            out.append(struct.pack('<HH', attribute, SUCCESS) + encoded)
+    return b''.join(out)
+
+
+def _template_attributes(template: Template, data: bytes) -> bytes:
+    values = {
+        1: struct.pack('<H', template.handle),
+        2: struct.pack('<H', len(template.members)),
+        4: struct.pack('<I', template.definition_words),
+        5: struct.pack('<I', template.size),
+    }
+    return _attribute_list(data, values.get)
+
+
+def _read_template(template: Template, data: bytes, limit: int):
+    offset, count = struct.unpack_from('<iH', data)
+    end = min(offset + count, len(template.definition))
+    part = template.definition[offset:min(end, offset + limit - 8)]
+    return (PARTIAL_TRANSFER if offset + len(part) < end else SUCCESS), part
+
+
+def parse_path(path: bytes) -> list:
+    """Decode a padded EPATH into ``(kind, value)`` segments.
+
+    Logical segments become ``('class', 0x6B)``, ``('instance', 12)``,
+    ``('member', 3)`` and so on, ANSI extended symbols ``('symbol', name)``
+    and port segments ``('port', link)``.
+    """
+
+    segments = []
+    i = 0
+    while i < len(path):
+        segment = path[i]
+        if segment == 0x91:
+            length = path[i + 1]
+            segments.append(('symbol', path[i + 2:i + 2 + length].decode('utf-8')))
+            i += 2 + length + length % 2
+        elif segment & 0xE0 == 0x20:
+            kind = LOGICAL_TYPES.get((segment >> 2) & 0x07)
+            size = segment & 0x03
+            if kind is None or size == 2:
+                raise CipError(PATH_SEGMENT_ERROR)
+            if size == 0:
+                value = path[i + 1]
+                i += 2
+            elif size == 1:
+                value = struct.unpack_from('<H', path, i + 2)[0]
+                i += 4
+            else:
+                value = struct.unpack_from('<I', path, i + 2)[0]
+                i += 6
+            segments.append((kind, value))
+        elif segment & 0xE0 == 0x00:
+            if segment & 0x10:
+                length = path[i + 1]
+                link = path[i + 2:i + 2 + length]
+                i += 2 + length + length % 2
+            else:
+                link = path[i + 1:i + 2]
+                i += 2
+            segments.append(('port', link))
+        else:
+            raise CipError(PATH_SEGMENT_ERROR)
+    return segments
+
+
+def cip_reply(service: int, status: int, data: bytes = b'', extended: tuple = ()) -> bytes:
+    """Build a CIP reply: service with the reply bit, status, extended status, data."""
+    return (
+        struct.pack('<BBBB', service | 0x80, 0, status, len(extended))
+        + b''.join(struct.pack('<H', code) for code in extended)
+        + data
+    )
+
+
+class _Session:
+    """The registered session and CIP connections of one TCP client."""
+
+    _connection_ids = itertools.count(0x10000)
+
+    def __init__(self):
+        self.handle = None
+        self.connections = {}
+
+    def forward_open(self, data: bytes, large: bool) -> bytes:
+        serial_fields = data[10:18]
+        to_cid = data[6:10]
+        params = struct.unpack_from('<I' if large else '<H', data, 26)[0]
+        size = params & 0xFFFF if large else params & 0x01FF
+        ot_cid = next(self._connection_ids) & 0xFFFFFFFF
+        self.connections[ot_cid] = size
+        rpi = data[22:26]
+        return struct.pack('<I', ot_cid) + to_cid + serial_fields + rpi + rpi + b'\x00\x00'
+
+    def forward_close(self, data: bytes) -> bytes:
+        # pycomm3 keeps one connection per session; drop them all.
+        self.connections.clear()
+        return data[2:10] + b'\x00\x00'
+
+
+class _ClientHandler(socketserver.BaseRequestHandler):
+    """Serves the EtherNet/IP encapsulation for one TCP client."""
+
+    def setup(self):
+        self.controller = self.server.controller
+        self.session = _Session()
+        self.rnd = random.Random()
+
+    def handle(self):
+        sock = self.request
+        while True:
+            header = _recv_exactly(sock, 24)
+            if header is None:
+                return
+            command, length, handle, _, context, options = struct.unpack('<HHII8sI', header)
+            body = _recv_exactly(sock, length) if length else b''
+            if body is None:
+                return
+            if command == UNREGISTER_SESSION:
+                return
+            status, handle, reply = self._encapsulation(command, handle, body)
+            self.controller.delay(self.rnd)
+            sock.sendall(struct.pack('<HHII8sI', command, len(reply), handle, status, context, options) + reply)
+
+    def _encapsulation(self, command: int, handle: int, body: bytes) -> tuple[int, int, bytes]:
+        if command == LIST_IDENTITY:
+            return SUCCESS, handle, self._list_identity()
+        if command == REGISTER_SESSION:
+            self.session.handle = self.rnd.randrange(1, 0xFFFFFFFF)
+            return SUCCESS, self.session.handle, body[:4]
+        if command not in (SEND_RR_DATA, SEND_UNIT_DATA):
+            return INVALID_COMMAND, handle, b''
+        if handle != self.session.handle:
+            return INVALID_SESSION, handle, b''
+
+        items = _cpf_items(body)
+        if command == SEND_RR_DATA:
+            reply = self.controller.handle_message(items.get(0xB2, b''), self.session, UNCONNECTED_SIZE)
+            return SUCCESS, handle, _cpf(((0x0000, b''), (0x00B2, reply)))
+
+        connection_id = struct.unpack('<I', items[0xA1])[0]
+        message = items[0xB1]
+        size = self.session.connections.get(connection_id)
+        if size is None:
+            reply = cip_reply(message[2] if len(message) > 2 else 0, CONNECTION_FAILURE)
+        else:
+            reply = self.controller.handle_message(message[2:], self.session, size)
+        return SUCCESS, handle, _cpf(((0x00A1, items[0xA1]), (0x00B1, message[:2] + reply)))
+
+    def _list_identity(self) -> bytes:
+        host, port = self.request.getsockname()[:2]
+        body = (
+            struct.pack('<H', 1)
+            + struct.pack('>hH', socket.AF_INET, port)
+            + socket.inet_aton(host)
+            + bytes(8)
+            + self.controller.identity_bytes()
+            + b'\x03'  # state: operational
+        )
+        return struct.pack('<HHH', 1, 0x0C, len(body)) + body
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes | None:
+    data = bytearray()
+    while len(data) < size:
+        try:
+            chunk = sock.recv(size - len(data))
+        except OSError:
+            return None
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def _cpf_items(body: bytes) -> dict:
+    """Return the Common Packet Format items of ``body`` by type."""
+    count = struct.unpack_from('<H', body, 6)[0]
+    items = {}
+    pos = 8
+    for _ in range(count):
+        item_type, length = struct.unpack_from('<HH', body, pos)
+        items[item_type] = body[pos + 4:pos + 4 + length]
+        pos += 4 + length
+    return items
+
+
+def _cpf(items) -> bytes:
+    return struct.pack('<IHH', 0, 0, len(items)) + b''.join(
+        struct.pack('<HH', item_type, len(data)) + data for item_type, data in items
+    )
+
+
+class SimulatorServer(socketserver.ThreadingTCPServer):
+    """TCP server answering EtherNet/IP clients from a :class:`SimulatedController`."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, controller: SimulatedController, address=('127.0.0.1', 44818)):
+        self.controller = controller
+        super().__init__(address, _ClientHandler)
+
+
+def start_simulator(controller: SimulatedController, host: str = '127.0.0.1', port: int = 0) -> SimulatorServer:
+    """Serve ``controller`` from a daemon thread and return the server.
+
+    With ``port`` 0 a free port is chosen; it is in ``server.server_address``.
+    Stop it with ``server.shutdown()`` and ``server.server_close()``.
+    """
+
+    server = SimulatorServer(controller, (host, port))
+    threading.Thread(target=server.serve_forever, name='plc-simulator', daemon=True).start()
+    return server
+
+
+def instrument_templates() -> dict:
+    """Return the UDTs used for instrument tags, by name.
+
+    ``AIN`` carries a REAL ``Val`` and every alarm column of
+    ``instruments.ALARM_MEMBERS``; ``DIN`` a BOOL ``Val``. ``PUMP`` nests an
+    ``AIN`` and an array so uploads exercise nested templates.
+    """
+
+    alarm_members = [
+        (member, 'BOOL' if member.endswith('_EN') else 'DINT' if member.endswith('_DLY') else 'REAL', 0)
+        for member in instruments.ALARM_MEMBERS
+    ]
+    ain = Template(0x101, 'AIN', [('Val', 'REAL', 0), ('Fault', 'BOOL', 0)] + alarm_members)
+    din = Template(0x102, 'DIN', [('Val', 'BOOL', 0), ('Inv', 'BOOL', 0), ('Fault', 'BOOL', 0), ('Debounce', 'DINT', 0)])
+    pump = Template(0x103, 'PUMP', [
+        ('Run', 'BOOL', 0),
+        ('Fault', 'BOOL', 0),
+        ('Speed', 'REAL', 0),
+        ('Hours', 'DINT', 0),
+        ('Flow', ain, 0),
+        ('Curve', 'REAL', 8),
+    ])
+    return {t.name: t for t in (ain, din, pump)}
+
+
+# Default alarm configuration of synthetic analog tags.
+DEFAULT_ALARMS = {
+    'HALM_EN': 1, 'HALM_SP': 90.0, 'HALM_DB': 1.0, 'HALM_DLY': 5,
+    'HWARN_EN': 1, 'HWARN_SP': 80.0, 'HWARN_DB': 1.0, 'HWARN_DLY': 5,
+    'LWARN_EN': 1, 'LWARN_SP': 20.0, 'LWARN_DB': 1.0, 'LWARN_DLY': 5,
+    'LALM_EN': 1, 'LALM_SP': 10.0, 'LALM_DB': 1.0, 'LALM_DLY': 5,
+}
+
+# Kinds of synthetic tags, repeated in this order.
+SYNTHETIC_KINDS = ('AI', 'AI', 'AI', 'AO', 'DI', 'DI', 'DO', 'PMP', 'R', 'N', 'B', 'RARR')
+
+
+def synthetic_tags(count: int, programs: int = 2, seed: int = 0) -> tuple[list, dict]:
+    """Return ``(controller tags, {program: tags})`` for ``count`` synthetic tags.
+
+    Most tags are ``AIN``/``DIN`` instruments named ``AI_000001``,
+    ``DI_000005`` and so on; the rest are pumps, REAL, DINT and BOOL scalars
+    and REAL arrays. Every twentieth tag is scoped to one of ``programs``
+    programs instead of the controller.
+    """
+
+    rnd = random.Random(seed)
+    templates = instrument_templates()
+    ain_default = templates['AIN'].default_value(DEFAULT_ALARMS)
+    controller_tags = []
+    program_tags = {f'Program{n + 1:02d}' if n else 'MainProgram': [] for n in range(programs)}
+    program_lists = list(program_tags.values())
+    for i in range(1, count + 1):
+        kind = SYNTHETIC_KINDS[(i - 1) % len(SYNTHETIC_KINDS)]
+        name = f'{kind}_{i:06d}'
+        if kind in ('AI', 'AO'):
+            value = bytearray(ain_default)
+            struct.pack_into('<f', value, 0, round(rnd.uniform(0, 100), 2))
+            tag = Tag(name, templates['AIN'], value=value)
+        elif kind in ('DI', 'DO'):
+            tag = Tag(name, templates['DIN'], value=templates['DIN'].default_value({'Val': rnd.random() < 0.5}))
+        elif kind == 'PMP':
+            tag = Tag(name, templates['PUMP'], value=templates['PUMP'].default_value({'Speed': 1450.0}))
+        elif kind == 'R':
+            tag = Tag(name, 'REAL', value=bytearray(struct.pack('<f', round(rnd.uniform(0, 100), 2))))
+        elif kind == 'N':
+            tag = Tag(name, 'DINT', value=bytearray(struct.pack('<i', rnd.randrange(-1000, 1000))))
+        elif kind == 'B':
+            tag = Tag(name, 'BOOL', value=bytearray(b'\xff' if rnd.random() < 0.5 else b'\x00'))
+        else:
+            tag = Tag(name, 'REAL', dims=(100,))
+        if program_lists and i % 20 == 0:
+            program_lists[(i // 20) % len(program_lists)].append(tag)
+        else:
+            controller_tags.append(tag)
+    return controller_tags, program_tags
+
+
+def instrument_tags(path: str, backend: str | None = None) -> list:
+    """Return one ``AIN`` or ``DIN`` tag per instrument in a database.
+
+    Analog instruments get their alarm columns as member values, so the
+    compare and push pages find the MDB values in the controller. Tags that
+    are not valid Logix names are left out.
+    """
+
+    templates = instrument_templates()
+    tags = {}
+    with instruments.open_database(path, backend) as db:
+        rows = instruments.read_instrument_setpoints(path, db=db, members=instruments.ALARM_MEMBERS)
+    for row in rows:
+        name = row['tag']
+        if not isinstance(name, str) or not TAG_NAME.match(name) or name.casefold() in tags:
+            continue
+        if row['sheet'].startswith('Analog'):
+            values = {m: v for m, v in row['setpoints'].items() if v is not None}
+            tag = Tag(name, templates['AIN'], value=templates['AIN'].default_value(values))
+        else:
+            tag = Tag(name, templates['DIN'])
+        tags[name.casefold()] = tag
+    return list(tags.values())
+
+
+def build_controller(tags: int = 1000, programs: int = 2, seed: int = 0, instruments_path: str | None = None,
+                     backend: str | None = None, **kwargs) -> SimulatedController:
+    """Build a :class:`SimulatedController` with synthetic and instrument tags.
+
+    Keyword arguments are passed on to :class:`SimulatedController`.
+    """
+
+    controller_tags, program_tags = synthetic_tags(tags, programs, seed)
+    if instruments_path:
+        names = {t.name.casefold() for t in controller_tags}
+        controller_tags += [
+            t for t in instrument_tags(instruments_path, backend) if t.name.casefold() not in names
+        ]
+    return SimulatedController(controller_tags, program_tags, **kwargs)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=44818, help='TCP port (default: %(default)s)')
+    parser.add_argument('--tags', type=int, default=1000, help='synthetic tags to create (default: %(default)s)')
+    parser.add_argument('--programs', type=int, default=2, help='programs holding some of them (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for tag values (default: %(default)s)')
+    parser.add_argument('--instruments', help='also create a tag per instrument in this database')
+    parser.add_argument(
+        '--backend',
+        choices=list(instruments.DATABASE_BACKENDS),
+        help='database backend for --instruments (default: by file name)',
+    )
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every reply (default: 0)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds (default: 0)')
+    parser.add_argument('--name', default=SimulatedController.DEFAULT_IDENTITY['name'], help='program name')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    try:
+        controller = build_controller(
+            args.tags,
+            args.programs,
+            args.seed,
+            args.instruments,
+            args.backend,
+            identity={'name': args.name},
+            latency=args.latency,
+            jitter=args.jitter,
+        )
+    except (instruments.DATABASE_ERRORS + (ValueError,)) as exc:
+        parser.error(str(exc))
+    server = SimulatorServer(controller, (args.host, args.port))
+    host, port = server.server_address[:2]
+    logger.info('Simulating %s with %d tags on %s:%d', args.name, controller.tag_count, host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
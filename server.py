@@ -1,215 +1,1885 @@
 import os
 import tempfile
+import asyncio
+import atexit
+import base64
 import csv
+import gzip
+import hashlib
+import io
+import ipaddress
+import json
+import logging
+import math
+import queue
+import re
+import secrets
+import shutil
+import struct
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 
-import pyodbc
 from flask import (
     Flask,
+    Response,
     request,
     render_template_string,
     send_file,
     after_this_request,
+    jsonify,
     redirect,
     url_for,
+    g,
 )
-from openpyxl import Workbook, load_workbook
-from pycomm3 import LogixDriver
+import pycomm3
+from pycomm3 import LogixDriver, PycommError, Services
+
+from instruments import (
+    ALARM_MEMBERS,
+    DATABASE_ERRORS,
+    EXPORT_FORMATS,
+    INSTRUMENT_SHEETS,
+    INVALID_FILE_ERRORS,
+    SETPOINT_MEMBERS,
+    InstrumentDiff,
+    InstrumentTable,
+    MissingInstrumentsTable,
+    RowSnapshot,
+    apply_instrument_diff,
+    diff_instruments,
+    export_instruments_to_excel,
+    instrument_file_format,
+    open_database,
+    read_file_setpoints,
+    read_instrument_setpoints,
+    update_instruments_from_excel,
+)
+from metrics import StageTimer, metrics
+
+logger = logging.getLogger(__name__)
 
 
-def export_instruments_to_excel(mdb_path: str, xlsx_path: str) -> int:
-    """Export the Instruments table to an Excel workbook.
+class ResultCache:
+    """On-disk cache of generated files keyed by the content they came from.
 
-    Only rows with Type='IO' are exported. The columns Tag, FullDescription,
-    EGULow, EGUHigh, RawLow, RawHigh and a set of alarm/warning columns are
-    written. The instruments are grouped into DigitalInput, DigitalOutput,
-    AnalogInput and AnalogOutput sheets. Returns the number of rows exported.
+    Entries are stored as ``<directory>/<name>`` with their metadata in a
+    ``<name>.json`` sidecar. An entry expires ``ttl`` seconds after it was
+    written, and once the cache holds more than ``max_bytes`` the least
+    recently used entries are removed. Entries are written with an atomic
+    rename, so several processes can share one directory.
     """
 
-    conn_str = (
-        r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-        f'DBQ={mdb_path};'
-    )
-    conn = pyodbc.connect(conn_str, autocommit=True)
-    cursor = conn.cursor()
-
-    # Verify the Instruments table exists
-    table_names = [row.table_name for row in cursor.tables(tableType='TABLE')]
-    if 'Instruments' not in table_names:
-        raise ValueError('Instruments table not found')
-
-    query = (
-        "SELECT ID, Tag, FullDescription, EGULow, EGUHigh, RawLow, RawHigh, "
-        "HALM_EN, HALM_SP, HALM_DB, HALM_DLY, "
-        "HWARN_EN, HWARN_SP, HWARN_DB, HWARN_DLY, "
-        "LALM_EN, LALM_SP, LALM_DB, LALM_DLY, "
-        "LWARN_EN, LWARN_SP, LWARN_DB, LWARN_DLY, "
-        "DigitalInput, DigitalOutput, AnalogInput, AnalogOutput "
-        "FROM Instruments WHERE Type='IO' AND Tag <> '' AND Tag IS NOT NULL"
-    )
-    cursor.execute(query)
-    rows = cursor.fetchall()
-
-    header = [
-        'ID',
-        'Tag',
-        'FullDescription',
-        'EGULow',
-        'EGUHigh',
-        'RawLow',
-        'RawHigh',
-        'HALM_EN',
-        'HALM_SP',
-        'HALM_DB',
-        'HALM_DLY',
-        'HWARN_EN',
-        'HWARN_SP',
-        'HWARN_DB',
-        'HWARN_DLY',
-        'LALM_EN',
-        'LALM_SP',
-        'LALM_DB',
-        'LALM_DLY',
-        'LWARN_EN',
-        'LWARN_SP',
-        'LWARN_DB',
-        'LWARN_DLY',
-    ]
+    def __init__(self, directory: str, max_bytes: int, ttl: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
 
-    categories = {
-        'DigitalInput': [],
-        'DigitalOutput': [],
-        'AnalogInput': [],
-        'AnalogOutput': [],
-    }
+    def get(self, name: str) -> tuple[str, dict] | None:
+        """Return ``(path, metadata)`` for ``name`` or ``None`` on a miss."""
+        path = os.path.join(self.directory, name)
+        try:
+            st = os.stat(path)
+            with open(path + '.json') as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        if st.st_mtime + self.ttl < now:
+            self._remove(path)
+            return None
+        # The access time drives LRU eviction; the modification time is
+        # left alone so the TTL still counts from when the entry was made.
+        os.utime(path, (now, st.st_mtime))
+        return path, meta
+
+    def put(self, name: str, src_path: str, meta: dict) -> str:
+        """Move ``src_path`` into the cache as ``name`` and return its path."""
+        path = os.path.join(self.directory, name)
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False) as fh:
+            json.dump(meta, fh)
+        os.replace(fh.name, path + '.json')
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        shutil.move(src_path, tmp_path)
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    def entries(self, suffix: str = '') -> list:
+        """Return ``(name, metadata)`` for live entries ending in ``suffix``, newest first."""
+        now = time.time()
+        found = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(suffix) or entry.name.endswith(('.json', '.tmp')):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+                with open(entry.path + '.json') as fh:
+                    meta = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            if mtime + self.ttl >= now:
+                found.append((mtime, entry.name, meta))
+        return [(name, meta) for _, name, meta in sorted(found, reverse=True)]
+
+    def evict(self) -> None:
+        """Drop expired entries, then the least recently used over the limit."""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if st.st_mtime + self.ttl < now:
+                # Also clears temporary files left behind by a crashed writer.
+                self._remove(entry.path)
+            elif not entry.name.endswith('.tmp'):
+                entries.append((st.st_atime, st.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        for name in (path, path + '.json'):
+            try:
+                os.remove(name)
+            except OSError:
+                pass
 
-    for row in rows:
-        if getattr(row, 'DigitalInput', False):
-            categories['DigitalInput'].append(row)
-        elif getattr(row, 'DigitalOutput', False):
-            categories['DigitalOutput'].append(row)
-        elif getattr(row, 'AnalogInput', False):
-            categories['AnalogInput'].append(row)
-        elif getattr(row, 'AnalogOutput', False):
-            categories['AnalogOutput'].append(row)
-
-    wb = Workbook()
-    default_sheet = wb.active
-    wb.remove(default_sheet)
-
-    for name, rows_list in categories.items():
-        ws = wb.create_sheet(name)
-        ws.append(header)
-        for row in rows_list:
-            ws.append(row[:len(header)])
-
-    wb.save(xlsx_path)
-
-    conn.close()
-    return sum(len(v) for v in categories.values())
-
-
-def update_instruments_from_excel(mdb_path: str, excel_path: str) -> int:
-    """Update the Instruments table using data from an exported Excel workbook.
-
-    The Excel file must contain sheets named DigitalInput, DigitalOutput,
-    AnalogInput and AnalogOutput with the same columns as produced by
-    ``export_instruments_to_excel``. Only rows with matching ``ID`` and ``Tag``
-    are updated. The function returns the number of rows that were modified.
-    """
-
-    expected_header = [
-        'ID',
-        'Tag',
-        'FullDescription',
-        'EGULow',
-        'EGUHigh',
-        'RawLow',
-        'RawHigh',
-        'HALM_EN',
-        'HALM_SP',
-        'HALM_DB',
-        'HALM_DLY',
-        'HWARN_EN',
-        'HWARN_SP',
-        'HWARN_DB',
-        'HWARN_DLY',
-        'LALM_EN',
-        'LALM_SP',
-        'LALM_DB',
-        'LALM_DLY',
-        'LWARN_EN',
-        'LWARN_SP',
-        'LWARN_DB',
-        'LWARN_DLY',
-    ]
 
-    wb = load_workbook(excel_path, data_only=True)
+class ArtifactStore:
+    """Results kept for a later download, shared by every worker process.
 
-    conn_str = (
-        r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-        f'DBQ={mdb_path};'
-    )
-    conn = pyodbc.connect(conn_str, autocommit=False)
-    cursor = conn.cursor()
+    Each result is an entry of a :class:`ResultCache` named by a random token
+    and a kind (``export``, ``mdb``, ``scan`` or ``job``). The token goes into the
+    download links of the page that produced the result, so two users never
+    see each other's files, and any process sharing the directory can serve
+    the download. Entries expire after the cache's TTL.
+    """
+
+    TOKEN = re.compile(r'[A-Za-z0-9_-]{22,64}')
+
+    def __init__(self, cache: ResultCache):
+        self.cache = cache
+
+    @staticmethod
+    def new_token() -> str:
+        return secrets.token_urlsafe(24)
+
+    def _name(self, token: str | None, kind: str) -> str | None:
+        if not token or not self.TOKEN.fullmatch(token):
+            return None
+        return f'{token}.{kind}'
+
+    def put_file(self, token: str, kind: str, src_path: str, meta: dict | None = None) -> str:
+        """Move ``src_path`` into the store and return its new path."""
+        return self.cache.put(self._name(token, kind), src_path, meta or {})
+
+    def put_data(self, token: str, kind: str, data) -> None:
+        """Store ``data`` as JSON."""
+        with tempfile.NamedTemporaryFile('w', delete=False, suffix='.json') as fh:
+            json.dump(data, fh, default=str)
+        self.cache.put(self._name(token, kind), fh.name, {})
+
+    def get_file(self, token: str | None, kind: str) -> tuple[str, dict] | None:
+        """Return ``(path, metadata)`` of a stored file, or ``None``."""
+        name = self._name(token, kind)
+        return self.cache.get(name) if name else None
+
+    def get_data(self, token: str | None, kind: str):
+        """Return data stored with :meth:`put_data`, or ``None``."""
+        hit = self.get_file(token, kind)
+        if hit is None:
+            return None
+        try:
+            with open(hit[0]) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def remove(self, token: str, kind: str) -> None:
+        name = self._name(token, kind)
+        if name:
+            self.cache._remove(os.path.join(self.cache.directory, name))
+
+
+def save_upload(file, suffix: str) -> tuple[str, str]:
+    """Save an uploaded file to a temporary path while hashing it.
+
+    Returns ``(path, sha256 hex digest)``. The digest is computed from the
+    chunks as they are written, so the file is not read a second time.
+
+    Uploads named ``*.gz`` are gunzipped, and for ``*.zip`` uploads the first
+    archive member ending in ``suffix`` is extracted. Either way the data is
+    decompressed chunk by chunk into the temporary file, and the digest is
+    that of the decompressed content. A corrupt archive raises ``ValueError``.
+    Files whose ``suffix`` is itself a zip archive are saved as they are.
+    """
+
+    filename = (file.filename or '').lower()
+    archive = None
+    digest = hashlib.sha256()
+    size = 0
+    start = time.perf_counter()
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    try:
+        with tmp:
+            if filename.endswith('.gz'):
+                source = gzip.GzipFile(fileobj=file.stream)
+            elif filename.endswith('.zip') and not suffix.endswith('.zip'):
+                archive = zipfile.ZipFile(file.stream)
+                members = [n for n in archive.namelist() if n.lower().endswith(suffix)]
+                if not members:
+                    raise ValueError(f'{file.filename} does not contain a {suffix} file')
+                source = archive.open(members[0])
+            else:
+                source = file.stream
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+    except (OSError, EOFError, zlib.error, zipfile.BadZipFile) as exc:
+        os.remove(tmp.name)
+        raise ValueError(f'Could not decompress {file.filename}: {exc}') from exc
+    except Exception:
+        os.remove(tmp.name)
+        raise
+    finally:
+        if archive is not None:
+            archive.close()
+    metrics.observe('plcpoke_stage_seconds', time.perf_counter() - start, pipeline='upload', stage='save')
+    metrics.inc('plcpoke_bytes_total', size, direction='upload')
+    return tmp.name, digest.hexdigest()
+
+
+def upload_file_format(filename: str) -> str:
+    """Return the ``EXPORT_FORMATS`` key of an upload that :func:`save_upload` will save.
+
+    A ``.gz`` ending is ignored, as :func:`save_upload` decompresses it.
+    """
+    name = filename or ''
+    if name.lower().endswith('.gz'):
+        name = name[:-3]
+    return instrument_file_format(name)
+
+
+def gzip_file_response(path: str, download_name: str) -> Response:
+    """Send ``path`` as a gzip-compressed attachment named ``download_name.gz``.
+
+    The file is compressed one chunk at a time while the response is
+    streamed, so no compressed copy is held in memory or written to disk.
+    The file is opened before returning, so callers may delete it once the
+    response is closed.
+    """
+
+    fh = open(path, 'rb')
+
+    def generate():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        try:
+            while True:
+                chunk = fh.read(1024 * 1024)
+                if not chunk:
+                    break
+                data = compressor.compress(chunk)
+                if data:
+                    metrics.inc('plcpoke_bytes_total', len(data), direction='download')
+                    yield data
+            data = compressor.flush()
+            metrics.inc('plcpoke_bytes_total', len(data), direction='download')
+            yield data
+        finally:
+            fh.close()
+
+    response = Response(generate(), mimetype='application/gzip')
+    response.headers.set('Content-Disposition', 'attachment', filename=f'{download_name}.gz')
+    return response
+
+
+def export_cached(
+    mdb_path: str,
+    digest: str,
+    cache: ResultCache,
+    fmt: str = 'xlsx',
+    snapshots: ResultCache | None = None,
+    since: str | None = None,
+    label: str | None = None,
+    **kwargs,
+) -> tuple[str, dict]:
+    """Export ``mdb_path`` through ``cache``, keyed by the file's ``digest``.
+
+    Returns the path of the cached export and its metadata: ``count``, the
+    number of rows in it, and for a delta export the numbers of rows
+    ``added``, ``changed`` and ``removed``. On a miss the file is built with
+    :func:`export_instruments_to_excel` in format ``fmt`` (``kwargs`` are
+    passed through) and stored. Each format is cached separately.
+
+    With a ``snapshots`` cache the row hashes of the export are stored there
+    as ``<digest>.snapshot``, described by ``label``. ``since`` names the
+    digest of an earlier snapshot to export only the changes made since.
+    """
+
+    if since is not None and not re.fullmatch(r'[0-9a-f]{64}', since):
+        raise ValueError(f'Invalid snapshot {since}')
+    suffix = EXPORT_FORMATS[fmt]
+    name = f'{digest}{suffix}' if since is None else f'{digest}-since-{since}{suffix}'
+    snapshot_name = f'{digest}.snapshot'
+    hit = cache.get(name)
+    if hit is not None and snapshots is not None and snapshots.get(snapshot_name) is None:
+        # Export again so that the snapshot is stored as well.
+        hit = None
+    metrics.inc('plcpoke_cache_requests_total', kind='export', result='miss' if hit is None else 'hit')
+    if hit is not None:
+        return hit
+
+    base = None
+    if since is not None:
+        base_hit = snapshots.get(f'{since}.snapshot') if snapshots is not None else None
+        if base_hit is None:
+            raise ValueError('The snapshot to compare with is no longer available')
+        with open(base_hit[0]) as fh:
+            base = RowSnapshot.load(fh)
+    snapshot = RowSnapshot() if snapshots is not None else None
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as xlsx_tmp:
+        xlsx_path = xlsx_tmp.name
+    try:
+        count = export_instruments_to_excel(
+            mdb_path, xlsx_path, fmt=fmt, snapshot=snapshot, since=base, **kwargs
+        )
+        metrics.inc('plcpoke_bytes_total', os.path.getsize(xlsx_path), direction='written')
+        meta = {'count': count}
+        if base is not None:
+            meta.update(snapshot.compare(base))
+        path = cache.put(name, xlsx_path, meta)
+    except Exception:
+        if os.path.exists(xlsx_path):
+            os.remove(xlsx_path)
+        raise
+
+    if snapshot is not None:
+        with tempfile.NamedTemporaryFile('w', delete=False, suffix='.snapshot') as snapshot_tmp:
+            snapshot.dump(snapshot_tmp)
+        snapshots.put(snapshot_name, snapshot_tmp.name, {
+            'label': label,
+            'count': len(snapshot),
+            'created': time.time(),
+        })
+    return path, meta
+
+
+def diff_cached(
+    mdb_path: str,
+    mdb_digest: str,
+    excel_path: str,
+    excel_digest: str,
+    cache: ResultCache,
+    **kwargs,
+) -> InstrumentDiff:
+    """Return the :func:`diff_instruments` result for two uploads via ``cache``.
+
+    The diff is keyed by the digests of both files, so previewing an import
+    and then applying the same files compares them only once. ``kwargs`` are
+    passed to :func:`diff_instruments` on a miss.
+    """
+
+    name = f'{mdb_digest}-{excel_digest}.diff'
+    hit = cache.get(name)
+    metrics.inc('plcpoke_cache_requests_total', kind='diff', result='miss' if hit is None else 'hit')
+    if hit is not None:
+        with open(hit[0]) as fh:
+            return InstrumentDiff.load(fh)
+
+    diff = diff_instruments(mdb_path, excel_path, **kwargs)
+    diff_tmp = tempfile.NamedTemporaryFile('w', delete=False, suffix='.diff')
+    try:
+        with diff_tmp:
+            diff.dump(diff_tmp)
+        cache.put(name, diff_tmp.name, {'updated_rows': diff.updated_rows})
+    except TypeError:
+        # A cell type the dump cannot keep; apply from a fresh comparison.
+        logger.warning('Not caching diff %s', name, exc_info=True)
+        os.remove(diff_tmp.name)
+    except Exception:
+        os.remove(diff_tmp.name)
+        raise
+    return diff
+
+
+class InstrumentStore:
+    """Instrument tables of uploaded MDBs, held in memory for the query API.
+
+    Tables are keyed by the SHA-256 of the upload, so uploading the same
+    file again reuses its table. Once the tables' estimated size
+    (:attr:`InstrumentTable.nbytes`) exceeds ``max_bytes``, the least
+    recently queried tables are dropped, though the newest is always kept.
+    A dropped table has to be uploaded again.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> InstrumentTable | None:
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+            return table
+
+    def put(self, key: str, table: InstrumentTable) -> None:
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            total = sum(t.nbytes for t in self._tables.values())
+            while total > self.max_bytes and len(self._tables) > 1:
+                _, dropped = self._tables.popitem(last=False)
+                total -= dropped.nbytes
+                metrics.inc('plcpoke_instrument_store_evictions_total')
+            metrics.set('plcpoke_instrument_store_datasets', len(self._tables))
+            metrics.set('plcpoke_instrument_store_bytes', total)
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its limit."""
+
+
+class Job:
+    """State of one background export or import.
+
+    ``stage`` and ``rows`` are updated by the running function through
+    :meth:`report`; the remaining fields are filled in when it finishes.
+    With a ``store`` the state is also saved there as the job's ``job``
+    entry, so every worker process can report it and serve its result.
+    """
+
+    # Seconds between saves of the progress reported within one stage.
+    SAVE_INTERVAL = 1.0
+
+    def __init__(self, kind: str, store: ArtifactStore | None = None):
+        self.id = uuid.uuid4().hex
+        self.store = store
+        self.kind = kind
+        self.status = 'queued'
+        self.stage = None
+        self.rows = {}
+        self.message = None
+        self.error = None
+        self.result_path = None
+        self.download_name = None
+        # Results stored in the ResultCache are evicted by the cache itself.
+        self.result_cached = False
+        self.created = time.time()
+        self.finished = None
+        self._saved = 0.0
+
+    def report(self, stage: str, rows: dict) -> None:
+        """``progress`` callback for the export and import functions."""
+        changed = stage != self.stage
+        self.stage = stage
+        self.rows = rows
+        if changed or time.monotonic() - self._saved >= self.SAVE_INTERVAL:
+            self.save()
+
+    def save(self) -> None:
+        """Write the job's state to its store, if it has one."""
+        if self.store is None:
+            return
+        self._saved = time.monotonic()
+        try:
+            self.store.put_data(self.id, 'job', dict(
+                self.to_dict(),
+                result_path=self.result_path,
+                download_name=self.download_name,
+                created=self.created,
+                finished=self.finished,
+            ))
+        except OSError:
+            logger.warning('Could not save the state of job %s', self.id, exc_info=True)
+
+    @classmethod
+    def load(cls, store: ArtifactStore, job_id: str) -> 'Job | None':
+        """Return the state of a job saved by any process, or ``None``."""
+        data = store.get_data(job_id, 'job')
+        if not isinstance(data, dict):
+            return None
+        job = cls(data.get('kind'))
+        job.id = job_id
+        for field in ('status', 'stage', 'rows', 'message', 'error', 'result_path',
+                      'download_name', 'created', 'finished'):
+            setattr(job, field, data.get(field))
+        return job
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'stage': self.stage,
+            'rows': self.rows,
+            'message': self.message,
+            'error': self.error,
+            'download_available': self.result_path is not None,
+        }
+
+
+class JobManager:
+    """Run export and import jobs on a bounded thread pool.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queued`` may
+    wait for a worker; further submissions raise :class:`JobQueueFull`.
+    Finished jobs and their result files are discarded ``result_ttl``
+    seconds after they complete.
+
+    With a ``store`` shared by the worker processes, :meth:`get` also finds
+    jobs submitted to another process; the queue limit is per process.
+    """
 
-    table_names = [row.table_name for row in cursor.tables(tableType='TABLE')]
-    if 'Instruments' not in table_names:
-        conn.close()
-        raise ValueError('Instruments table not found')
+    def __init__(self, max_workers: int, max_queued: int, result_ttl: float,
+                 store: ArtifactStore | None = None):
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, func, *args) -> Job:
+        """Queue ``func(job, *args)`` and return the new job."""
+        self._expire()
+        job = Job(kind, self.store)
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == 'queued')
+            if queued >= self.max_queued:
+                raise JobQueueFull(f'Job queue is full ({queued} waiting)')
+            self._jobs[job.id] = job
+        job.save()
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = Job.load(self.store, job_id)
+            if job is not None and job.finished and job.finished < time.time() - self.result_ttl:
+                job = None
+        return job
+
+    def _run(self, job: Job, func, args) -> None:
+        job.status = 'running'
+        job.save()
+        try:
+            func(job, *args)
+            job.stage = 'done'
+            job.status = 'finished'
+        except Exception as exc:
+            logger.exception('%s job %s failed', job.kind, job.id)
+            job.error = str(exc)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+            job.save()
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [j for j in self._jobs.values() if j.finished and j.finished < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if self.store is not None:
+                self.store.remove(job.id, 'job')
+                self.store.remove(job.id, 'mdb')
+            if job.result_path and not job.result_cached:
+                try:
+                    os.remove(job.result_path)
+                except Exception:
+                    pass
 
-    total_updates = 0
 
+def _run_export_job(
+    job: Job,
+    mdb_path: str,
+    digest: str,
+    fmt: str = 'xlsx',
+    since: str | None = None,
+    label: str | None = None,
+) -> None:
+    """Export ``mdb_path`` for a background job, then remove the upload."""
     try:
-        for sheet_name in ['DigitalInput', 'DigitalOutput', 'AnalogInput', 'AnalogOutput']:
-            if sheet_name not in wb.sheetnames:
-                raise ValueError(f'Sheet {sheet_name} missing from Excel file')
-            ws = wb[sheet_name]
-            header = list(next(ws.iter_rows(max_row=1, values_only=True)))
-            if header != expected_header:
-                raise ValueError(f'Invalid header in sheet {sheet_name}')
-
-            for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-                if all(cell is None for cell in row):
-                    continue
-                data = dict(zip(expected_header, row))
-
-                id_val = data['ID']
-                tag_val = data['Tag']
-                cursor.execute(
-                    'SELECT ' + ', '.join(expected_header) + ' FROM Instruments WHERE ID=? AND Tag=?',
-                    (id_val, tag_val)
+        with open_database(mdb_path, app.config['DATABASE_BACKEND']) as db:
+            with StageTimer('export', job.report) as timer:
+                xlsx_path, meta = export_cached(
+                    mdb_path,
+                    digest,
+                    get_result_cache(),
+                    fmt=fmt,
+                    snapshots=get_snapshot_store(),
+                    since=since,
+                    label=label,
+                    streaming=True,
+                    db=db,
+                    progress=timer,
                 )
-                db_row = cursor.fetchone()
-                if not db_row:
-                    raise ValueError(f'Row {row_idx} in sheet {sheet_name} has unknown ID/Tag')
-
-                updates = []
-                params = []
-                for col in expected_header:
-                    if col in ('ID', 'Tag'):
-                        continue
-                    excel_val = data[col]
-                    db_val = getattr(db_row, col)
-                    if excel_val != db_val:
-                        updates.append(f'{col}=?')
-                        params.append(excel_val)
-
-                if updates:
-                    params.extend([id_val, tag_val])
-                    cursor.execute(
-                        f"UPDATE Instruments SET {', '.join(updates)} WHERE ID=? AND Tag=?",
-                        params
-                    )
-                    total_updates += 1
+    finally:
+        os.remove(mdb_path)
+    job.result_path = xlsx_path
+    job.result_cached = True
+    job.download_name = 'instruments' + EXPORT_FORMATS[fmt]
+    job.message = _export_message(meta)
 
-        conn.commit()
+
+def _run_import_job(job: Job, mdb_path: str, xlsx_path: str) -> None:
+    """Apply ``xlsx_path`` to ``mdb_path`` for a background job."""
+    try:
+        with open_database(mdb_path, app.config['DATABASE_BACKEND']) as db:
+            with StageTimer('import', job.report) as timer:
+                updated = update_instruments_from_excel(
+                    mdb_path,
+                    xlsx_path,
+                    db=db,
+                    progress=timer,
+                    chunk_size=app.config['IMPORT_CHUNK_SIZE'],
+                )
     except Exception:
-        conn.rollback()
+        os.remove(mdb_path)
         raise
     finally:
-        conn.close()
+        os.remove(xlsx_path)
+    if job.store is not None:
+        # Kept with the job's state so any worker can serve the download.
+        mdb_path = job.store.put_file(job.id, 'mdb', mdb_path)
+        job.result_cached = True
+    job.result_path = mdb_path
+    job.download_name = 'updated.mdb'
+    job.message = f'{updated} rows modified.'
+
+
+class PlcPoolFull(Exception):
+    """Raised when every pooled PLC session is busy and the pool is full."""
+
+
+# CIP object and attributes read as the controller's program-change
+# indicator. Logix controllers change these values whenever tags or data
+# types are edited, online or by a download. Only the raw response is kept,
+# so any change at all invalidates the cached definitions.
+CHANGE_DETECTION_CLASS = 0xAC
+CHANGE_DETECTION_ATTRIBUTES = (1, 2, 3, 4, 10)
+
+
+def controller_change_indicator(plc: LogixDriver) -> bytes | None:
+    """Return the controller's program-change indicator, or ``None`` if unsupported."""
+    attributes = CHANGE_DETECTION_ATTRIBUTES
+    try:
+        response = plc.generic_message(
+            service=Services.get_attribute_list,
+            class_code=CHANGE_DETECTION_CLASS,
+            instance=1,
+            request_data=struct.pack(f'<{len(attributes) + 1}H', len(attributes), *attributes),
+            name='change_indicator',
+        )
+    except Exception:
+        logger.debug('Change indicator request failed for %s', plc, exc_info=True)
+        return None
+    if not response or not response.value:
+        return None
+    return bytes(response.value)
+
+
+class TagDefinitionCache:
+    """Tag and data type definitions uploaded from controllers, kept on disk.
+
+    Entries are keyed by the controller's identity (vendor, product code,
+    serial number, revision and program name) and by its
+    :func:`controller_change_indicator`, so an edited program gets a new key
+    and is uploaded again. Controllers that do not report a change indicator
+    are never cached. Entries live in a :class:`ResultCache`, as JSON, so a
+    tampered cache directory can at worst yield wrong definitions.
+    """
+
+    def __init__(self, cache: ResultCache):
+        self.cache = cache
+
+    def key(self, plc: LogixDriver) -> str | None:
+        """Return the cache entry name for the connected ``plc``."""
+        indicator = controller_change_indicator(plc)
+        if indicator is None:
+            return None
+        info = plc.info
+        revision = info.get('revision') or {}
+        identity = (
+            info.get('vendor'),
+            info.get('product_code'),
+            info.get('serial'),
+            revision.get('major'),
+            revision.get('minor'),
+            info.get('name'),
+            pycomm3.__version__,
+        )
+        return hashlib.sha256(repr((identity, indicator.hex())).encode('utf-8')).hexdigest() + '.tags'
+
+    def restore(self, plc: LogixDriver, key: str) -> bool:
+        """Load the definitions stored under ``key`` into ``plc``."""
+        hit = self.cache.get(key)
+        metrics.inc('plcpoke_cache_requests_total', kind='tags', result='miss' if hit is None else 'hit')
+        if hit is None:
+            return False
+        try:
+            with open(hit[0]) as fh:
+                data = json.load(fh, object_hook=_decode_reply)
+            replies = {name: {tuple(args): reply for args, reply in calls} for name, calls in data.items()}
+            upload_tag_list(plc, replies)
+        except Exception:
+            logger.warning('Ignoring unusable tag cache entry %s', hit[0], exc_info=True)
+            return False
+        return True
+
+    def store(self, plc: LogixDriver, key: str, replies: dict) -> None:
+        """Save the upload ``replies`` of :func:`upload_tag_list` under ``key``."""
+        try:
+            data = {
+                name: [[_encode_reply(list(args)), _encode_reply(reply)] for args, reply in calls.items()]
+                for name, calls in replies.items()
+            }
+        except TypeError:
+            logger.warning('Not caching the tag list of %s', plc.info.get('name'), exc_info=True)
+            return
+        with tempfile.NamedTemporaryFile('w', delete=False, suffix='.tags') as fh:
+            json.dump(data, fh)
+        self.cache.put(key, fh.name, {
+            'name': plc.info.get('name'),
+            'tags': len(plc.tags),
+            'created': time.time(),
+        })
+
+
+def _encode_reply(value):
+    """Return a tag upload reply as JSON data, with ``bytes`` base64-encoded."""
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, list):
+        return [_encode_reply(item) for item in value]
+    if isinstance(value, dict):
+        if any(not isinstance(k, str) for k in value) or '__bytes__' in value:
+            raise TypeError(f'Cannot store reply keys {list(value)!r}')
+        return {k: _encode_reply(v) for k, v in value.items()}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError(f'Cannot store a {type(value).__name__} reply')
+
+
+def _decode_reply(obj: dict):
+    """``object_hook`` reversing the ``bytes`` encoding of :func:`_encode_reply`."""
+    if len(obj) == 1 and '__bytes__' in obj:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+# The LogixDriver methods that send requests during a tag upload. Their
+# replies are plain data, unlike the parsed definitions, whose struct type
+# classes are created at run time. They are private, so the cache is only
+# used with the pycomm3 releases listed here and when all three exist.
+TAG_UPLOAD_REQUESTS = ('_get_instance_attribute_list_service', '_get_structure_makeup', '_read_template')
+TAG_UPLOAD_PYCOMM3_VERSIONS = ('1.2.',)
+
+
+def tag_upload_replayable(plc: LogixDriver) -> bool:
+    """Whether :func:`upload_tag_list` can record and replay ``plc``'s upload."""
+    return (
+        pycomm3.__version__.startswith(TAG_UPLOAD_PYCOMM3_VERSIONS)
+        and all(callable(getattr(plc, name, None)) for name in TAG_UPLOAD_REQUESTS)
+    )
+
+
+def upload_tag_list(plc: LogixDriver, replies: dict | None = None) -> dict:
+    """Run ``plc.get_tag_list(program='*')`` and return the replies it used.
+
+    With the ``replies`` of an earlier upload, the definitions are parsed
+    from them and the controller is not asked again; a request missing from
+    ``replies`` raises ``KeyError``.
+    """
+
+    recorded = {name: {} for name in TAG_UPLOAD_REQUESTS}
+
+    def wrap(name, method):
+        def request(*args):
+            reply = replies[name][args] if replies is not None else method(*args)
+            recorded[name][args] = reply
+            return reply
+        return request
+
+    for name in TAG_UPLOAD_REQUESTS:
+        setattr(plc, name, wrap(name, getattr(plc, name)))
+    try:
+        plc.get_tag_list(program='*')
+    finally:
+        for name in TAG_UPLOAD_REQUESTS:
+            delattr(plc, name)
+    return recorded
+
+
+def load_tag_definitions(plc: LogixDriver, cache: TagDefinitionCache | None = None) -> None:
+    """Fill in the tag definitions of a driver opened with ``init_tags=False``.
+
+    The definitions come from ``cache`` when the controller is unchanged
+    since they were stored; otherwise they are uploaded, as
+    ``LogixDriver(path).open()`` would, and stored. With a pycomm3 release
+    that :func:`tag_upload_replayable` does not know, the cache is skipped.
+    """
+
+    if cache is not None and not tag_upload_replayable(plc):
+        logger.debug('Tag cache unavailable with pycomm3 %s', pycomm3.__version__)
+        cache = None
+    key = cache.key(plc) if cache is not None else None
+    if key is not None and cache.restore(plc, key):
+        return
+    with metrics.timer('plcpoke_plc_seconds', operation='tag_upload'):
+        if key is None:
+            plc.get_tag_list(program='*')
+            return
+        replies = upload_tag_list(plc)
+    cache.store(plc, key, replies)
+
+
+class _PlcSession:
+    """A pooled ``LogixDriver`` and the lock serialising its use."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.driver = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.last_checked = 0.0
+
+    def close(self) -> None:
+        if self.driver is not None:
+            try:
+                self.driver.close()
+            except Exception:
+                logger.debug('Error closing PLC session %s', self.path, exc_info=True)
+            self.driver = None
+
+
+class PlcSessionPool:
+    """Live ``LogixDriver`` connections shared by the PLC routes.
+
+    Sessions are keyed by CIP path (``ip/slot``), so each controller pays for
+    the connection and the tag upload once. A session is used by one request
+    at a time. Before a session is reused, it is checked with a cheap identity
+    request if it has been idle for longer than ``health_check_interval``
+    seconds, and it is reconnected if the check fails. A session whose request
+    raised a pycomm3 error is also dropped and reconnected on next use.
+    Sessions idle for ``idle_timeout`` seconds are closed, and at most
+    ``max_sessions`` are kept open. With a ``tag_cache``, reconnecting to an
+    unchanged controller reuses its stored tag definitions.
+    """
+
+    def __init__(self, max_sessions: int, idle_timeout: float, health_check_interval: float,
+                 tag_cache: TagDefinitionCache | None = None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.tag_cache = tag_cache
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, name='plc-pool-reaper', daemon=True)
+        self._reaper.start()
+
+    @contextmanager
+    def session(self, path: str):
+        """Yield a connected ``LogixDriver`` for ``path``."""
+        entry = self._checkout(path)
+        try:
+            plc = self._ensure_connected(entry)
+            yield plc
+        except PycommError:
+            entry.close()
+            raise
+        finally:
+            entry.last_used = time.monotonic()
+            entry.lock.release()
+
+    def close_all(self) -> None:
+        self._stop.set()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for entry in sessions:
+            with entry.lock:
+                entry.close()
+
+    def _checkout(self, path: str) -> _PlcSession:
+        """Return the locked session for ``path``, creating it if needed."""
+        while True:
+            evicted = None
+            with self._lock:
+                entry = self._sessions.get(path)
+                if entry is None:
+                    if len(self._sessions) >= self.max_sessions:
+                        idle = [e for e in self._sessions.values() if not e.lock.locked()]
+                        if not idle:
+                            raise PlcPoolFull(f'All {self.max_sessions} PLC sessions are in use')
+                        evicted = min(idle, key=lambda e: e.last_used)
+                        del self._sessions[evicted.path]
+                    entry = _PlcSession(path)
+                    self._sessions[path] = entry
+            if evicted is not None:
+                with evicted.lock:
+                    evicted.close()
+            entry.lock.acquire()
+            with self._lock:
+                if self._sessions.get(path) is entry:
+                    return entry
+            # Reaped or evicted while we waited for it; start over.
+            entry.lock.release()
+
+    def _ensure_connected(self, entry: _PlcSession) -> LogixDriver:
+        now = time.monotonic()
+        if entry.driver is not None and now - entry.last_checked > self.health_check_interval:
+            try:
+                with metrics.timer('plcpoke_plc_seconds', operation='health_check'):
+                    healthy = entry.driver.connected and bool(entry.driver.get_plc_info())
+            except Exception:
+                healthy = False
+            if not healthy:
+                logger.info('PLC session %s failed its health check, reconnecting', entry.path)
+                entry.close()
+            entry.last_checked = now
+        if entry.driver is None:
+            # Equivalent to LogixDriver(path).open(), with the connect and
+            # the tag upload timed separately and the tag definitions taken
+            # from the cache when the controller has not changed.
+            driver = LogixDriver(entry.path, init_tags=False)
+            with metrics.timer('plcpoke_plc_seconds', operation='connect'):
+                driver.open()
+            try:
+                load_tag_definitions(driver, self.tag_cache)
+            except Exception:
+                driver.close()
+                raise
+            entry.driver = driver
+            entry.last_checked = time.monotonic()
+        return entry.driver
+
+    def _reap_loop(self) -> None:
+        while not self._stop.wait(max(self.idle_timeout / 2, 1)):
+            cutoff = time.monotonic() - self.idle_timeout
+            with self._lock:
+                idle = [
+                    e for e in self._sessions.values()
+                    if e.last_used < cutoff and not e.lock.locked()
+                ]
+                for entry in idle:
+                    del self._sessions[entry.path]
+            for entry in idle:
+                with entry.lock:
+                    entry.close()
+
+
+# Controller identity fields shown on the PLC pages.
+PLC_INFO_FIELDS = (
+    'vendor',
+    'product_type',
+    'product_code',
+    'revision',
+    'serial',
+    'product_name',
+    'keyswitch',
+    'name',
+)
+
+
+def parse_scan_targets(text: str, default_slot: str, limit: int) -> list:
+    """Expand a list of scan targets into unique ``ip/slot`` paths.
+
+    Targets are separated by commas or whitespace. Each is an IPv4 address
+    with an optional ``:port`` and ``/slot``; the last octet may be a range
+    such as ``10.0.0.10-20``, and the port applies to every address in it.
+    ``default_slot`` is used when no slot is given. Raises ``ValueError`` for
+    malformed targets or more than ``limit`` paths.
+    """
+
+    paths = []
+    for item in re.split(r'[\s,]+', text.strip()):
+        if not item:
+            continue
+        address, _, slot = item.partition('/')
+        slot = slot or default_slot
+        if not slot.isdigit():
+            raise ValueError(f'Invalid slot in target {item}')
+        address, colon, port = address.partition(':')
+        if colon and not (port.isdigit() and 0 < int(port) < 65536):
+            raise ValueError(f'Invalid port in target {item}')
+        first, dash, last = address.partition('-')
+        try:
+            ipaddress.IPv4Address(first)
+        except ValueError:
+            raise ValueError(f'Invalid IP address in target {item}') from None
+        if dash:
+            prefix, _, start = first.rpartition('.')
+            if not last.isdigit() or not int(start) <= int(last) <= 255:
+                raise ValueError(f'Invalid address range in target {item}')
+            hosts = [f'{prefix}.{n}' for n in range(int(start), int(last) + 1)]
+        else:
+            hosts = [first]
+        for host in hosts:
+            path = f'{host}:{port}/{slot}' if colon else f'{host}/{slot}'
+            if path not in paths:
+                paths.append(path)
+        if len(paths) > limit:
+            raise ValueError(f'Too many scan targets (limit {limit})')
+    return paths
+
+
+def scan_controllers(paths: list, concurrency: int, timeout: float, include_tags: bool,
+                     tag_cache: TagDefinitionCache | None = None) -> list:
+    """Query ``get_plc_info`` (and optionally the tag list) on many PLCs at once.
+
+    At most ``concurrency`` controllers are contacted at a time. Each one
+    uses a short-lived connection with ``timeout`` as its socket timeout,
+    and a controller still running ``timeout`` seconds after it started is
+    reported as timed out without waiting for it. Returns one result dict
+    per path, in the order given. Tag lists are loaded through ``tag_cache``
+    when one is given.
+    """
+
+    started = {}
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix='scan')
+    futures = {
+        executor.submit(_scan_controller, path, timeout, include_tags, started, tag_cache): path
+        for path in paths
+    }
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+            now = time.monotonic()
+            for future in list(pending):
+                path = futures[future]
+                if path in started and now - started[path] > timeout:
+                    pending.discard(future)
+                    results[path] = _scan_result(path, 'timeout', now - started[path],
+                                                 error=f'No response within {timeout:g}s')
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return [results[path] for path in paths]
+
+
+def _scan_controller(path: str, timeout: float, include_tags: bool, started: dict,
+                     tag_cache: TagDefinitionCache | None = None) -> dict:
+    started[path] = start = time.monotonic()
+    try:
+        plc = LogixDriver(path, init_tags=False)
+        plc.socket_timeout = timeout
+        try:
+            with metrics.timer('plcpoke_plc_seconds', operation='connect'):
+                plc.open()
+            info = {k: plc.info.get(k) for k in PLC_INFO_FIELDS}
+            tags = None
+            if include_tags:
+                load_tag_definitions(plc, tag_cache)
+                tags = list(plc.tags.values())
+        finally:
+            plc.close()
+    except Exception as exc:
+        return _scan_result(path, 'error', time.monotonic() - start, error=str(exc))
+    return _scan_result(path, 'ok', time.monotonic() - start, info=info, tags=tags)
+
+
+def _scan_result(path: str, status: str, elapsed: float, info=None, tags=None, error=None) -> dict:
+    result = {'target': path, 'status': status, 'elapsed': round(elapsed, 3), 'error': error}
+    result.update(dict.fromkeys(PLC_INFO_FIELDS))
+    if info:
+        result.update(info)
+        revision = info.get('revision')
+        if isinstance(revision, dict):
+            result['revision'] = f"{revision.get('major')}.{revision.get('minor')}"
+    result['tag_count'] = len(tags) if tags is not None else None
+    result['tags'] = [
+        (t['tag_name'], t.get('data_type_name'), t.get('dimensions')) for t in tags
+    ] if tags is not None else None
+    return result
+
+
+def csv_response(header: list, rows, download_name: str) -> Response:
+    """Stream ``rows`` to the client as a CSV attachment.
+
+    Rows are formatted one at a time as the response is sent, so large
+    results are never held as a single string.
+    """
+
+    def flush(buffer):
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        metrics.inc('plcpoke_bytes_total', len(data), direction='download')
+        return data
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() > 64 * 1024:
+                yield flush(buffer)
+        yield flush(buffer)
+
+    response = Response(generate(), mimetype='text/csv')
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    return response
+
+
+# Columns of the tag list CSV. Fixed so that every row has the same layout
+# whatever fields the individual tag definitions carry.
+TAG_CSV_COLUMNS = [
+    'tag_name',
+    'scope',
+    'program',
+    'data_type',
+    'tag_type',
+    'dimensions',
+    'alias',
+    'external_access',
+    'instance_id',
+]
+
+
+def tag_scope(tag_name: str) -> tuple[str, str | None]:
+    """Return ``(scope, program)`` for a tag name from ``LogixDriver.tags``."""
+    if tag_name.startswith('Program:'):
+        return 'program', tag_name[len('Program:'):].split('.', 1)[0]
+    return 'controller', None
+
+
+def filter_tags(tags, program: str | None = None, scope: str | None = None,
+                data_type: str | None = None):
+    """Yield the tag definitions matching every filter that is given.
+
+    ``scope`` is ``controller`` or ``program``. ``program`` and
+    ``data_type`` are compared case-insensitively.
+    """
+
+    program = program.casefold() if program else None
+    data_type = data_type.casefold() if data_type else None
+    for tag in tags:
+        tag_scope_name, tag_program = tag_scope(tag['tag_name'])
+        if scope and tag_scope_name != scope:
+            continue
+        if program and (tag_program or '').casefold() != program:
+            continue
+        if data_type and (tag.get('data_type_name') or '').casefold() != data_type:
+            continue
+        yield tag
+
+
+def _tag_filters(values) -> dict:
+    """Read the :func:`filter_tags` arguments from a form or query string."""
+    return {
+        key: values.get(key, '').strip() or None
+        for key in ('program', 'scope', 'data_type')
+    }
+
+
+def tag_csv_row(tag: dict) -> list:
+    """Format a tag definition as a row of ``TAG_CSV_COLUMNS``.
+
+    pycomm3 only flags alias tags, without their target, so ``alias`` is
+    ``yes`` or empty.
+    """
+    scope, program = tag_scope(tag['tag_name'])
+    dimensions = 'x'.join(str(d) for d in tag.get('dimensions') or () if d)
+    return [
+        tag['tag_name'],
+        scope,
+        program or '',
+        tag.get('data_type_name') or '',
+        tag.get('tag_type') or '',
+        dimensions,
+        'yes' if tag.get('alias') else '',
+        tag.get('external_access') or '',
+        tag.get('instance_id', ''),
+    ]
+
+
+# Struct members read as the live value of an instrument whose PLC tag is a
+# structure, in order of preference.
+VALUE_MEMBERS = ('Val', 'PV', 'Value')
+
+
+def plc_tag_index(plc: LogixDriver) -> dict:
+    """Map case-folded tag names to their definitions in ``plc.tags``.
+
+    Logix tag names are not case sensitive, so lookups go through this index
+    rather than ``plc.tags`` directly.
+    """
+    return {name.casefold(): definition for name, definition in plc.tags.items()}
+
+
+def resolve_plc_tag(index: dict, name: str) -> tuple[str, dict] | None:
+    """Find ``name`` (optionally a dotted member path) in a tag index.
+
+    Returns ``(canonical name, definition)`` where the definition is that of
+    the tag or of the innermost member, or ``None`` if any part is unknown.
+    """
+
+    base, *members = name.split('.')
+    if base.startswith('Program:') and members:
+        base = f'{base}.{members.pop(0)}'
+    definition = index.get(base.casefold())
+    if definition is None:
+        return None
+    canonical = [definition['tag_name']]
+    for member in members:
+        data_type = definition.get('data_type')
+        internal = data_type.get('internal_tags', {}) if isinstance(data_type, dict) else {}
+        match = next((k for k in internal if k.casefold() == member.casefold()), None)
+        if match is None:
+            return None
+        canonical.append(match)
+        definition = internal[match]
+    return '.'.join(canonical), definition
+
+
+def struct_members(definition: dict) -> dict:
+    """Return the case-folded member names of a struct definition."""
+    data_type = definition.get('data_type')
+    if definition.get('tag_type') != 'struct' or not isinstance(data_type, dict):
+        return {}
+    return {name.casefold(): name for name in data_type.get('internal_tags', {})}
+
+
+def read_plc_tags(plc: LogixDriver, names: list, batch_size: int) -> dict:
+    """Read ``names`` in batches of ``batch_size`` and return name -> ``Tag``.
+
+    pycomm3 packs each batch into as few multi-service requests as the
+    connection size allows.
+    """
+
+    results = {}
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        with metrics.timer('plcpoke_plc_seconds', operation='read'):
+            tags = plc.read(*batch)
+        metrics.inc('plcpoke_plc_tags_read_total', len(batch))
+        if len(batch) == 1:
+            tags = [tags]
+        results.update(zip(batch, tags))
+    return results
+
+
+def compare_setpoints_with_plc(plc: LogixDriver, instruments: list, batch_size: int) -> list:
+    """Compare instruments from :func:`read_instrument_setpoints` with the PLC.
+
+    Tags are looked up in the controller's tag list first, so unknown tags
+    cost no requests. Atomic tags are read as the live value. For struct
+    tags the first member in ``VALUE_MEMBERS`` is read as the value together
+    with every member in ``SETPOINT_MEMBERS`` that the struct defines. All
+    reads are sent through :func:`read_plc_tags`.
+
+    Returns one dict per instrument with ``tag``, ``sheet``, ``status``
+    (``ok``, ``mismatch``, ``missing`` or ``error``), ``value``, ``error``
+    and ``setpoints``, a list of ``(member, mdb value, plc value, match)``.
+    """
+
+    index = plc_tag_index(plc)
+    plans = []
+    names = []
+    for instrument in instruments:
+        resolved = resolve_plc_tag(index, instrument['tag'])
+        if resolved is None:
+            plans.append((instrument, None, None, {}))
+            continue
+        name, definition = resolved
+        members = struct_members(definition)
+        if members:
+            value_name = next(
+                (f'{name}.{members[m.casefold()]}' for m in VALUE_MEMBERS if m.casefold() in members),
+                None,
+            )
+            setpoint_names = {
+                sp: f'{name}.{members[sp.casefold()]}'
+                for sp in SETPOINT_MEMBERS if sp.casefold() in members
+            }
+        else:
+            value_name = name
+            setpoint_names = {}
+        plans.append((instrument, name, value_name, setpoint_names))
+        if value_name:
+            names.append(value_name)
+        names.extend(setpoint_names.values())
+
+    values = read_plc_tags(plc, names, batch_size)
+
+    results = []
+    for instrument, name, value_name, setpoint_names in plans:
+        result = {
+            'tag': instrument['tag'],
+            'sheet': instrument['sheet'],
+            'status': 'ok',
+            'value': None,
+            'error': None,
+            'setpoints': [],
+        }
+        results.append(result)
+        if name is None:
+            result['status'] = 'missing'
+            result['error'] = 'Tag not found in controller'
+            continue
+
+        errors = []
+        if value_name:
+            tag = values[value_name]
+            result['value'] = tag.value
+            if tag.error:
+                errors.append(f'{value_name}: {tag.error}')
+        for member in SETPOINT_MEMBERS:
+            mdb_value = instrument['setpoints'][member]
+            if member not in setpoint_names:
+                result['setpoints'].append((member, mdb_value, None, None))
+                continue
+            tag = values[setpoint_names[member]]
+            if tag.error:
+                errors.append(f'{setpoint_names[member]}: {tag.error}')
+                result['setpoints'].append((member, mdb_value, None, None))
+                continue
+            match = _values_match(mdb_value, tag.value)
+            result['setpoints'].append((member, mdb_value, tag.value, match))
+            if not match:
+                result['status'] = 'mismatch'
+
+        if errors:
+            result['status'] = 'error'
+            result['error'] = '; '.join(errors)
+    return results
+
+
+def _values_match(mdb_value, plc_value) -> bool:
+    """Compare an MDB value with a PLC value, allowing for REAL precision."""
+    if mdb_value is None or plc_value is None:
+        return mdb_value is plc_value
+    try:
+        return math.isclose(float(mdb_value), float(plc_value), rel_tol=1e-6, abs_tol=1e-6)
+    except (TypeError, ValueError):
+        return mdb_value == plc_value
+
+
+def write_plc_tags(plc: LogixDriver, pairs: list, batch_size: int) -> dict:
+    """Write ``(name, value)`` pairs in batches and return name -> ``Tag``.
+
+    Like :func:`read_plc_tags`, each batch is packed into as few
+    multi-service requests as the connection size allows.
+    """
+
+    results = {}
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start:start + batch_size]
+        with metrics.timer('plcpoke_plc_seconds', operation='write'):
+            tags = plc.write(*batch)
+        metrics.inc('plcpoke_plc_tags_written_total', len(batch))
+        if len(batch) == 1:
+            tags = [tags]
+        results.update(zip((name for name, _ in batch), tags))
+    return results
+
+
+def _plc_value(data_type: str, value):
+    """Convert a value from the MDB or an export to a PLC member's type."""
+    if data_type == 'BOOL':
+        return bool(value)
+    if data_type in ('REAL', 'LREAL'):
+        return float(value)
+    if data_type in ('SINT', 'INT', 'DINT', 'LINT', 'USINT', 'UINT', 'UDINT', 'ULINT'):
+        return int(round(float(value)))
+    return value
+
+
+def push_alarm_settings(plc: LogixDriver, instruments: list, batch_size: int, dry_run: bool = False) -> list:
+    """Write the alarm settings of ``instruments`` to the PLC where they differ.
+
+    ``instruments`` come from :func:`read_instrument_setpoints` or
+    :func:`read_file_setpoints` with ``members=ALARM_MEMBERS``. Every member
+    of an instrument's struct tag named in ``ALARM_MEMBERS`` is read first,
+    and only values that differ from the PLC are written, all through
+    :func:`read_plc_tags` and :func:`write_plc_tags`. With ``dry_run`` nothing
+    is written.
+
+    Returns one dict per member with ``tag``, ``member``, ``plc_tag``,
+    ``old``, ``new``, ``status`` and ``error``. ``status`` is
+    ``unchanged``, ``pending`` (a dry-run write), ``written``, ``failed``
+    or ``skipped`` (no such tag or member, or no value to write); skipped
+    tags are reported once with ``member`` set to ``None``.
+    """
+
+    index = plc_tag_index(plc)
+    results = []
+    names = []
+    for instrument in instruments:
+        resolved = resolve_plc_tag(index, instrument['tag'])
+        members = struct_members(resolved[1]) if resolved else {}
+        if not members:
+            results.append({
+                'tag': instrument['tag'],
+                'member': None,
+                'plc_tag': resolved[0] if resolved else None,
+                'old': None,
+                'new': None,
+                'status': 'skipped',
+                'error': 'Tag not found in controller' if resolved is None else 'Tag is not a structure',
+            })
+            continue
+        name, definition = resolved
+        internal = definition['data_type']['internal_tags']
+        for member in ALARM_MEMBERS:
+            new = instrument['setpoints'].get(member)
+            result = {
+                'tag': instrument['tag'],
+                'member': member,
+                'plc_tag': None,
+                'old': None,
+                'new': new,
+                'status': 'skipped',
+                'error': None,
+            }
+            results.append(result)
+            if member.casefold() not in members:
+                result['error'] = 'Member not defined in the tag'
+                continue
+            if new is None:
+                result['error'] = 'No value to write'
+                continue
+            plc_member = members[member.casefold()]
+            result['plc_tag'] = f'{name}.{plc_member}'
+            try:
+                result['new'] = _plc_value(tag_type_name(internal[plc_member]).upper(), new)
+            except (TypeError, ValueError):
+                result['error'] = f'Invalid value {new!r}'
+                continue
+            result['status'] = 'pending'
+            names.append(result['plc_tag'])
+
+    values = read_plc_tags(plc, names, batch_size)
+    writes = []
+    for result in results:
+        if result['status'] != 'pending':
+            continue
+        tag = values[result['plc_tag']]
+        if tag.error:
+            result['status'] = 'failed'
+            result['error'] = f'Read failed: {tag.error}'
+            continue
+        result['old'] = tag.value
+        if _values_match(result['new'], tag.value):
+            result['status'] = 'unchanged'
+        else:
+            writes.append(result)
+
+    if dry_run or not writes:
+        return results
+
+    written = write_plc_tags(plc, [(r['plc_tag'], r['new']) for r in writes], batch_size)
+    for result in writes:
+        tag = written[result['plc_tag']]
+        if tag.error:
+            result['status'] = 'failed'
+            result['error'] = f'Write failed: {tag.error}'
+        else:
+            result['status'] = 'written'
+            logger.info('Wrote %s = %r (was %r)', result['plc_tag'], result['new'], result['old'])
+    return results
+
+
+class PollSubscription:
+    """One viewer's interest in a set of tags polled by a :class:`TagPoller`.
+
+    ``history`` holds the buffered samples of each tag at the time of
+    subscribing, and :meth:`get` returns the samples of each later poll.
+    When the viewer falls behind, the oldest polls are dropped.
+    """
+
+    def __init__(self, path: str, tags: list, queue_size: int = 100):
+        self.path = path
+        self.tags = tags
+        self.history = {}
+        self._queue = queue.Queue(queue_size)
+
+    def get(self, timeout: float) -> dict | None:
+        """Return the next poll's samples, or ``None`` after ``timeout`` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _put(self, event: dict) -> None:
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class _PollGroup:
+    """The tags polled from one controller and the subscriptions to them."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.buffers = {}
+        self.refs = {}
+        self.subscriptions = set()
+
+
+class TagPoller:
+    """Reads the tags that viewers watch at a fixed rate.
+
+    Subscriptions to the same controller share one poll loop, which reads
+    the union of their tags every ``interval`` seconds with
+    :func:`read_plc_tags` through the session ``pool``. The loops of all
+    controllers are asyncio tasks on one event loop running in a background
+    thread; the blocking reads run on a pool of ``max_workers`` threads.
+    The last ``history`` samples of every tag are kept in a ring buffer.
+    A controller's loop stops when its last subscription is cancelled.
+    """
+
+    def __init__(self, pool: 'PlcSessionPool', interval: float, history: int,
+                 batch_size: int, max_workers: int):
+        self.pool = pool
+        self.interval = interval
+        self.history = history
+        self.batch_size = batch_size
+        self._groups = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='plc-poll')
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='plc-poller', daemon=True)
+        self._thread.start()
+
+    def subscribe(self, path: str, tags: list) -> PollSubscription:
+        """Start watching ``tags`` on the controller at ``path``."""
+        subscription = PollSubscription(path, tags)
+        with self._lock:
+            group = self._groups.get(path)
+            start = group is None
+            if start:
+                group = self._groups[path] = _PollGroup(path)
+            for tag in tags:
+                group.refs[tag] = group.refs.get(tag, 0) + 1
+                group.buffers.setdefault(tag, deque(maxlen=self.history))
+            subscription.history = {tag: list(group.buffers[tag]) for tag in tags}
+            group.subscriptions.add(subscription)
+            self._update_metrics(group)
+        if start:
+            asyncio.run_coroutine_threadsafe(self._poll(group), self._loop)
+        return subscription
+
+    def unsubscribe(self, subscription: PollSubscription) -> None:
+        """Stop watching; calling this more than once is harmless."""
+        with self._lock:
+            group = self._groups.get(subscription.path)
+            if group is None or subscription not in group.subscriptions:
+                return
+            group.subscriptions.discard(subscription)
+            for tag in subscription.tags:
+                group.refs[tag] -= 1
+                if not group.refs[tag]:
+                    del group.refs[tag]
+                    del group.buffers[tag]
+            if not group.subscriptions:
+                del self._groups[group.path]
+            self._update_metrics(group)
+
+    def close(self) -> None:
+        with self._lock:
+            self._groups.clear()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._executor.shutdown(wait=False)
+
+    def _update_metrics(self, group: _PollGroup) -> None:
+        metrics.set('plcpoke_poll_subscriptions', len(group.subscriptions), controller=group.path)
+        metrics.set('plcpoke_poll_tags', len(group.refs), controller=group.path)
+
+    def _read(self, path: str, names: list) -> dict:
+        with self.pool.session(path) as plc:
+            return read_plc_tags(plc, names, self.batch_size)
+
+    async def _poll(self, group: _PollGroup) -> None:
+        loop = asyncio.get_running_loop()
+        next_poll = loop.time()
+        while True:
+            with self._lock:
+                if self._groups.get(group.path) is not group:
+                    return
+                names = list(group.refs)
+            try:
+                values = await loop.run_in_executor(self._executor, self._read, group.path, names)
+                error = None
+            except Exception as exc:
+                values = {}
+                error = str(exc)
+
+            now = time.time()
+            with self._lock:
+                for name in names:
+                    buffer = group.buffers.get(name)
+                    if buffer is None:
+                        continue  # unsubscribed during the read
+                    tag = values.get(name)
+                    if tag is None:
+                        buffer.append((now, None, error))
+                    else:
+                        buffer.append((now, tag.value, tag.error or None))
+                subscriptions = list(group.subscriptions)
+                samples = {name: group.buffers[name][-1] for name in names if name in group.buffers}
+            for subscription in subscriptions:
+                subscription._put({
+                    tag: samples[tag] for tag in subscription.tags if tag in samples
+                })
+
+            # Keep a fixed rate; after an overrun, poll again straight away.
+            next_poll = max(next_poll + self.interval, loop.time())
+            await asyncio.sleep(next_poll - loop.time())
+
+
+# Data types an instrument's PLC tag (or the tag's value member, for
+# structures) may have, by the sheet the instrument is exported to.
+SHEET_DATA_TYPES = {
+    'DigitalInput': ('BOOL',),
+    'DigitalOutput': ('BOOL',),
+    'AnalogInput': ('REAL', 'LREAL', 'SINT', 'INT', 'DINT', 'LINT'),
+    'AnalogOutput': ('REAL', 'LREAL', 'SINT', 'INT', 'DINT', 'LINT'),
+}
+
+# Categories of a reconciliation report, in the order they are listed.
+RECONCILE_CATEGORIES = {
+    'missing': 'Instrument tag not found in the controller',
+    'ambiguous': 'Instrument tag found in more than one program',
+    'type_mismatch': 'Data type does not match the sheet',
+    'duplicate': 'Controller tag used by more than one instrument',
+    'unused': 'Controller tag without an instrument',
+    'ok': 'Matched',
+}
+
+RECONCILE_CSV_COLUMNS = ['category', 'id', 'tag', 'sheet', 'plc_tag', 'data_type', 'detail']
+
+
+def split_tag_name(name: str) -> tuple[str | None, str, list]:
+    """Split a tag reference into ``(program, base tag, member names)``.
+
+    ``Program:Main.TT101.PV`` gives ``('Main', 'TT101', ['PV'])`` and
+    ``TT101`` gives ``(None, 'TT101', [])``. Array subscripts stay on their
+    part: ``Valves[3].PV`` gives ``(None, 'Valves[3]', ['PV'])``.
+    """
+
+    parts = [part.strip() for part in name.strip().split('.')]
+    program = None
+    if parts[0].casefold().startswith('program:') and len(parts) > 1:
+        program = parts.pop(0)[len('Program:'):]
+    return program, parts[0], parts[1:]
+
+
+def split_subscript(part: str) -> tuple[str, str]:
+    """Split ``'Valves[3]'`` into ``('Valves', '[3]')``; the subscript may be empty."""
+    name, bracket, rest = part.partition('[')
+    return name.strip(), bracket + rest.replace(' ', '')
+
+
+def _subscript_error(definition: dict, subscript: str) -> str | None:
+    """Return why ``subscript`` does not name an element of ``definition``, if it does not.
+
+    ``definition`` is a tag, whose ``dimensions`` are checked, or a struct
+    member, whose ``array`` length is.
+    """
+
+    if not subscript:
+        return None
+    if 'dimensions' in definition:
+        dims = list(definition['dimensions'][:definition.get('dim', 0)])
+    else:
+        dims = [definition['array']] if definition.get('array') else []
+    if not dims:
+        return 'is not an array'
+    try:
+        indexes = [int(i) for i in subscript[1:-1].split(',')]
+    except ValueError:
+        return f'has an invalid subscript {subscript}'
+    if not subscript.endswith(']') or len(indexes) != len(dims) or any(
+        not 0 <= i < d for i, d in zip(indexes, dims)
+    ):
+        return f'has no element {subscript}'
+    return None
+
+
+def tag_type_name(definition: dict) -> str:
+    """Return the data type name of a tag or struct member definition."""
+    if definition.get('data_type_name'):
+        return definition['data_type_name']
+    data_type = definition.get('data_type')
+    if isinstance(data_type, dict):
+        return data_type.get('name') or ''
+    return data_type or ''
+
+
+def _value_definition(definition: dict) -> dict | None:
+    """Return the definition holding an instrument's value.
+
+    That is the tag itself for atomic tags, or the first member in
+    ``VALUE_MEMBERS`` for structures (``None`` if there is none).
+    """
+    members = struct_members(definition)
+    if not members:
+        return definition
+    for member in VALUE_MEMBERS:
+        if member.casefold() in members:
+            return definition['data_type']['internal_tags'][members[member.casefold()]]
+    return None
+
+
+def reconcile_instruments_with_tags(instruments: list, tags, filters: dict | None = None):
+    """Match the instruments from :func:`read_instrument_setpoints` with PLC tags.
+
+    ``tags`` are the tag definitions from ``LogixDriver.tags``. Both sides
+    are put in hash indexes on case-folded names, so the join takes linear
+    time however many tags the controller has. An instrument tag without a
+    program prefix matches the controller-scoped tag of that name, or else
+    the only program-scoped tag with that base name. Member paths such as
+    ``TT101.PV`` are followed into the tag's structure, and array elements
+    such as ``Valves[3]`` are matched as elements, so each element can
+    belong to its own instrument.
+
+    Yields one row per instrument and then one per controller tag that no
+    instrument uses. The latter are limited to the tags matching the
+    :func:`filter_tags` arguments in ``filters``. Rows are dicts with the
+    keys of ``RECONCILE_CSV_COLUMNS``; ``category`` is a key of
+    ``RECONCILE_CATEGORIES``.
+    """
+
+    tags = list(tags)
+    by_name = {}
+    by_base = {}
+    for tag in tags:
+        key = tag['tag_name'].casefold()
+        by_name[key] = tag
+        if key.startswith('program:'):
+            by_base.setdefault(key.split('.', 1)[1], []).append(tag)
+
+    used = set()
+    references = {}
+    for instrument in instruments:
+        row = {
+            'category': 'ok',
+            'id': instrument['id'],
+            'tag': instrument['tag'],
+            'sheet': instrument['sheet'],
+            'plc_tag': None,
+            'data_type': None,
+            'detail': None,
+        }
+        program, base, members = split_tag_name(instrument['tag'])
+        base, subscript = split_subscript(base)
+        if program is not None:
+            candidates = [by_name.get(f'program:{program}.{base}'.casefold())]
+        elif base.casefold() in by_name:
+            candidates = [by_name[base.casefold()]]
+        else:
+            candidates = by_base.get(base.casefold(), [])
+        candidates = [c for c in candidates if c is not None]
+
+        if not candidates:
+            row['category'] = 'missing'
+            yield row
+            continue
+        if len(candidates) > 1:
+            row['category'] = 'ambiguous'
+            row['detail'] = ', '.join(c['tag_name'] for c in candidates)
+            yield row
+            continue
+
+        definition = candidates[0]
+        used.add(definition['tag_name'].casefold())
+        canonical = [definition['tag_name']]
+        error = _subscript_error(definition, subscript)
+        if not error:
+            canonical[-1] += subscript
+        for member in members:
+            if error:
+                break
+            member, subscript = split_subscript(member)
+            internal = struct_members(definition)
+            if member.casefold() not in internal:
+                error = f'has no member {member}'
+                break
+            canonical.append(internal[member.casefold()])
+            definition = definition['data_type']['internal_tags'][canonical[-1]]
+            error = _subscript_error(definition, subscript)
+            if not error:
+                canonical[-1] += subscript
+        if error:
+            row['category'] = 'missing'
+            row['detail'] = f"{'.'.join(canonical)} {error}"
+            definition = None
+        row['plc_tag'] = '.'.join(canonical)
+        if definition is None:
+            yield row
+            continue
+
+        row['data_type'] = tag_type_name(definition)
+        reference = row['plc_tag'].casefold()
+        if reference in references:
+            row['category'] = 'duplicate'
+            row['detail'] = f'Also used by instrument {references[reference]}'
+            yield row
+            continue
+        references[reference] = instrument['id']
+
+        value = _value_definition(definition)
+        expected = SHEET_DATA_TYPES.get(instrument['sheet'], ())
+        if value is None:
+            row['category'] = 'type_mismatch'
+            row['detail'] = f"{row['data_type']} has no {'/'.join(VALUE_MEMBERS)} member"
+        elif tag_type_name(value).upper() not in expected:
+            row['category'] = 'type_mismatch'
+            row['detail'] = f"{instrument['sheet']} expects {'/'.join(expected)}, got {tag_type_name(value)}"
+        yield row
+
+    for tag in filter_tags(tags, **(filters or {})):
+        if tag['tag_name'].casefold() not in used:
+            yield {
+                'category': 'unused',
+                'id': None,
+                'tag': None,
+                'sheet': None,
+                'plc_tag': tag['tag_name'],
+                'data_type': tag_type_name(tag),
+                'detail': None,
+            }
 
-    return total_updates
 
 HOME_TEMPLATE = """
 <!doctype html>
@@ -229,6 +1899,11 @@ HOME_TEMPLATE = """
     <a class="button" href="{{ url_for('export_page') }}">Export Instruments</a>
     <a class="button" href="{{ url_for('import_excel') }}">Update From Excel</a>
     <a class="button" href="{{ url_for('plc_page') }}">Read PLC Info</a>
+    <a class="button" href="{{ url_for('plc_compare') }}">Compare MDB With PLC</a>
+    <a class="button" href="{{ url_for('plc_reconcile') }}">Reconcile Tags</a>
+    <a class="button" href="{{ url_for('plc_push') }}">Push Alarm Settings</a>
+    <a class="button" href="{{ url_for('plc_watch') }}">Watch Tags</a>
+    <a class="button" href="{{ url_for('plc_scan') }}">Scan Controllers</a>
   </div>
 </body>
 </html>
@@ -251,9 +1926,21 @@ EXPORT_TEMPLATE = """
   <div class="container">
     <h1>Export Instruments</h1>
     <form method="post" enctype="multipart/form-data">
-      <input id="mdb-file" type="file" name="file" accept=".mdb" style="display:none" />
+      <input id="mdb-file" type="file" name="file" accept=".mdb,.gz,.zip" style="display:none" />
       <button type="button" onclick="document.getElementById('mdb-file').click()">Select File</button>
       <span id="file-name"></span>
+      <select name="format">
+        <option value="xlsx">Excel (.xlsx)</option>
+        <option value="csv">CSV per sheet (.zip)</option>
+        <option value="jsonl">JSON Lines (.jsonl)</option>
+        <option value="parquet">Parquet (.parquet)</option>
+      </select>
+      <select name="since">
+        <option value="">Full export</option>
+        {% for digest, description in snapshots %}
+        <option value="{{ digest }}">Changes since {{ description }}</option>
+        {% endfor %}
+      </select>
       <button type="submit">Upload</button>
     </form>
     <script>
@@ -267,8 +1954,9 @@ EXPORT_TEMPLATE = """
     {% if message %}
     <p>{{ message }}</p>
     {% endif %}
-    {% if excel_available %}
-    <p><a href="{{ url_for('download_excel') }}">Download Instruments Excel</a></p>
+    {% if token %}
+    <p><a href="{{ url_for('download_excel', token=token) }}">Download Instruments {{ download_label }}</a>
+       (<a href="{{ url_for('download_excel', token=token, compress='gzip') }}">gzip</a>)</p>
     {% endif %}
     <p><a href="{{ url_for('home') }}">Back to Home</a></p>
   </div>
@@ -284,24 +1972,28 @@ IMPORT_TEMPLATE = """
   <title>Update MDB</title>
   <style>
     body { font-family: Arial, sans-serif; background:#f2f2f2; margin:40px; }
-    .container { max-width:600px; margin:auto; background:#fff; padding:40px; border-radius:8px; box-shadow:0 2px 4px rgba(0,0,0,0.1); }
+    .container { max-width:{{ '1100px' if diff else '600px' }}; margin:auto; background:#fff; padding:40px; border-radius:8px; box-shadow:0 2px 4px rgba(0,0,0,0.1); }
     .file-name { margin-left:10px; }
     button { padding:8px 16px; margin-top:10px; }
+    table { border-collapse:collapse; width:100%; margin-top:20px; font-size:13px; }
+    th, td { border:1px solid #ddd; padding:4px 6px; text-align:left; }
+    tr.unknown { background:#f8d7da; }
   </style>
 </head>
 <body>
   <div class="container">
     <h1>Update MDB From Excel</h1>
     <form method="post" enctype="multipart/form-data">
-      <input id="mdb" type="file" name="mdb" accept=".mdb" style="display:none" />
+      <input id="mdb" type="file" name="mdb" accept=".mdb,.gz,.zip" style="display:none" />
       <button type="button" onclick="document.getElementById('mdb').click()">Select MDB</button>
       <span id="mdb-name" class="file-name"></span>
       <br/><br/>
-      <input id="excel" type="file" name="excel" accept=".xlsx" style="display:none" />
+      <input id="excel" type="file" name="excel" accept=".xlsx,.zip,.jsonl,.parquet" style="display:none" />
       <button type="button" onclick="document.getElementById('excel').click()">Select Excel</button>
       <span id="excel-name" class="file-name"></span>
       <br/><br/>
-      <button type="submit">Upload</button>
+      <button type="submit" name="action" value="update">Upload</button>
+      <button type="submit" name="action" value="preview">Preview Changes</button>
     </form>
     <script>
       const mdbInput = document.getElementById('mdb');
@@ -320,8 +2012,42 @@ IMPORT_TEMPLATE = """
     {% if message %}
     <p>{{ message }}</p>
     {% endif %}
-    {% if mdb_available %}
-    <p><a href="{{ url_for('download_updated_mdb') }}">Download Updated MDB</a></p>
+    {% if token %}
+    <p><a href="{{ url_for('download_updated_mdb', token=token) }}">Download Updated MDB</a>
+       (<a href="{{ url_for('download_updated_mdb', token=token, compress='gzip') }}">gzip</a>)</p>
+    {% endif %}
+    {% if diff %}
+    <p>
+      {% for sheet, count in diff.sheet_counts.items() %}{{ sheet }}: {{ count }}{% if not loop.last %}, {% endif %}{% endfor %}
+    </p>
+    <table>
+      <tr><th>Column</th><th>Changed Cells</th></tr>
+      {% for column, count in diff.column_counts.items() %}
+      <tr><td>{{ column }}</td><td>{{ count }}</td></tr>
+      {% endfor %}
+    </table>
+    {% if diff.unknown %}
+    <table>
+      <tr><th>Sheet</th><th>Row</th><th>ID</th><th>Tag</th><th>Error</th></tr>
+      {% for r in diff.unknown %}
+      <tr class="unknown"><td>{{ r.sheet }}</td><td>{{ r.row }}</td><td>{{ r.ID }}</td><td>{{ r.Tag }}</td><td>Unknown ID/Tag</td></tr>
+      {% endfor %}
+    </table>
+    {% endif %}
+    <table>
+      <tr><th>Sheet</th><th>Row</th><th>ID</th><th>Tag</th><th>Column</th><th>MDB Value</th><th>New Value</th></tr>
+      {% for r in diff.rows %}
+      {% for column, values in r.changes.items() %}
+      <tr>
+        <td>{{ r.sheet }}</td><td>{{ r.row }}</td><td>{{ r.ID }}</td><td>{{ r.Tag }}</td><td>{{ column }}</td>
+        <td>{{ values[0] if values[0] is not none else '' }}</td><td>{{ values[1] if values[1] is not none else '' }}</td>
+      </tr>
+      {% endfor %}
+      {% endfor %}
+    </table>
+    {% if diff.truncated %}
+    <p>Showing the first {{ diff.rows|length }} of {{ diff.updated_rows }} changed rows.</p>
+    {% endif %}
     {% endif %}
     <p><a href="{{ url_for('home') }}">Back to Home</a></p>
   </div>
@@ -369,11 +2095,20 @@ PLC_TEMPLATE = """
     <form method="post" action="{{ url_for('plc_tags') }}">
       <input type="hidden" name="ip" value="{{ request.form.get('ip', '') }}" />
       <input type="hidden" name="slot" value="{{ request.form.get('slot', '0') }}" />
+      <label>Scope:
+        <select name="scope">
+          {% for value, label in [('', 'All'), ('controller', 'Controller'), ('program', 'Program')] %}
+          <option value="{{ value }}" {% if request.form.get('scope', '') == value %}selected{% endif %}>{{ label }}</option>
+          {% endfor %}
+        </select>
+      </label>
+      <label>Program: <input type="text" name="program" value="{{ request.form.get('program', '') }}"/></label>
+      <label>Data Type: <input type="text" name="data_type" value="{{ request.form.get('data_type', '') }}"/></label>
       <button type="submit">Get Tag List</button>
     </form>
     {% endif %}
     {% if tags_available %}
-    <p><a href="{{ url_for('download_tags') }}">Download Tag CSV</a></p>
+    <p><a href="{{ url_for('download_tags', ip=request.form.get('ip', ''), slot=request.form.get('slot', '0'), **filters) }}">Download Tag CSV</a></p>
     {% endif %}
     <p><a href="{{ url_for('home') }}">Back to Home</a></p>
   </div>
@@ -381,108 +2116,730 @@ PLC_TEMPLATE = """
 </html>
 """
 
-app = Flask(__name__)
-app.config['EXCEL_PATH'] = None
-app.config['UPDATED_MDB_PATH'] = None
-app.config['TAG_CSV_PATH'] = None
-
-@app.route('/')
-def home():
-    """Landing page allowing navigation to export or import tools."""
-    return render_template_string(HOME_TEMPLATE)
-
-
-@app.route('/export', methods=['GET', 'POST'])
-def export_page():
-    message = None
-    excel_available = False
-
-    if request.method == 'POST':
-        file = request.files.get('file')
-        if file and file.filename:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mdb') as tmp:
-                file.save(tmp.name)
-                mdb_path = tmp.name
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as xlsx_tmp:
-                xlsx_path = xlsx_tmp.name
-
-            conn_str = (
-                r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-                f'DBQ={mdb_path};'
-            )
-
-            try:
-                conn = pyodbc.connect(conn_str, autocommit=True)
-                cursor = conn.cursor()
-                table_names = [row.table_name for row in cursor.tables(tableType='TABLE')]
+COMPARE_TEMPLATE = """
+<!doctype html>
+<html lang='en'>
+<head>
+  <meta charset='utf-8'>
+  <title>Compare MDB With PLC</title>
+  <style>
+    body { font-family: Arial, sans-serif; background:#f2f2f2; margin:40px; }
+    .container { max-width:1100px; margin:auto; background:#fff; padding:40px; border-radius:8px; box-shadow:0 2px 4px rgba(0,0,0,0.1); }
+    label { display:block; margin-top:10px; }
+    input { padding:6px; margin-left:10px; }
+    button { padding:8px 16px; margin-top:10px; }
+    table { border-collapse:collapse; width:100%; margin-top:20px; font-size:13px; }
+    th, td { border:1px solid #ddd; padding:4px 6px; text-align:left; }
+    tr.mismatch { background:#fff3cd; }
+    tr.missing, tr.error { background:#f8d7da; }
+  </style>
+</head>
+<body>
+  <div class="container">
+    <h1>Compare MDB With PLC</h1>
+    <form method="post" enctype="multipart/form-data">
+      <label>MDB File: <input type="file" name="mdb" accept=".mdb,.gz,.zip" /></label>
+      <label>IP Address: <input type="text" name="ip" value="{{ request.form.get('ip', '') }}"/></label>
+      <label>Slot: <input type="text" name="slot" value="{{ request.form.get('slot', '0') }}"/></label>
+      <button type="submit">Compare</button>
+    </form>
+    {% if message %}
+    <p>{{ message }}</p>
+    {% endif %}
+    {% if results %}
+    <p>
+      {% for status, count in summary.items() %}{{ status }}: {{ count }}{% if not loop.last %}, {% endif %}{% endfor %}
+    </p>
+    <table>
+      <tr>
+        <th>Tag</th><th>Sheet</th><th>Status</th><th>PLC Value</th>
+        {% for member in setpoint_members %}<th>{{ member }} MDB</th><th>{{ member }} PLC</th>{% endfor %}
+        <th>Error</th>
+      </tr>
+      {% for r in results %}
+      <tr class="{{ r.status }}">
+        <td>{{ r.tag }}</td><td>{{ r.sheet }}</td><td>{{ r.status }}</td><td>{{ r.value if r.value is not none else '' }}</td>
+        {% for member, mdb_value, plc_value, match in r.setpoints %}
+        <td>{{ mdb_value if mdb_value is not none else '' }}</td>
+        <td{% if match == false %} style="font-weight:bold"{% endif %}>{{ plc_value if plc_value is not none else '' }}</td>
+        {% endfor %}
+        <td>{{ r.error or '' }}</td>
+      </tr>
+      {% endfor %}
+    </table>
+    {% endif %}
+    <p><a href="{{ url_for('home') }}">Back to Home</a></p>
+  </div>
+</body>
+</html>
+"""
 
-                if 'Instruments' not in table_names:
-                    message = 'Uploaded file does not contain an Instruments table.'
-                else:
-                    count = export_instruments_to_excel(mdb_path, xlsx_path)
-                    app.config['EXCEL_PATH'] = xlsx_path
-                    excel_available = True
-                    message = f'MDB upload successful. Found {count} valid instruments.'
+RECONCILE_TEMPLATE = """
+<!doctype html>
+<html lang='en'>
+<head>
+  <meta charset='utf-8'>
+  <title>Reconcile MDB With PLC Tags</title>
+  <style>
+    body { font-family: Arial, sans-serif; background:#f2f2f2; margin:40px; }
+    .container { max-width:1100px; margin:auto; background:#fff; padding:40px; border-radius:8px; box-shadow:0 2px 4px rgba(0,0,0,0.1); }
+    label { display:block; margin-top:10px; }
+    input { padding:6px; margin-left:10px; }
+    button { padding:8px 16px; margin-top:10px; }
+    table { border-collapse:collapse; width:100%; margin-top:20px; font-size:13px; }
+    th, td { border:1px solid #ddd; padding:4px 6px; text-align:left; }
+    tr.type_mismatch, tr.duplicate, tr.ambiguous { background:#fff3cd; }
+    tr.missing { background:#f8d7da; }
+  </style>
+</head>
+<body>
+  <div class="container">
+    <h1>Reconcile MDB With PLC Tags</h1>
+    <form method="post" enctype="multipart/form-data">
+      <label>MDB File: <input type="file" name="mdb" accept=".mdb,.gz,.zip" /></label>
+      <label>IP Address: <input type="text" name="ip" value="{{ request.form.get('ip', '') }}"/></label>
+      <label>Slot: <input type="text" name="slot" value="{{ request.form.get('slot', '0') }}"/></label>
+      <p>Only controller tags matching these filters are reported as unused:</p>
+      <label>Scope:
+        <select name="scope">
+          {% for value, label in [('', 'All'), ('controller', 'Controller'), ('program', 'Program')] %}
+          <option value="{{ value }}" {% if request.form.get('scope', '') == value %}selected{% endif %}>{{ label }}</option>
+          {% endfor %}
+        </select>
+      </label>
+      <label>Program: <input type="text" name="program" value="{{ request.form.get('program', '') }}"/></label>
+      <label>Data Type: <input type="text" name="data_type" value="{{ request.form.get('data_type', '') }}"/></label>
+      <button type="submit" name="action" value="report">Reconcile</button>
+      <button type="submit" name="action" value="csv">Download CSV</button>
+    </form>
+    {% if message %}
+    <p>{{ message }}</p>
+    {% endif %}
+    {% if summary %}
+    <table>
+      <tr><th>Category</th><th>Description</th><th>Count</th></tr>
+      {% for category, description in categories.items() %}
+      <tr class="{{ category }}"><td>{{ category }}</td><td>{{ description }}</td><td>{{ summary.get(category, 0) }}</td></tr>
+      {% endfor %}
+    </table>
+    {% endif %}
+    {% if rows %}
+    <table>
+      <tr><th>Category</th><th>ID</th><th>Tag</th><th>Sheet</th><th>PLC Tag</th><th>Data Type</th><th>Detail</th></tr>
+      {% for r in rows %}
+      <tr class="{{ r.category }}">
+        <td>{{ r.category }}</td><td>{{ r.id if r.id is not none else '' }}</td><td>{{ r.tag or '' }}</td><td>{{ r.sheet or '' }}</td>
+        <td>{{ r.plc_tag or '' }}</td><td>{{ r.data_type or '' }}</td><td>{{ r.detail or '' }}</td>
+      </tr>
+      {% endfor %}
+    </table>
+    {% if truncated %}
+    <p>Only the first {{ rows|length }} mismatches are shown. Download the CSV for the full report.</p>
+    {% endif %}
+    {% endif %}
+    <p><a href="{{ url_for('home') }}">Back to Home</a></p>
+  </div>
+</body>
+</html>
+"""
 
-                conn.close()
-            except (pyodbc.Error, ValueError) as e:
+PUSH_TEMPLATE = """
+<!doctype html>
+<html lang='en'>
+<head>
+  <meta charset='utf-8'>
+  <title>Push Alarm Settings To PLC</title>
+  <style>
+    body { font-family: Arial, sans-serif; background:#f2f2f2; margin:40px; }
+    .container { max-width:1100px; margin:auto; background:#fff; padding:40px; border-radius:8px; box-shadow:0 2px 4px rgba(0,0,0,0.1); }
+    label { display:block; margin-top:10px; }
+    input { padding:6px; margin-left:10px; }
+    button { padding:8px 16px; margin-top:10px; }
+    table { border-collapse:collapse; width:100%; margin-top:20px; font-size:13px; }
+    th, td { border:1px solid #ddd; padding:4px 6px; text-align:left; }
+    tr.pending { background:#fff3cd; }
+    tr.written { background:#d4edda; }
+    tr.failed { background:#f8d7da; }
+  </style>
+</head>
+<body>
+  <div class="container">
+    <h1>Push Alarm Settings To PLC</h1>
+    <form method="post" enctype="multipart/form-data">
+      <label>MDB File: <input type="file" name="mdb" accept=".mdb,.gz,.zip" /></label>
+      <label>or Export File: <input type="file" name="export" accept=".xlsx,.zip,.jsonl,.parquet,.gz" /></label>
+      <label>IP Address: <input type="text" name="ip" value="{{ request.form.get('ip', '') }}"/></label>
+      <label>Slot: <input type="text" name="slot" value="{{ request.form.get('slot', '0') }}"/></label>
+      <button type="submit" name="action" value="preview">Preview Writes</button>
+      <button type="submit" name="action" value="push" onclick="return confirm('Write the alarm settings to the PLC?')">Write To PLC</button>
+    </form>
+    {% if message %}
+    <p>{{ message }}</p>
+    {% endif %}
+    {% if summary %}
+    <p>
+      {% for status, count in summary.items() %}{{ status }}: {{ count }}{% if not loop.last %}, {% endif %}{% endfor %}
+    </p>
+    {% endif %}
+    {% if rows %}
+    <table>
+      <tr><th>Tag</th><th>Member</th><th>Status</th><th>PLC Value</th><th>New Value</th><th>Error</th></tr>
+      {% for r in rows %}
+      <tr class="{{ r.status }}">
+        <td>{{ r.tag }}</td><td>{{ r.member or '' }}</td><td>{{ r.status }}</td>
+        <td>{{ r.old if r.old is not none else '' }}</td><td>{{ r.new if r.new is not none else '' }}</td><td>{{ r.error or '' }}</td>
+      </tr>
+      {% endfor %}
+    </table>
+    {% if truncated %}
+    <p>Only the first {{ rows|length }} rows are shown.</p>
+    {% endif %}
+    {% endif %}
+    <p><a href="{{ url_for('home') }}">Back to Home</a></p>
+  </div>
+</body>
+</html>
+"""
+
+WATCH_TEMPLATE = """
+<!doctype html>
+<html lang='en'>
+<head>
+  <meta charset='utf-8'>
+  <title>Watch PLC Tags</title>
+  <style>
+    body { font-family: Arial, sans-serif; background:#f2f2f2; margin:40px; }
+    .container { max-width:1100px; margin:auto; background:#fff; padding:40px; border-radius:8px; box-shadow:0 2px 4px rgba(0,0,0,0.1); }
+    label { display:block; margin-top:10px; }
+    input, textarea { padding:6px; margin-left:10px; }
+    button { padding:8px 16px; margin-top:10px; }
+    table { border-collapse:collapse; width:100%; margin-top:20px; font-size:13px; }
+    th, td { border:1px solid #ddd; padding:4px 6px; text-align:left; }
+    tr.error { background:#f8d7da; }
+  </style>
+</head>
+<body>
+  <div class="container">
+    <h1>Watch PLC Tags</h1>
+    <form method="get">
+      <label>IP Address: <input type="text" name="ip" value="{{ request.args.get('ip', '') }}"/></label>
+      <label>Slot: <input type="text" name="slot" value="{{ request.args.get('slot', '0') }}"/></label>
+      <label>Tags (one per line, at most {{ max_tags }}):<br/>
+        <textarea name="tags" rows="8" cols="60">{{ tags|join('\\n') }}</textarea>
+      </label>
+      <button type="submit">Watch</button>
+    </form>
+    {% if message %}
+    <p>{{ message }}</p>
+    {% endif %}
+    {% if events_url %}
+    <p id="status">Connecting...</p>
+    <table>
+      <tr><th>Tag</th><th>Value</th><th>Min</th><th>Max</th><th>Samples</th><th>Updated</th><th>Error</th></tr>
+      {% for tag in tags %}
+      <tr id="tag-{{ loop.index0 }}"><td>{{ tag }}</td><td></td><td></td><td></td><td></td><td></td><td></td></tr>
+      {% endfor %}
+    </table>
+    <script>
+      const tags = {{ tags|tojson }};
+      const history = {{ history }};
+      const samples = Object.fromEntries(tags.map(tag => [tag, []]));
+      function show(tag) {
+        const rows = samples[tag];
+        const cells = document.getElementById('tag-' + tags.indexOf(tag)).cells;
+        const numbers = rows.map(s => s[1]).filter(v => typeof v === 'number');
+        const last = rows[rows.length - 1];
+        if (!last) return;
+        cells[1].textContent = JSON.stringify(last[1]);
+        cells[2].textContent = numbers.length ? Math.min(...numbers) : '';
+        cells[3].textContent = numbers.length ? Math.max(...numbers) : '';
+        cells[4].textContent = rows.length;
+        cells[5].textContent = new Date(last[0] * 1000).toLocaleTimeString();
+        cells[6].textContent = last[2] || '';
+        cells[0].parentElement.className = last[2] ? 'error' : '';
+      }
+      function add(tag, sample) {
+        samples[tag].push(sample);
+        if (samples[tag].length > history) samples[tag].shift();
+      }
+      const source = new EventSource({{ events_url|tojson }});
+      source.addEventListener('history', event => {
+        const data = JSON.parse(event.data);
+        for (const tag of tags) { samples[tag] = data[tag] || []; show(tag); }
+        document.getElementById('status').textContent = 'Watching.';
+      });
+      source.addEventListener('sample', event => {
+        const data = JSON.parse(event.data);
+        for (const tag in data) { add(tag, data[tag]); show(tag); }
+      });
+      source.onerror = () => { document.getElementById('status').textContent = 'Disconnected, retrying...'; };
+    </script>
+    {% endif %}
+    <p><a href="{{ url_for('home') }}">Back to Home</a></p>
+  </div>
+</body>
+</html>
+"""
+
+SCAN_TEMPLATE = """
+<!doctype html>
+<html lang='en'>
+<head>
+  <meta charset='utf-8'>
+  <title>Scan Controllers</title>
+  <style>
+    body { font-family: Arial, sans-serif; background:#f2f2f2; margin:40px; }
+    .container { max-width:1100px; margin:auto; background:#fff; padding:40px; border-radius:8px; box-shadow:0 2px 4px rgba(0,0,0,0.1); }
+    label { display:block; margin-top:10px; }
+    input { padding:6px; margin-left:10px; }
+    textarea { width:100%; height:80px; margin-top:6px; }
+    button { padding:8px 16px; margin-top:10px; }
+    table { border-collapse:collapse; width:100%; margin-top:20px; font-size:13px; }
+    th, td { border:1px solid #ddd; padding:4px 6px; text-align:left; }
+    tr.error, tr.timeout { background:#f8d7da; }
+  </style>
+</head>
+<body>
+  <div class="container">
+    <h1>Scan Controllers</h1>
+    <form method="post">
+      <label>Targets (one per line, e.g. 10.0.0.5/1 or 10.0.0.10-20):
+        <textarea name="targets">{{ request.form.get('targets', '') }}</textarea></label>
+      <label>Default Slot: <input type="text" name="slot" value="{{ request.form.get('slot', '0') }}"/></label>
+      <label>Concurrency: <input type="text" name="concurrency" value="{{ request.form.get('concurrency', config['SCAN_CONCURRENCY']) }}"/></label>
+      <label>Timeout (s): <input type="text" name="timeout" value="{{ request.form.get('timeout', config['SCAN_TIMEOUT']) }}"/></label>
+      <label><input type="checkbox" name="tags" value="1" {% if request.form.get('tags') %}checked{% endif %}/> Include tag list</label>
+      <button type="submit">Scan</button>
+    </form>
+    {% if message %}
+    <p>{{ message }}</p>
+    {% endif %}
+    {% if results %}
+    <p><a href="{{ url_for('download_scan', token=token) }}">Download Results CSV</a>
+    {% if include_tags %} | <a href="{{ url_for('download_scan_tags', token=token) }}">Download Combined Tag CSV</a>{% endif %}</p>
+    <table>
+      <tr>
+        <th>Target</th><th>Status</th><th>Time (s)</th>
+        {% for field in fields %}<th>{{ field }}</th>{% endfor %}
+        <th>Tags</th><th>Error</th>
+      </tr>
+      {% for r in results %}
+      <tr class="{{ r.status }}">
+        <td>{{ r.target }}</td><td>{{ r.status }}</td><td>{{ r.elapsed }}</td>
+        {% for field in fields %}<td>{{ r[field] if r[field] is not none else '' }}</td>{% endfor %}
+        <td>{{ r.tag_count if r.tag_count is not none else '' }}</td><td>{{ r.error or '' }}</td>
+      </tr>
+      {% endfor %}
+    </table>
+    {% endif %}
+    <p><a href="{{ url_for('home') }}">Back to Home</a></p>
+  </div>
+</body>
+</html>
+"""
+
+app = Flask(__name__)
+# Exports, updated MDBs and scan results waiting to be downloaded. Every
+# worker process must see the same directory.
+app.config['ARTIFACT_DIR'] = os.path.join(tempfile.gettempdir(), 'plcpoke-artifacts')
+app.config['ARTIFACT_MAX_BYTES'] = 4 * 1024 * 1024 * 1024
+app.config['ARTIFACT_TTL'] = 3600
+app.config['STREAMING_EXPORT'] = True
+app.config['DATABASE_BACKEND'] = 'access'
+app.config['REQUEST_LOG'] = False
+app.config['DIFF_PREVIEW_ROWS'] = 500
+# Commit imports every this many changed rows instead of in one transaction.
+app.config['IMPORT_CHUNK_SIZE'] = None
+app.config['RECONCILE_PREVIEW_ROWS'] = 500
+app.config['PUSH_REPORT_ROWS'] = 2000
+app.config['JOB_WORKERS'] = 2
+app.config['JOB_QUEUE_LIMIT'] = 10
+app.config['JOB_RESULT_TTL'] = 3600
+app.config['RESULT_CACHE_DIR'] = os.path.join(tempfile.gettempdir(), 'plcpoke-cache')
+app.config['RESULT_CACHE_MAX_BYTES'] = 512 * 1024 * 1024
+app.config['RESULT_CACHE_TTL'] = 6 * 3600
+app.config['SNAPSHOT_DIR'] = os.path.join(tempfile.gettempdir(), 'plcpoke-snapshots')
+app.config['SNAPSHOT_MAX_BYTES'] = 256 * 1024 * 1024
+app.config['SNAPSHOT_TTL'] = 30 * 24 * 3600
+app.config['PLC_MAX_SESSIONS'] = 8
+app.config['PLC_IDLE_TIMEOUT'] = 300
+app.config['PLC_HEALTH_CHECK_INTERVAL'] = 30
+app.config['PLC_READ_BATCH_SIZE'] = 500
+app.config['PLC_TAG_CACHE_DIR'] = os.path.join(tempfile.gettempdir(), 'plcpoke-tags')
+app.config['PLC_TAG_CACHE_MAX_BYTES'] = 512 * 1024 * 1024
+app.config['PLC_TAG_CACHE_TTL'] = 30 * 24 * 3600
+app.config['POLL_INTERVAL'] = 1.0
+app.config['POLL_HISTORY'] = 600
+app.config['POLL_MAX_TAGS'] = 200
+app.config['POLL_WORKERS'] = 8
+app.config['SCAN_CONCURRENCY'] = 16
+app.config['SCAN_TIMEOUT'] = 10
+app.config['SCAN_MAX_TARGETS'] = 1024
+app.config['INSTRUMENT_STORE_MAX_BYTES'] = 512 * 1024 * 1024
+app.config['INSTRUMENT_QUERY_LIMIT'] = 100
+app.config['INSTRUMENT_QUERY_MAX_LIMIT'] = 5000
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Return the job manager, creating it from the app config on first use."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager(
+                app.config['JOB_WORKERS'],
+                app.config['JOB_QUEUE_LIMIT'],
+                app.config['JOB_RESULT_TTL'],
+                get_artifact_store(),
+            )
+        return _job_manager
+
+
+_result_cache = None
+
+
+def get_result_cache() -> ResultCache:
+    """Return the export result cache configured in the app config."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            app.config['RESULT_CACHE_DIR'],
+            app.config['RESULT_CACHE_MAX_BYTES'],
+            app.config['RESULT_CACHE_TTL'],
+        )
+    return _result_cache
+
+
+_artifact_store = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Return the store of results waiting to be downloaded."""
+    global _artifact_store
+    if _artifact_store is None:
+        _artifact_store = ArtifactStore(ResultCache(
+            app.config['ARTIFACT_DIR'],
+            app.config['ARTIFACT_MAX_BYTES'],
+            app.config['ARTIFACT_TTL'],
+        ))
+    return _artifact_store
+
+
+_snapshot_store = None
+
+
+def get_snapshot_store() -> ResultCache:
+    """Return the store of export snapshots used for delta exports."""
+    global _snapshot_store
+    if _snapshot_store is None:
+        _snapshot_store = ResultCache(
+            app.config['SNAPSHOT_DIR'],
+            app.config['SNAPSHOT_MAX_BYTES'],
+            app.config['SNAPSHOT_TTL'],
+        )
+    return _snapshot_store
+
+
+_instrument_store = None
+_instrument_store_lock = threading.Lock()
+
+
+def get_instrument_store() -> InstrumentStore:
+    """Return the in-memory store of instrument tables for the query API."""
+    global _instrument_store
+    with _instrument_store_lock:
+        if _instrument_store is None:
+            _instrument_store = InstrumentStore(app.config['INSTRUMENT_STORE_MAX_BYTES'])
+        return _instrument_store
+
+
+_tag_cache = None
+
+
+def get_tag_cache() -> TagDefinitionCache | None:
+    """Return the tag definition cache, or ``None`` if ``PLC_TAG_CACHE_DIR`` is unset."""
+    global _tag_cache
+    if _tag_cache is None and app.config['PLC_TAG_CACHE_DIR']:
+        _tag_cache = TagDefinitionCache(ResultCache(
+            app.config['PLC_TAG_CACHE_DIR'],
+            app.config['PLC_TAG_CACHE_MAX_BYTES'],
+            app.config['PLC_TAG_CACHE_TTL'],
+        ))
+    return _tag_cache
+
+
+_plc_pool = None
+_plc_pool_lock = threading.Lock()
+
+
+def get_plc_pool() -> PlcSessionPool:
+    """Return the shared PLC session pool, creating it on first use."""
+    global _plc_pool
+    with _plc_pool_lock:
+        if _plc_pool is None:
+            _plc_pool = PlcSessionPool(
+                app.config['PLC_MAX_SESSIONS'],
+                app.config['PLC_IDLE_TIMEOUT'],
+                app.config['PLC_HEALTH_CHECK_INTERVAL'],
+                tag_cache=get_tag_cache(),
+            )
+            atexit.register(_plc_pool.close_all)
+        return _plc_pool
+
+
+_tag_poller = None
+_tag_poller_lock = threading.Lock()
+
+
+def get_tag_poller() -> TagPoller:
+    """Return the shared live tag poller, creating it on first use."""
+    global _tag_poller
+    with _tag_poller_lock:
+        if _tag_poller is None:
+            _tag_poller = TagPoller(
+                get_plc_pool(),
+                app.config['POLL_INTERVAL'],
+                app.config['POLL_HISTORY'],
+                app.config['PLC_READ_BATCH_SIZE'],
+                app.config['POLL_WORKERS'],
+            )
+            atexit.register(_tag_poller.close)
+        return _tag_poller
+
+
+def _request_timer(pipeline: str) -> StageTimer:
+    """Return a :class:`StageTimer` that is also listed in the request log."""
+    timer = StageTimer(pipeline)
+    g.setdefault('stage_timers', []).append(timer)
+    return timer
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    """Count the request in the metrics and optionally log it as JSON.
+
+    With ``REQUEST_LOG`` set, one ``request`` line per request is logged with
+    its status, duration, body sizes and the stages timed while handling it.
+    """
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.inc(
+        'plcpoke_http_requests_total',
+        method=request.method,
+        endpoint=endpoint,
+        status=response.status_code,
+    )
+    metrics.observe('plcpoke_http_request_seconds', elapsed, method=request.method, endpoint=endpoint)
+    # Generated responses have no length; they count their own bytes.
+    if response.content_length:
+        metrics.inc('plcpoke_bytes_total', response.content_length, direction='download')
+
+    if app.config['REQUEST_LOG']:
+        logger.info('request %s', json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'seconds': round(elapsed, 4),
+            'bytes_in': request.content_length or 0,
+            'bytes_out': response.content_length,
+            'pipelines': [timer.to_dict() for timer in g.get('stage_timers', [])],
+        }))
+    return response
+
+
+@app.route('/metrics')
+def metrics_page():
+    """Expose the counters and timings in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/')
+def home():
+    """Landing page allowing navigation to export or import tools."""
+    return render_template_string(HOME_TEMPLATE)
+
+
+@app.route('/export', methods=['GET', 'POST'])
+def export_page():
+    message = None
+    token = None
+
+    if request.method == 'POST':
+        file = request.files.get('file')
+        fmt = request.form.get('format', 'xlsx')
+        since = request.form.get('since') or None
+        if fmt not in EXPORT_FORMATS:
+            message = f'Unknown export format {fmt}'
+        elif file and file.filename:
+            try:
+                mdb_path, digest = save_upload(file, '.mdb')
+            except ValueError as e:
+                return render_template_string(
+                    EXPORT_TEMPLATE,
+                    message=f'Error reading upload: {e}',
+                    token=None,
+                    snapshots=_snapshot_choices(),
+                )
+
+            try:
+                with open_database(mdb_path, app.config['DATABASE_BACKEND']) as db:
+                    with _request_timer('export') as timer:
+                        xlsx_path, meta = export_cached(
+                            mdb_path,
+                            digest,
+                            get_result_cache(),
+                            fmt=fmt,
+                            snapshots=get_snapshot_store(),
+                            since=since,
+                            label=file.filename,
+                            streaming=app.config['STREAMING_EXPORT'],
+                            db=db,
+                            progress=timer,
+                        )
+                token = get_artifact_store().new_token()
+                get_artifact_store().put_data(token, 'export', {
+                    'name': os.path.basename(xlsx_path),
+                    'etag': f'{digest}-{since}-{fmt}' if since else f'{digest}-{fmt}',
+                })
+                message = f'MDB upload successful. {_export_message(meta)}'
+            except MissingInstrumentsTable:
+                message = 'Uploaded file does not contain an Instruments table.'
+            except DATABASE_ERRORS + INVALID_FILE_ERRORS as e:
                 message = f'Error accessing MDB file: {e}'
-                try:
-                    os.remove(xlsx_path)
-                except Exception:
-                    pass
             finally:
                 os.remove(mdb_path)
 
     return render_template_string(
         EXPORT_TEMPLATE,
         message=message,
-        excel_available=excel_available,
+        token=token,
+        download_label=_export_download_label(fmt if token else None),
+        snapshots=_snapshot_choices(),
     )
 
 
+def _export_message(meta: dict) -> str:
+    """Summarise the metadata returned by :func:`export_cached`."""
+    if 'added' not in meta:
+        return f"Found {meta['count']} valid instruments."
+    return (
+        f"Found {meta['count']} instruments changed since the snapshot: "
+        f"{meta['added']} added, {meta['changed']} changed, {meta['removed']} removed."
+    )
+
+
+def _snapshot_choices() -> list:
+    """Return ``(digest, description)`` for the stored export snapshots."""
+    choices = []
+    for name, meta in get_snapshot_store().entries('.snapshot'):
+        created = time.strftime('%Y-%m-%d %H:%M', time.localtime(meta['created']))
+        choices.append((
+            name[:-len('.snapshot')],
+            f"{meta.get('label') or 'export'} ({created}, {meta['count']} instruments)",
+        ))
+    return choices
+
+
+def _export_download_label(fmt: str | None) -> str:
+    """Describe an export format for the download link."""
+    if not fmt:
+        return 'Excel'
+    return {'xlsx': 'Excel', 'csv': 'CSV', 'jsonl': 'JSON Lines', 'parquet': 'Parquet'}[fmt]
+
+
 @app.route('/download_excel')
 def download_excel():
-    """Send the exported instruments Excel file to the client."""
-    xlsx_path = app.config.get('EXCEL_PATH')
-    if not xlsx_path or not os.path.exists(xlsx_path):
-        return "No Excel file available", 404
-
-    @after_this_request
-    def remove_file(response):
-        try:
-            os.remove(xlsx_path)
-        except Exception:
-            pass
-        app.config['EXCEL_PATH'] = None
-        return response
+    """Send the exported instruments file named by ``?token=`` to the client.
 
-    return send_file(xlsx_path, as_attachment=True, download_name='instruments.xlsx')
+    The file stays in the result cache, so it can be downloaded again.
+    Requests carrying a matching ``If-None-Match`` header get a 304 and
+    ``Range`` requests are answered with partial content. Add
+    ``?compress=gzip`` to receive it gzip-compressed instead.
+    """
+    export = get_artifact_store().get_data(request.args.get('token'), 'export')
+    hit = get_result_cache().get(export['name']) if export else None
+    if hit is None:
+        return "No Excel file available", 404
+    xlsx_path = hit[0]
+
+    download_name = 'instruments' + EXPORT_FORMATS[instrument_file_format(xlsx_path)]
+    if request.args.get('compress') == 'gzip':
+        return gzip_file_response(xlsx_path, download_name)
+
+    return send_file(
+        xlsx_path,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=export['etag'],
+    )
 
 
 @app.route('/import', methods=['GET', 'POST'])
 def import_excel():
+    """Update an MDB from an export, or preview the changes with ``action=preview``.
+
+    The comparison is cached by the digests of both uploads, so applying the
+    files after previewing them does not compare them again.
+    """
     message = None
-    mdb_available = False
+    token = None
+    diff = None
 
     if request.method == 'POST':
         mdb_file = request.files.get('mdb')
         excel_file = request.files.get('excel')
+        preview = request.form.get('action') == 'preview'
         if mdb_file and excel_file and mdb_file.filename and excel_file.filename:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mdb') as mdb_tmp:
-                mdb_file.save(mdb_tmp.name)
-                mdb_path = mdb_tmp.name
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as xls_tmp:
-                excel_file.save(xls_tmp.name)
-                xlsx_path = xls_tmp.name
+            try:
+                mdb_path, xlsx_path, mdb_digest, xlsx_digest, fmt = _save_import_uploads(
+                    mdb_file, excel_file
+                )
+            except ValueError as e:
+                return render_template_string(
+                    IMPORT_TEMPLATE,
+                    message=f'Error reading upload: {e}',
+                    token=None,
+                )
 
             try:
-                updated = update_instruments_from_excel(mdb_path, xlsx_path)
-                app.config['UPDATED_MDB_PATH'] = mdb_path
-                mdb_available = True
-                message = f'MDB updated successfully. {updated} rows modified.'
+                with open_database(mdb_path, app.config['DATABASE_BACKEND']) as db:
+                    with _request_timer('diff') as timer:
+                        diff = diff_cached(
+                            mdb_path,
+                            mdb_digest,
+                            xlsx_path,
+                            xlsx_digest,
+                            get_result_cache(),
+                            db=db,
+                            fmt=fmt,
+                            progress=timer,
+                        )
+                    if not preview:
+                        with _request_timer('import') as timer:
+                            updated = apply_instrument_diff(
+                                mdb_path,
+                                diff,
+                                db=db,
+                                progress=timer,
+                                chunk_size=app.config['IMPORT_CHUNK_SIZE'],
+                            )
+                if preview:
+                    message = f'{diff.updated_rows} rows would be modified.'
+                    os.remove(mdb_path)
+                else:
+                    diff = None
+                    token = get_artifact_store().new_token()
+                    get_artifact_store().put_file(token, 'mdb', mdb_path)
+                    message = f'MDB updated successfully. {updated} rows modified.'
             except Exception as e:
                 message = f'Error updating MDB: {e}'
                 os.remove(mdb_path)
@@ -494,24 +2851,91 @@ def import_excel():
     return render_template_string(
         IMPORT_TEMPLATE,
         message=message,
-        mdb_available=mdb_available,
+        token=token,
+        diff=diff.to_dict(app.config['DIFF_PREVIEW_ROWS']) if diff else None,
     )
 
 
+@app.route('/import/diff', methods=['POST'])
+def import_diff():
+    """Return the changes an import would make as JSON, without applying them.
+
+    Takes the same ``mdb`` and ``excel`` uploads as ``/import``. At most
+    ``?limit=`` changed rows are listed (all of them by default).
+    """
+    mdb_file = request.files.get('mdb')
+    excel_file = request.files.get('excel')
+    if not (mdb_file and excel_file and mdb_file.filename and excel_file.filename):
+        return jsonify(error='Both MDB and Excel files are required.'), 400
+    limit = request.args.get('limit', type=int)
+
+    try:
+        mdb_path, xlsx_path, mdb_digest, xlsx_digest, fmt = _save_import_uploads(mdb_file, excel_file)
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+
+    try:
+        with open_database(mdb_path, app.config['DATABASE_BACKEND']) as db:
+            with _request_timer('diff') as timer:
+                diff = diff_cached(
+                    mdb_path,
+                    mdb_digest,
+                    xlsx_path,
+                    xlsx_digest,
+                    get_result_cache(),
+                    db=db,
+                    fmt=fmt,
+                    progress=timer,
+                )
+    except DATABASE_ERRORS + INVALID_FILE_ERRORS as exc:
+        return jsonify(error=str(exc)), 400
+    finally:
+        os.remove(mdb_path)
+        os.remove(xlsx_path)
+    return jsonify(diff.to_dict(limit))
+
+
+def _save_import_uploads(mdb_file, excel_file) -> tuple[str, str, str, str, str]:
+    """Save the two uploads of an import.
+
+    Returns ``(mdb path, import path, mdb digest, import digest, format)``.
+    Raises ``ValueError`` for an unsupported import file or a bad upload.
+    """
+    fmt = upload_file_format(excel_file.filename)
+    mdb_path, mdb_digest = save_upload(mdb_file, '.mdb')
+    try:
+        xlsx_path, xlsx_digest = save_upload(excel_file, EXPORT_FORMATS[fmt])
+    except Exception:
+        os.remove(mdb_path)
+        raise
+    return mdb_path, xlsx_path, mdb_digest, xlsx_digest, fmt
+
+
 @app.route('/download_updated_mdb')
 def download_updated_mdb():
-    """Allow the user to download the updated MDB file."""
-    mdb_path = app.config.get('UPDATED_MDB_PATH')
-    if not mdb_path or not os.path.exists(mdb_path):
+    """Allow the user to download the updated MDB file named by ``?token=``.
+
+    The file is removed once it has been sent. Add ``?compress=gzip`` to
+    receive it gzip-compressed.
+    """
+    token = request.args.get('token')
+    hit = get_artifact_store().get_file(token, 'mdb')
+    if hit is None:
         return "No MDB file available", 404
+    mdb_path = hit[0]
+
+    def remove_file():
+        get_artifact_store().remove(token, 'mdb')
+
+    if request.args.get('compress') == 'gzip':
+        response = gzip_file_response(mdb_path, 'updated.mdb')
+        # The file is still being read while the response streams.
+        response.call_on_close(remove_file)
+        return response
 
     @after_this_request
-    def remove_file(response):
-        try:
-            os.remove(mdb_path)
-        except Exception:
-            pass
-        app.config['UPDATED_MDB_PATH'] = None
+    def remove_after_send(response):
+        remove_file()
         return response
 
     return send_file(mdb_path, as_attachment=True, download_name='updated.mdb')
@@ -519,48 +2943,24 @@ def download_updated_mdb():
 
 @app.route('/plc/tags', methods=['POST'])
 def plc_tags():
-    """Retrieve tag list from the PLC and store as CSV."""
+    """Count the PLC's tags matching the chosen filters and offer them as CSV."""
     info = None
     message = None
     tags_available = False
+    filters = _tag_filters(request.form)
 
     ip = request.form.get('ip', '').strip()
     slot = request.form.get('slot', '0').strip()
     if ip:
         path = f"{ip}/{slot}" if slot else ip
         try:
-            with LogixDriver(path) as plc:
+            with get_plc_pool().session(path) as plc:
                 plc.get_plc_info()
-                info = {k: plc.info.get(k) for k in (
-                    'vendor',
-                    'product_type',
-                    'product_code',
-                    'revision',
-                    'serial',
-                    'product_name',
-                    'keyswitch',
-                    'name',
-                )}
-
-                tags = plc.get_tag_list()
-
-            # open temporary CSV in text mode so csv module can write strings
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.csv', mode='w', newline='') as tmp:
-                if tags:
-                    fieldnames = sorted(tags[0].keys())
-                    writer = csv.DictWriter(tmp, fieldnames=fieldnames)
-                    writer.writeheader()
-                    for t in tags:
-                        writer.writerow({k: t.get(k, '') for k in fieldnames})
-                else:
-                    writer = csv.writer(tmp)
-                    writer.writerow(['No tags found'])
+                info = {k: plc.info.get(k) for k in PLC_INFO_FIELDS}
+                count = sum(1 for _ in filter_tags(plc.tags.values(), **filters))
 
-                csv_path = tmp.name
-
-            app.config['TAG_CSV_PATH'] = csv_path
             tags_available = True
-            message = f'Tag list retrieved ({len(tags)} tags).'
+            message = f'Tag list retrieved ({count} tags).'
         except Exception as exc:
             message = f'Error retrieving tag list: {exc}'
     else:
@@ -571,26 +2971,32 @@ def plc_tags():
         info=info,
         message=message,
         tags_available=tags_available,
+        filters=filters,
     )
 
 
 @app.route('/download_tags')
 def download_tags():
-    """Allow the user to download the generated tag CSV file."""
-    csv_path = app.config.get('TAG_CSV_PATH')
-    if not csv_path or not os.path.exists(csv_path):
-        return "No tag CSV available", 404
+    """Stream the PLC's tag list as CSV, filtered by the query parameters.
 
-    @after_this_request
-    def remove_file(response):
-        try:
-            os.remove(csv_path)
-        except Exception:
-            pass
-        app.config['TAG_CSV_PATH'] = None
-        return response
+    Takes ``ip`` and ``slot`` plus the optional ``program``, ``scope`` and
+    ``data_type`` filters accepted by :func:`filter_tags`. The tag
+    definitions come from the pooled session, so nothing is uploaded again.
+    """
+    ip = request.args.get('ip', '').strip()
+    slot = request.args.get('slot', '0').strip()
+    if not ip:
+        return "IP address is required", 400
+    path = f"{ip}/{slot}" if slot else ip
+
+    try:
+        with get_plc_pool().session(path) as plc:
+            tags = plc.tags
+    except Exception as exc:
+        return f"Error retrieving tag list: {exc}", 502
 
-    return send_file(csv_path, as_attachment=True, download_name='tags.csv')
+    rows = (tag_csv_row(tag) for tag in filter_tags(tags.values(), **_tag_filters(request.args)))
+    return csv_response(TAG_CSV_COLUMNS, rows, 'tags.csv')
 
 
 @app.route('/plc', methods=['GET', 'POST'])
@@ -606,18 +3012,9 @@ def plc_page():
         if ip:
             path = f"{ip}/{slot}" if slot else ip
             try:
-                with LogixDriver(path) as plc:
+                with get_plc_pool().session(path) as plc:
                     plc.get_plc_info()
-                    info = {k: plc.info.get(k) for k in (
-                        'vendor',
-                        'product_type',
-                        'product_code',
-                        'revision',
-                        'serial',
-                        'product_name',
-                        'keyswitch',
-                        'name',
-                    )}
+                    info = {k: plc.info.get(k) for k in PLC_INFO_FIELDS}
             except Exception as exc:
                 message = f'Error connecting to PLC: {exc}'
         else:
@@ -630,5 +3027,532 @@ def plc_page():
         tags_available=tags_available,
     )
 
+
+@app.route('/plc/compare', methods=['GET', 'POST'])
+def plc_compare():
+    """Compare the alarm setpoints in an MDB with the values in a PLC."""
+    message = None
+    results = None
+    summary = {}
+
+    if request.method == 'POST':
+        mdb_file = request.files.get('mdb')
+        ip = request.form.get('ip', '').strip()
+        slot = request.form.get('slot', '0').strip()
+        if not (mdb_file and mdb_file.filename and ip):
+            message = 'An MDB file and an IP address are required.'
+        else:
+            path = f"{ip}/{slot}" if slot else ip
+            try:
+                mdb_path, _ = save_upload(mdb_file, '.mdb')
+                try:
+                    with open_database(mdb_path, app.config['DATABASE_BACKEND']) as db:
+                        instruments = read_instrument_setpoints(mdb_path, db=db)
+                finally:
+                    os.remove(mdb_path)
+                start = time.perf_counter()
+                with get_plc_pool().session(path) as plc:
+                    results = compare_setpoints_with_plc(
+                        plc,
+                        instruments,
+                        app.config['PLC_READ_BATCH_SIZE'],
+                    )
+                elapsed = time.perf_counter() - start
+                for result in results:
+                    summary[result['status']] = summary.get(result['status'], 0) + 1
+                message = f'Compared {len(results)} instruments in {elapsed:.1f}s.'
+            except Exception as exc:
+                message = f'Error comparing MDB with PLC: {exc}'
+
+    return render_template_string(
+        COMPARE_TEMPLATE,
+        message=message,
+        results=results,
+        summary=summary,
+        setpoint_members=SETPOINT_MEMBERS,
+    )
+
+
+@app.route('/plc/reconcile', methods=['GET', 'POST'])
+def plc_reconcile():
+    """Reconcile the instrument tags in an MDB with a PLC's tag list.
+
+    With ``action=csv`` the full report is downloaded as CSV; otherwise the
+    page shows a count per category and the first ``RECONCILE_PREVIEW_ROWS``
+    mismatches.
+    """
+    message = None
+    summary = {}
+    rows = []
+    truncated = False
+
+    if request.method == 'POST':
+        mdb_file = request.files.get('mdb')
+        ip = request.form.get('ip', '').strip()
+        slot = request.form.get('slot', '0').strip()
+        if not (mdb_file and mdb_file.filename and ip):
+            message = 'An MDB file and an IP address are required.'
+        else:
+            path = f"{ip}/{slot}" if slot else ip
+            try:
+                mdb_path, _ = save_upload(mdb_file, '.mdb')
+                try:
+                    with open_database(mdb_path, app.config['DATABASE_BACKEND']) as db:
+                        instruments = read_instrument_setpoints(mdb_path, db=db)
+                finally:
+                    os.remove(mdb_path)
+                with get_plc_pool().session(path) as plc:
+                    tags = plc.tags
+                start = time.perf_counter()
+                report = reconcile_instruments_with_tags(
+                    instruments, tags.values(), _tag_filters(request.form)
+                )
+                if request.form.get('action') == 'csv':
+                    return csv_response(
+                        RECONCILE_CSV_COLUMNS,
+                        ([row[column] for column in RECONCILE_CSV_COLUMNS] for row in report),
+                        'reconcile.csv',
+                    )
+                limit = app.config['RECONCILE_PREVIEW_ROWS']
+                for row in report:
+                    summary[row['category']] = summary.get(row['category'], 0) + 1
+                    if row['category'] == 'ok':
+                        continue
+                    if len(rows) < limit:
+                        rows.append(row)
+                    else:
+                        truncated = True
+                elapsed = time.perf_counter() - start
+                message = (
+                    f'Reconciled {len(instruments)} instruments with {len(tags)} '
+                    f'controller tags in {elapsed:.1f}s.'
+                )
+            except Exception as exc:
+                message = f'Error reconciling MDB with PLC: {exc}'
+
+    return render_template_string(
+        RECONCILE_TEMPLATE,
+        message=message,
+        summary=summary,
+        rows=rows,
+        truncated=truncated,
+        categories=RECONCILE_CATEGORIES,
+    )
+
+
+@app.route('/plc/push', methods=['GET', 'POST'])
+def plc_push():
+    """Write the alarm settings from an MDB or an export file to a PLC.
+
+    ``action=preview`` (the default) only reads the PLC and lists the writes
+    that would be made; ``action=push`` makes them. The rows reported are
+    those with something to write or a problem, up to ``PUSH_REPORT_ROWS``.
+    """
+    message = None
+    summary = {}
+    rows = []
+    truncated = False
+
+    if request.method == 'POST':
+        mdb_file = request.files.get('mdb')
+        export_file = request.files.get('export')
+        ip = request.form.get('ip', '').strip()
+        slot = request.form.get('slot', '0').strip()
+        dry_run = request.form.get('action') != 'push'
+        has_mdb = bool(mdb_file and mdb_file.filename)
+        has_export = bool(export_file and export_file.filename)
+        if has_mdb == has_export or not ip:
+            message = 'Either an MDB file or an export file, and an IP address, are required.'
+        else:
+            path = f"{ip}/{slot}" if slot else ip
+            try:
+                if has_mdb:
+                    source_path, _ = save_upload(mdb_file, '.mdb')
+                else:
+                    fmt = upload_file_format(export_file.filename)
+                    source_path, _ = save_upload(export_file, EXPORT_FORMATS[fmt])
+                try:
+                    if has_mdb:
+                        with open_database(source_path, app.config['DATABASE_BACKEND']) as db:
+                            instruments = read_instrument_setpoints(source_path, db=db, members=ALARM_MEMBERS)
+                    else:
+                        instruments = read_file_setpoints(source_path, fmt, members=ALARM_MEMBERS)
+                finally:
+                    os.remove(source_path)
+                start = time.perf_counter()
+                with get_plc_pool().session(path) as plc:
+                    results = push_alarm_settings(
+                        plc,
+                        instruments,
+                        app.config['PLC_READ_BATCH_SIZE'],
+                        dry_run=dry_run,
+                    )
+                elapsed = time.perf_counter() - start
+                limit = app.config['PUSH_REPORT_ROWS']
+                for result in results:
+                    summary[result['status']] = summary.get(result['status'], 0) + 1
+                    if result['status'] == 'unchanged':
+                        continue
+                    if len(rows) < limit:
+                        rows.append(result)
+                    else:
+                        truncated = True
+                if dry_run:
+                    message = f"{summary.get('pending', 0)} values would be written ({elapsed:.1f}s)."
+                else:
+                    message = f"{summary.get('written', 0)} values written ({elapsed:.1f}s)."
+            except Exception as exc:
+                message = f'Error pushing alarm settings: {exc}'
+
+    return render_template_string(
+        PUSH_TEMPLATE,
+        message=message,
+        summary=summary,
+        rows=rows,
+        truncated=truncated,
+    )
+
+
+def _watch_tags(text: str) -> list:
+    """Split a list of tag names on newlines and commas, dropping repeats."""
+    return list(dict.fromkeys(t.strip() for t in re.split(r'[,\n]', text) if t.strip()))
+
+
+def _watch_request(values) -> tuple[str | None, list, str | None]:
+    """Read ``(CIP path, tags, error message)`` for the tag watch routes."""
+    ip = values.get('ip', '').strip()
+    slot = values.get('slot', '0').strip()
+    tags = _watch_tags(values.get('tags', ''))
+    if not ip:
+        return None, tags, 'IP address is required.'
+    if not tags:
+        return None, tags, 'At least one tag is required.'
+    if len(tags) > app.config['POLL_MAX_TAGS']:
+        return None, tags, f"At most {app.config['POLL_MAX_TAGS']} tags can be watched."
+    return (f"{ip}/{slot}" if slot else ip), tags, None
+
+
+@app.route('/plc/watch')
+def plc_watch():
+    """Show live values of the chosen tags, updated from ``/plc/watch/events``."""
+    message = None
+    events_url = None
+    tags = _watch_tags(request.args.get('tags', ''))
+    if request.args:
+        path, tags, message = _watch_request(request.args)
+        if message is None:
+            events_url = url_for(
+                'plc_watch_events',
+                ip=request.args.get('ip', '').strip(),
+                slot=request.args.get('slot', '0').strip(),
+                tags=','.join(tags),
+            )
+
+    return render_template_string(
+        WATCH_TEMPLATE,
+        message=message,
+        tags=tags,
+        events_url=events_url,
+        history=app.config['POLL_HISTORY'],
+        max_tags=app.config['POLL_MAX_TAGS'],
+    )
+
+
+@app.route('/plc/watch/events')
+def plc_watch_events():
+    """Stream live tag values as server-sent events.
+
+    Takes ``ip``, ``slot`` and a comma-separated ``tags`` list. The first
+    ``history`` event maps each tag to its buffered ``[time, value, error]``
+    samples; each later ``sample`` event holds the latest sample of every
+    tag. Viewers of the same controller share one poll loop.
+    """
+    path, tags, message = _watch_request(request.args)
+    if message is not None:
+        return message, 400
+
+    poller = get_tag_poller()
+    subscription = poller.subscribe(path, tags)
+
+    def generate():
+        yield _sse_event('history', subscription.history)
+        while True:
+            samples = subscription.get(timeout=15)
+            if samples is None:
+                yield ': keepalive\n\n'
+            else:
+                yield _sse_event('sample', samples)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(lambda: poller.unsubscribe(subscription))
+    return response
+
+
+def _sse_event(event: str, data) -> str:
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+@app.route('/plc/scan', methods=['GET', 'POST'])
+def plc_scan():
+    """Query the identity (and optionally tags) of many controllers in parallel."""
+    message = None
+    results = None
+    token = None
+    include_tags = bool(request.form.get('tags'))
+
+    if request.method == 'POST':
+        try:
+            paths = parse_scan_targets(
+                request.form.get('targets', ''),
+                request.form.get('slot', '0').strip() or '0',
+                app.config['SCAN_MAX_TARGETS'],
+            )
+            concurrency = int(request.form.get('concurrency') or app.config['SCAN_CONCURRENCY'])
+            timeout = float(request.form.get('timeout') or app.config['SCAN_TIMEOUT'])
+        except ValueError as exc:
+            message = f'Invalid scan request: {exc}'
+        else:
+            if not paths:
+                message = 'At least one target is required.'
+            else:
+                start = time.perf_counter()
+                results = scan_controllers(paths, concurrency, timeout, include_tags, get_tag_cache())
+                token = get_artifact_store().new_token()
+                get_artifact_store().put_data(token, 'scan', results)
+                reachable = sum(1 for r in results if r['status'] == 'ok')
+                message = (
+                    f'Scanned {len(results)} controllers in {time.perf_counter() - start:.1f}s; '
+                    f'{reachable} responded.'
+                )
+
+    return render_template_string(
+        SCAN_TEMPLATE,
+        message=message,
+        results=results,
+        token=token,
+        include_tags=include_tags,
+        fields=PLC_INFO_FIELDS,
+    )
+
+
+@app.route('/plc/scan/results.csv')
+def download_scan():
+    """Send the results of the scan named by ``?token=`` as CSV."""
+    results = get_artifact_store().get_data(request.args.get('token'), 'scan')
+    if not results:
+        return "No scan results available", 404
+    header = ['target', 'status', 'elapsed', *PLC_INFO_FIELDS, 'tag_count', 'error']
+    rows = ([r[field] for field in header] for r in results)
+    return csv_response(header, rows, 'scan.csv')
+
+
+@app.route('/plc/scan/tags.csv')
+def download_scan_tags():
+    """Send the tag lists collected by the scan named by ``?token=`` as one CSV."""
+    results = get_artifact_store().get_data(request.args.get('token'), 'scan')
+    if not results or not any(r['tags'] for r in results):
+        return "No scanned tag lists available", 404
+    rows = (
+        [r['target'], r['name'], *tag]
+        for r in results if r['tags']
+        for tag in r['tags']
+    )
+    return csv_response(['target', 'name', 'tag_name', 'data_type', 'dimensions'], rows, 'scan_tags.csv')
+
+
+@app.route('/jobs/export', methods=['POST'])
+def submit_export_job():
+    """Queue an MDB export and return its job ID without waiting for it."""
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify(error='An MDB file is required.'), 400
+    fmt = request.form.get('format', 'xlsx')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify(error=f'Unknown export format {fmt}'), 400
+
+    try:
+        mdb_path, digest = save_upload(file, '.mdb')
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+
+    try:
+        job = get_job_manager().submit(
+            'export',
+            _run_export_job,
+            mdb_path,
+            digest,
+            fmt,
+            request.form.get('since') or None,
+            file.filename,
+        )
+    except JobQueueFull as exc:
+        os.remove(mdb_path)
+        return jsonify(error=str(exc)), 503
+    return jsonify(job_id=job.id, status_url=url_for('job_status', job_id=job.id)), 202
+
+
+@app.route('/jobs/import', methods=['POST'])
+def submit_import_job():
+    """Queue an Excel to MDB update and return its job ID."""
+    mdb_file = request.files.get('mdb')
+    excel_file = request.files.get('excel')
+    if not (mdb_file and excel_file and mdb_file.filename and excel_file.filename):
+        return jsonify(error='Both MDB and Excel files are required.'), 400
+
+    try:
+        mdb_path, xlsx_path, _, _, _ = _save_import_uploads(mdb_file, excel_file)
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+
+    try:
+        job = get_job_manager().submit('import', _run_import_job, mdb_path, xlsx_path)
+    except JobQueueFull as exc:
+        os.remove(mdb_path)
+        os.remove(xlsx_path)
+        return jsonify(error=str(exc)), 503
+    return jsonify(job_id=job.id, status_url=url_for('job_status', job_id=job.id)), 202
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the stage and per-sheet row counts of a background job."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify(error='Unknown job; it may have expired.'), 404
+    data = job.to_dict()
+    if job.result_path:
+        data['download_url'] = url_for('download_job_result', job_id=job.id)
+    return jsonify(data)
+
+
+@app.route('/jobs/<job_id>/download')
+def download_job_result(job_id):
+    """Send the file produced by a finished background job.
+
+    Add ``?compress=gzip`` to receive it gzip-compressed.
+    """
+    job = get_job_manager().get(job_id)
+    if job is None or not job.result_path or not os.path.exists(job.result_path):
+        return "No job result available", 404
+    if request.args.get('compress') == 'gzip':
+        return gzip_file_response(job.result_path, job.download_name)
+    return send_file(
+        job.result_path,
+        as_attachment=True,
+        download_name=job.download_name,
+        conditional=True,
+    )
+
+
+@app.route('/api/instruments', methods=['POST'])
+def load_instruments():
+    """Load an uploaded MDB's instruments into memory and return its dataset ID.
+
+    Queries on the dataset are answered from memory at
+    ``GET /api/instruments/<dataset>``.
+    """
+    file = request.files.get('mdb')
+    if not file or not file.filename:
+        return jsonify(error='An MDB file is required.'), 400
+    try:
+        mdb_path, digest = save_upload(file, '.mdb')
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+
+    store = get_instrument_store()
+    status = 200
+    try:
+        table = store.get(digest)
+        metrics.inc('plcpoke_cache_requests_total', kind='instruments', result='miss' if table is None else 'hit')
+        if table is None:
+            with open_database(mdb_path, app.config['DATABASE_BACKEND']) as db:
+                with _request_timer('instruments') as timer:
+                    timer('load', {})
+                    table = InstrumentTable.load(mdb_path, db=db)
+                    timer('load', table.counts())
+            store.put(digest, table)
+            status = 201
+    except MissingInstrumentsTable:
+        return jsonify(error='Uploaded file does not contain an Instruments table.'), 400
+    except DATABASE_ERRORS + INVALID_FILE_ERRORS as exc:
+        return jsonify(error=f'Error accessing MDB file: {exc}'), 400
+    finally:
+        os.remove(mdb_path)
+    return jsonify(
+        dataset=digest,
+        rows=len(table),
+        sheets=table.counts(),
+        bytes=table.nbytes,
+        query_url=url_for('query_instruments', dataset=digest),
+    ), status
+
+
+@app.route('/api/instruments/<dataset>')
+def query_instruments(dataset):
+    """Return one page of the instruments of a loaded dataset as JSON.
+
+    Filters, all optional and combined with AND: ``id`` and ``tag`` (exact,
+    repeatable), ``prefix`` (tag prefix), ``sheet`` (repeatable) and ``alarm``
+    (an alarm that must be enabled, or disabled with a leading ``!``;
+    repeatable). ``columns`` selects the fields returned, comma-separated.
+    ``offset`` and ``limit`` page through the matches.
+    """
+    table = get_instrument_store().get(dataset)
+    if table is None:
+        return jsonify(
+            error='Unknown dataset; it was dropped or loaded by another worker process. '
+                  'Upload the MDB again.'
+        ), 404
+
+    args = request.args
+    try:
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', app.config['INSTRUMENT_QUERY_LIMIT']))
+    except ValueError:
+        return jsonify(error='offset and limit must be integers'), 400
+    if offset < 0 or not 0 < limit <= app.config['INSTRUMENT_QUERY_MAX_LIMIT']:
+        return jsonify(
+            error=f"offset must be at least 0 and limit between 1 and {app.config['INSTRUMENT_QUERY_MAX_LIMIT']}"
+        ), 400
+    sheets = args.getlist('sheet') or None
+    unknown = [sheet for sheet in sheets or () if sheet not in INSTRUMENT_SHEETS]
+    if unknown:
+        return jsonify(error=f"Unknown sheet {', '.join(unknown)}"), 400
+    columns = args.get('columns')
+
+    start = time.perf_counter()
+    try:
+        total, rows = table.query(
+            ids=[_instrument_id(value) for value in args.getlist('id')] or None,
+            tags=args.getlist('tag') or None,
+            tag_prefix=args.get('prefix') or None,
+            sheets=sheets,
+            alarms=args.getlist('alarm') or None,
+            offset=offset,
+            limit=limit,
+            columns=[c.strip() for c in columns.split(',') if c.strip()] if columns else None,
+        )
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+    metrics.observe('plcpoke_stage_seconds', time.perf_counter() - start, pipeline='instruments', stage='query')
+
+    data = {'dataset': dataset, 'total': total, 'offset': offset, 'limit': limit, 'rows': rows}
+    if offset + limit < total:
+        query = args.to_dict(flat=False)
+        query['offset'] = offset + limit
+        data['next_url'] = url_for('query_instruments', dataset=dataset, **query)
+    return jsonify(data)
+
+
+def _instrument_id(text: str):
+    """Return an ``id`` query value as the integer the MDB stores, if it is one."""
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
 if __name__ == '__main__':
     app.run(debug=True)